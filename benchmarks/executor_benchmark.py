@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This script compares the cost of running a test script with
+CliCommand.execute_command (a /bin/sh and a bash process per test) and with
+a persistent bash worker (a subshell forked from the warm worker).
+
+Usage : benchmarks/executor_benchmark.py [--count N] [script [args...]]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sbit.bash_worker import BashWorker
+from sbit.cli_command import CliCommand
+from sbit.model import Configuration
+
+# Script run by default, a check reading a single file
+DEFAULT_COMMAND = [os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 "..", "test-library", "fs_file_exist")),
+                   "/etc/passwd"]
+
+# -------------------------------------------------------------------------
+#
+# measure
+#
+# -------------------------------------------------------------------------
+def measure(execute, command, count):
+  """This function runs the command count times, and returns the mean
+  duration of a run in seconds, and the return code of the last run
+  """
+
+  start = time.monotonic()
+  for _ in range(count):
+    ret, out, err = execute(command)
+  return (time.monotonic() - start) / count, ret
+
+
+
+# -------------------------------------------------------------------------
+#
+# main
+#
+# -------------------------------------------------------------------------
+def main():
+  """Run the benchmark and print the results
+  """
+
+  parser = argparse.ArgumentParser(description="Compare execute_command and the bash worker")
+  parser.add_argument("--count", type=int, default=200, help="Number of runs. Default : 200")
+  parser.add_argument("command", nargs="*", help="Script and its arguments")
+  args = parser.parse_args()
+
+  command = " ".join(args.command or DEFAULT_COMMAND)
+  cli_command = CliCommand(Configuration())
+
+  subprocess_duration, subprocess_ret = measure(cli_command.execute_command, command, args.count)
+
+  worker = BashWorker(cli_command)
+  try:
+    worker_duration, worker_ret = measure(worker.execute, command, args.count)
+  finally:
+    worker.close()
+
+  print("command        : " + command)
+  print("runs           : " + str(args.count))
+  print("execute_command: %.3f ms per run (return code %d)" % (subprocess_duration * 1000,
+                                                               subprocess_ret))
+  print("bash worker    : %.3f ms per run (return code %d)" % (worker_duration * 1000, worker_ret))
+  print("speedup        : %.2fx" % (subprocess_duration / worker_duration))
+
+
+
+if __name__ == "__main__":
+  main()
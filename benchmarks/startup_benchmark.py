@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This script measures the time spent importing modules when sbit starts,
+with python -X importtime, for 'sbit help' and for 'sbit run' on an empty
+suite. It fails if a command exceeds the budget recorded in
+startup_budget.json, or if it imports a module it should not need.
+
+The user configuration file is a copy of the packaged one, thus its loading
+is measured as on an installed system.
+
+Budgets depend on the machine. Record them again on the target board with
+--record, they are set to the measured times plus a margin.
+
+Usage : benchmarks/startup_benchmark.py [--count N] [--record] [--margin M]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Root of the source tree, the sbit package is imported from it
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# File storing the budgets, in milliseconds, of the commands
+BUDGET_FILE = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+
+# Modules the commands must not import. They are only needed by other commands, engines or
+# reports. PyYAML is not needed by a run from an up to date compiled suite
+FORBIDDEN_MODULES = {
+  "help": ["sbit.run_testsuite", "sbit.serve_testsuite", "sbit.watch_testsuite",
+           "sbit.check_testsuite", "sbit.check_library", "yaml", "asyncio"],
+  "run": ["sbit.serve_testsuite", "sbit.watch_testsuite", "sbit.check_testsuite",
+          "sbit.check_library", "yaml", "asyncio", "xml.sax.saxutils"],
+}
+
+# -------------------------------------------------------------------------
+#
+# get_commands
+#
+# -------------------------------------------------------------------------
+def get_commands(suite):
+  """This function returns the hash table mapping the command names to the
+  arguments of bin/sbit
+  """
+
+  return {
+    "help": ["help"],
+    "run": ["run", "--suite", suite, "--library", os.path.join(ROOT, "test-library"),
+            "--no-result-cache"],
+  }
+
+
+
+# -------------------------------------------------------------------------
+#
+# measure
+#
+# -------------------------------------------------------------------------
+def measure(arguments, env):
+  """This function runs bin/sbit once with -X importtime, and returns the
+  total import time in milliseconds, and the set of the imported modules
+  """
+
+  process = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, "bin", "sbit")]
+                           + arguments, env=env, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE, universal_newlines=True)
+
+  # Lines are 'import time: self [us] | cumulative | name'. Nested imports are indented, the
+  # cumulative times of the top level ones add up to the total
+  total = 0
+  modules = set()
+  for line in process.stderr.splitlines():
+    if not line.startswith("import time:"):
+      continue
+    fields = line[len("import time:"):].split("|")
+    if len(fields) != 3 or not fields[1].strip().isdigit():
+      continue
+
+    name = fields[2].rstrip()
+    modules.add(name.strip())
+    if not name.startswith("  "):
+      total += int(fields[1])
+
+  return total / 1000.0, modules
+
+
+
+# -------------------------------------------------------------------------
+#
+# main
+#
+# -------------------------------------------------------------------------
+def main():
+  """Run the benchmark, print the results and check them against the
+  budgets
+  """
+
+  parser = argparse.ArgumentParser(description="Measure the import time of the sbit commands")
+  parser.add_argument("--count", type=int, default=10,
+                      help="Number of runs, the fastest one is kept. Default : 10")
+  parser.add_argument("--record", action="store_true",
+                      help="Record the budgets from this run instead of checking them")
+  parser.add_argument("--margin", type=float, default=1.5,
+                      help="Budget recorded, relative to the measured time. Default : 1.5")
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix="sbit-startup-") as directory:
+    # Empty suite, and the packaged configuration file installed as the user one
+    suite = os.path.join(directory, "empty.yml")
+    with open(suite, "w") as working_file:
+      working_file.write("")
+    shutil.copy(os.path.join(ROOT, "config", "sbitrc"), os.path.join(directory, ".sbitrc"))
+
+    env = dict(os.environ)
+    env["HOME"] = directory
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    results = {}
+    for name, arguments in sorted(get_commands(suite).items()):
+      # First run compiles the bytecode, the suite and the configuration, it is not measured
+      measure(arguments, env)
+      runs = [measure(arguments, env) for _ in range(args.count)]
+      results[name] = (min(run[0] for run in runs), runs[-1][1])
+
+  if args.record:
+    budgets = {}
+    for name, (duration, modules) in sorted(results.items()):
+      budgets[name] = round(duration * args.margin, 1)
+      print("%-5s: %.1f ms, budget recorded : %.1f ms" % (name, duration, budgets[name]))
+    with open(BUDGET_FILE, "w") as working_file:
+      json.dump(budgets, working_file, indent=2, sort_keys=True)
+      working_file.write("\n")
+    return 0
+
+  with open(BUDGET_FILE, "r") as working_file:
+    budgets = json.load(working_file)
+
+  failed = False
+  for name, (duration, modules) in sorted(results.items()):
+    status = "OK"
+    if name in budgets and duration > budgets[name]:
+      status = "KO"
+      failed = True
+    print("%-5s: %.1f ms, budget %s ms [ %s ]" % (name, duration, budgets.get(name, "-"), status))
+
+    for module in FORBIDDEN_MODULES[name]:
+      if module in modules:
+        print("%-5s: %s should not be imported" % (name, module))
+        failed = True
+
+  return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+  sys.exit(main())
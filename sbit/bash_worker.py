@@ -0,0 +1,251 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the persistent bash workers. A worker is a long
+lived bash process which runs the commands it receives on its stdin. Each
+command runs in its own subshell, forked from the warm worker, thus neither
+/bin/sh nor bash have to be started for each test.
+
+Bash scripts are sourced from the subshell instead of being executed. They
+get their arguments as positional parameters, as they would when executed.
+Only $0, $$ and $PPID differ, they are the ones of the worker.
+
+Protocol is line based. Each request is made of the mode (source or eval),
+the length of the command in bytes, then the command itself. The worker
+answers with the pid of the subshell once started, then with its exit code
+once completed. Output of the subshell is written to files in the worker
+directory, which are read once the exit code has been received.
+"""
+
+import os
+import select
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from sbit.model import Key
+
+# Script run by the worker. Job control gives each subshell its own process group, thus a
+# timeout kills the test and the processes it has started, but not the worker
+WORKER_SCRIPT = """
+set -m
+sbit_directory="$1"
+while IFS= read -r sbit_mode ; do
+  IFS= read -r sbit_length
+  LC_ALL=C IFS= read -r -N "${sbit_length}" sbit_command
+  if [ "${sbit_mode}" == "source" ] ; then
+    ( set +m ; eval "set -- ${sbit_command}" || exit ; sbit_script="$1" ; shift ; . "${sbit_script}" ) \\
+      < /dev/null > "${sbit_directory}/stdout" 2> "${sbit_directory}/stderr" &
+  else
+    ( set +m ; eval "${sbit_command}" ) \\
+      < /dev/null > "${sbit_directory}/stdout" 2> "${sbit_directory}/stderr" &
+  fi
+  echo "$!"
+  wait "$!"
+  echo "$?"
+done
+"""
+
+# Characters making the command more than a script and its arguments (redirections, lists,
+# pipelines, etc.). Such commands are evaluated instead of being sourced
+SHELL_OPERATORS = set("<>|;&()\n")
+
+# Interpreters of the scripts which can be sourced by the worker
+BASH_SHEBANGS = ["#!/bin/bash", "#!/usr/bin/env bash"]
+
+# -----------------------------------------------------------------------------
+#
+#    Class BashWorker
+#
+# -----------------------------------------------------------------------------
+class BashWorker(object):
+  """This class drives a single bash worker. Commands are executed one at a
+  time, thus each thread of the engine owns its worker.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, command):
+    """Default constructor. Command is the CliCommand object used to register
+    the running commands, thus they are killed on abort. The worker inherits
+    the current environment. It raises OSError if bash cannot be started.
+    """
+
+    # Object used to register the running commands
+    self.command = command
+
+    # Directory storing the output of the commands
+    self.directory = tempfile.mkdtemp(prefix="sbit-worker-")
+
+    # Data read from the worker and not consumed yet
+    self.buffer = b""
+
+    # Hash table mapping script paths to True if they can be sourced
+    self.sourceable = {}
+
+    try:
+      self.process = subprocess.Popen(["bash", "-c", WORKER_SCRIPT, "sbit-worker", self.directory],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL)
+    except OSError:
+      shutil.rmtree(self.directory, ignore_errors=True)
+      raise
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # execute
+  #
+  # -------------------------------------------------------------------------
+  def execute(self, command, timeout=None):
+    """This method runs a command from the worker. Return values and timeout
+    handling are the same as the ones of CliCommand.execute_command. It
+    raises OSError if the worker has exited.
+    """
+
+    self.command.cfg.logging.debug("running in worker : " + command)
+
+    mode = "eval"
+    if SHELL_OPERATORS.isdisjoint(command) and self.can_source(command.split(" ", 1)[0]):
+      mode = "source"
+
+    request = command.encode(Key.UTF8.value)
+    try:
+      self.process.stdin.write(mode.encode() + b"\n" + str(len(request)).encode() + b"\n" + request)
+      self.process.stdin.flush()
+    except BrokenPipeError as exception:
+      raise OSError("Worker has exited") from exception
+
+    pid = int(self.read_line())
+    self.command.register_command(pid)
+
+    try:
+      line = self.read_line(timeout)
+
+      # Script is still running. Kill it, and the processes it has started
+      if line is None:
+        self.command.cfg.logging.debug("timeout expired after " + str(timeout) + "s : " + command)
+        self.command.kill_process_group(pid)
+        self.read_line()
+        returncode = Key.RETURN_CODE_TIMEOUT.value
+
+      # Shell reports the processes killed by a signal with 128 + the signal number
+      elif self.command.aborted and int(line) == 128 + signal.SIGKILL:
+        returncode = Key.RETURN_CODE_SKIPPED.value
+
+      else:
+        returncode = int(line)
+
+    finally:
+      self.command.unregister_command(pid)
+
+    with open(os.path.join(self.directory, "stdout"), "rb") as working_file:
+      stdout = working_file.read()
+    with open(os.path.join(self.directory, "stderr"), "rb") as working_file:
+      stderr = working_file.read()
+
+    # Output is decoded only on failure, the same way execute_command does
+    if returncode == 0:
+      return returncode, stdout, stderr
+
+    return returncode, stdout.decode(Key.UTF8.value), stderr.decode(Key.UTF8.value)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # can_source
+  #
+  # -------------------------------------------------------------------------
+  def can_source(self, script_path):
+    """This method returns True if the given script is a bash script, which
+    can be sourced instead of being executed
+    """
+
+    if script_path not in self.sourceable:
+      try:
+        with open(script_path, "rb") as working_file:
+          shebang = working_file.readline().decode(Key.UTF8.value, "replace").strip()
+        self.sourceable[script_path] = shebang in BASH_SHEBANGS
+      except OSError:
+        self.sourceable[script_path] = False
+
+    return self.sourceable[script_path]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # read_line
+  #
+  # -------------------------------------------------------------------------
+  def read_line(self, timeout=None):
+    """This method returns the next line output by the worker, or None if
+    the timeout expires first. It raises OSError if the worker has exited.
+    """
+
+    deadline = None
+    if timeout is not None:
+      deadline = time.monotonic() + timeout
+
+    output = self.process.stdout.fileno()
+    while b"\n" not in self.buffer:
+      if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or len(select.select([output], [], [], remaining)[0]) == 0:
+          return None
+
+      data = os.read(output, 4096)
+      if len(data) == 0:
+        raise OSError("Worker has exited")
+      self.buffer += data
+
+    line, self.buffer = self.buffer.split(b"\n", 1)
+    return line.decode()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """This method stops the worker, then removes its directory. Closing its
+    input ends the read loop.
+    """
+
+    try:
+      self.process.stdin.close()
+    except OSError:
+      pass
+
+    try:
+      self.process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+      self.process.kill()
+      self.process.wait()
+
+    self.process.stdout.close()
+    shutil.rmtree(self.directory, ignore_errors=True)
@@ -25,6 +25,9 @@ flag, invalid meta data, etc.
 
 import logging
 from sbit.cli_command import CliCommand
+from sbit.model import Key
+from sbit.test_library import TestLibrary
+from sbit.ansi_colors import Colors
 
 #
 #    Class CheckLibrary
@@ -62,6 +65,8 @@ class CheckLibrary(CliCommand):
     . Check tests meta data
     . Test syntax
     . Uniques IDs for each test
+
+    It returns True if no error has been found.
     """
 
     # Check that there is a firmware configuration file first
@@ -69,10 +74,70 @@ class CheckLibrary(CliCommand):
       logging.critical("The configuration file object is not defined")
       exit(1)
 
-    print("check_library")
+    # Use the library path from the command line, or default to the configuration file
+    paths = self.cfg.library
+    if not paths:
+      if self.cfg.configuration is None or \
+         not Key.TEST_LIBRARY_PATH.value in self.cfg.configuration:
+        logging.critical("The library path is not defined")
+        exit(1)
+      paths = self.cfg.configuration[Key.TEST_LIBRARY_PATH.value]
+
+    # Scan the library, then control the meta data of each script. Meta data come from the
+    # same table as the one used to display hints when running a suite
+    library = TestLibrary(paths)
+    success = True
+    for script in sorted(library.scripts):
+      errors = self.check_script(library, script)
+      success &= len(errors) == 0
+
+      # Output the script name padded to the result column
+      output = " - " + script
+      output += "".join(" " for i in range(Key.OUTPUT_RESULT_PADDING.value - len(output)))
+      if len(errors) == 0:
+        output += "[" + Colors.FG_GREEN.value + Colors.BOLD.value + " OK " + Colors.RESET.value + "]"
+      else:
+        output += "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO " + Colors.RESET.value + "]"
+      print(output)
+
+      # Then the list of errors found in the meta data
+      for error in errors:
+        print("     " + Colors.FG_CYAN.value + error + Colors.RESET.value)
+
+    return success
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # check_script
+  #
+  # -------------------------------------------------------------------------
+  def check_script(self, library, script):
+    """This method controls the meta data of the given script, and returns the
+    list of the errors found.
+    """
+
+    errors = []
+
+    metadata = library.get_metadata(library.resolve(script))
+    if metadata is None:
+      errors.append("Script is not readable")
+      return errors
+
+    if metadata.description is None or len(metadata.description) == 0:
+      errors.append("No @SBIT description defined")
+
+    if len(metadata.hints) == 0:
+      errors.append("No @SBIT hint defined")
+
+    for hint_code in metadata.duplicate_hints:
+      errors.append("Hint " + hint_code + " is defined more than once")
 
-    if self.cfg.library_path:
-      print(self.cfg.library_path)
+    for hint_code in metadata.hints:
+      try:
+        int(hint_code)
+      except ValueError:
+        errors.append("Hint code " + hint_code + " is not a number")
 
-    if self.cfg.suite_path:
-      print(self.cfg.suite_path)
+    return errors
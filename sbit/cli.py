@@ -29,13 +29,11 @@ import textwrap
 import logging
 from sbit.model import Key
 from sbit.model import Configuration
-from sbit import run_testsuite
-from sbit import check_testsuite
-from sbit import check_library
 from sbit import release
-# import sbit.run_testsuite
-# import sbit.check_testsuite
-# import sbit.check_library
+
+# Modules of the commands are imported by the method running the command. They pull the
+# execution engines, the reports, etc. which are not needed to output the help or to run
+# another command
 
 # -----------------------------------------------------------------------------
 #
@@ -65,6 +63,7 @@ Available commands are :
   . ''' + Key.CHECK_LIBRARY.value + '''       Check the test library consistency
   . ''' + Key.CHECK_SUITE.value +  '''        Check the test suite consistency
   . ''' + Key.RUN_SUITE.value + '''           Execute the tests defined in the given suite file
+  . ''' + Key.SERVE_SUITE.value + '''         Serve runs of the given suite file through a Unix socket
 '''), formatter_class=argparse.RawTextHelpFormatter)
 
     # Stores the arguments from the parser
@@ -101,6 +100,8 @@ Available commands are :
       self.__add_parser_check_library()
     elif self.command == Key.RUN_SUITE.value:
       self.__add_parser_run_suite()
+    elif self.command == Key.SERVE_SUITE.value:
+      self.__add_parser_serve_suite()
     elif self.command == "help":
       return self.parser.parse_args(['-h'])
     else:
@@ -146,6 +147,45 @@ Available commands are :
     if self.args.library != None:
       self.cfg.library = self.args.library
 
+    # Options of the run command are defined only by its own parser, and by the serve one
+    if self.command in [Key.RUN_SUITE.value, Key.SERVE_SUITE.value]:
+      self.__override_run_suite_configuration()
+
+    if self.command == Key.RUN_SUITE.value:
+      self.__override_watch_configuration()
+
+    if self.command == Key.SERVE_SUITE.value:
+      self.__override_serve_suite_configuration()
+
+    # Create the logger object
+    logging.basicConfig()
+    self.cfg.logging = logging.getLogger()
+    self.cfg.logging.setLevel(self.cfg.log_level)
+
+    # Select the method to run according to the command
+    if self.command == Key.CHECK_LIBRARY.value:
+      self.__run_check_library()
+    elif self.command == Key.CHECK_SUITE.value:
+      self.__run_check_suite()
+    elif self.command == Key.RUN_SUITE.value:
+      self.__run_run_suite()
+    elif self.command == Key.SERVE_SUITE.value:
+      self.__run_serve_suite()
+    else:
+      self.cfg.logging.critical("Unnown command : %s", self.command)
+      exit(1)
+
+
+  # -------------------------------------------------------------------------
+  #
+  # __override_run_suite_configuration
+  #
+  # -------------------------------------------------------------------------
+  def __override_run_suite_configuration(self):
+    """ This method override the configuration with the values of the options
+    specific to the run command
+    """
+
     # Retrieve the array of categories
     if self.args.category != None:
       self.cfg.category = self.args.category
@@ -158,29 +198,115 @@ Available commands are :
     if self.args.no_result_cache != None:
       self.cfg.use_results_cache = not self.args.no_result_cache
 
+    # Retrieve the number of parallel jobs
+    if self.args.jobs != None:
+      if self.args.jobs < 1:
+        logging.critical("The number of jobs must be at least 1")
+        exit(1)
+      self.cfg.jobs = self.args.jobs
+
+    # Retrieve the execution engine
+    if self.args.executor != None:
+      self.cfg.executor = self.args.executor
+
+    # Retrieve the default test timeout
+    if self.args.timeout != None:
+      self.cfg.timeout = self.args.timeout
+
+    # Retrieve the run deadline
+    if self.args.deadline != None:
+      self.cfg.deadline = self.args.deadline
+
+    # Retrieve the persistent cache settings
+    if self.args.cache_dir != None:
+      self.cfg.cache_dir = self.args.cache_dir
+
+    if self.args.cache_ttl != None:
+      self.cfg.cache_ttl = self.args.cache_ttl
+
+    if self.args.cache_fingerprint != None:
+      self.cfg.cache_fingerprint = self.args.cache_fingerprint
+
+    self.cfg.refresh = self.args.refresh
+
+    # Retrieve the native checks flag
+    self.cfg.native = self.args.native
+
+    # Retrieve the list of structured reports, and check their format
+    if self.args.report != None:
+      for report in self.args.report:
+        if report.split(":", 1)[0] not in [Key.REPORT_JSONL.value, Key.REPORT_JUNIT.value,
+                                           Key.REPORT_TAP.value]:
+          logging.critical("Unknown report format : " + report)
+          exit(1)
+      self.cfg.report = self.args.report
+
+      # Open the reports now, thus a bad path is reported before the suite is loaded
+      from sbit.result_writers import create_writer
+      for report in self.cfg.report:
+        try:
+          self.cfg.report_writers.append(create_writer(report))
+        except OSError as exception:
+          logging.critical("Cannot open report " + report + " : " + exception.strerror)
+          exit(1)
+
     # Retrieve the failfast flag
-    self.cfg.fail_fast = bool(self.args.fail_fast != None)
+    self.cfg.fail_fast = self.args.fail_fast
 
     # Retrieve the show hints flag
     self.cfg.show_hints = self.args.show_hints
 
-    # Create the logger object
-    logging.basicConfig()
-    self.cfg.logging = logging.getLogger()
-    self.cfg.logging.setLevel(self.cfg.log_level)
 
-    # Select the method to run according to the command
-    if self.command == Key.CHECK_LIBRARY.value:
-      self.__run_check_library()
-    elif self.command == Key.CHECK_SUITE.value:
-      self.__run_check_suite()
-    elif self.command == Key.RUN_SUITE.value:
-      self.__run_run_suite()
-    else:
-      self.cfg.logging.critical("Unnown command : %s", self.command)
+
+  # -------------------------------------------------------------------------
+  #
+  # __override_watch_configuration
+  #
+  # -------------------------------------------------------------------------
+  def __override_watch_configuration(self):
+    """ This method override the configuration with the value of the watch
+    option, which is specific to the run command
+    """
+
+    # Retrieve the watch flag. A failure does not stop the watch mode, thus fail fast cannot apply
+    self.cfg.watch = self.args.watch
+    if self.cfg.watch and self.cfg.fail_fast:
+      logging.critical("The " + Key.OPT_WATCH.value + " and " + Key.OPT_FAIL_FAST.value +
+                       " options cannot be used together")
       exit(1)
 
 
+
+  # -------------------------------------------------------------------------
+  #
+  # __override_serve_suite_configuration
+  #
+  # -------------------------------------------------------------------------
+  def __override_serve_suite_configuration(self):
+    """ This method override the configuration with the values of the options
+    specific to the serve command
+    """
+
+    # Daemon output is not the place for a report. Runs are answered through the socket
+    for report in self.cfg.report:
+      if report.split(":", 1)[-1] in [report, "-"]:
+        logging.critical("Reports of the " + Key.SERVE_SUITE.value + " command cannot be "
+                         "written to stdout : " + report)
+        exit(1)
+
+    # Retrieve the path to the socket
+    if self.args.socket != None:
+      self.cfg.socket = self.args.socket
+
+    # Retrieve the interval of the scheduled runs
+    if self.args.interval != None:
+      if self.args.interval <= 0:
+        logging.critical("The interval of the scheduled runs must be positive")
+        exit(1)
+      self.cfg.interval = self.args.interval
+
+
+
   # -------------------------------------------------------------------------
   #
   # __add_parser_common
@@ -258,6 +384,62 @@ Available commands are :
     self.parser.add_argument(Key.RUN_SUITE.value,
                              help=Key.OPT_HELP_COMMAND.value)
 
+    self.__add_parser_run_options()
+
+    self.parser.add_argument(Key.OPT_WATCH.value,
+                             action='store_true',
+                             dest=Key.WATCH.value,
+                             help="Once the suite has run, watch the files checked by the\n"
+                                  "tests (fs_file_exist, fs_file_contains_string, etc.)\n"
+                                  "and run again the tests whose files change, until\n"
+                                  "interrupted by Ctrl-C")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # __add_parser_serve_suite
+  #
+  # -------------------------------------------------------------------------
+  def __add_parser_serve_suite(self):
+
+    """ This method add parser options specific to the daemon mode. Runs
+    accept the same options as the run command.
+    """
+
+    self.parser.add_argument(Key.SERVE_SUITE.value,
+                             help=Key.OPT_HELP_COMMAND.value)
+
+    self.__add_parser_run_options()
+
+    self.parser.add_argument(Key.OPT_SOCKET.value,
+                             action='store',
+                             dest=Key.SOCKET.value,
+                             help="Path to the Unix socket receiving the requests. Requests\n"
+                                  "and responses are JSON objects, one per line.\n"
+                                  "Default value : ~/.sbit.sock")
+
+    self.parser.add_argument(Key.OPT_INTERVAL.value,
+                             action='store',
+                             type=float,
+                             dest=Key.INTERVAL.value,
+                             help="Runs the selected categories every given number of\n"
+                                  "seconds. The last result is returned by the last\n"
+                                  "request")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # __add_parser_run_options
+  #
+  # -------------------------------------------------------------------------
+  def __add_parser_run_options(self):
+
+    """ This method add parser options controlling the execution of the
+    tests
+    """
+
     # Defines the reverse order search path
     self.parser.add_argument(Key.OPT_CATEGORY.value,
                              action='store',
@@ -279,6 +461,86 @@ Available commands are :
                                   "multiple times with the same argumets, instead of\n"
                                   "once per arguments distinct set of values")
 
+    self.parser.add_argument(Key.OPT_CACHE_DIR.value,
+                             action='store',
+                             dest=Key.CACHE_DIR.value,
+                             help="Activate the persistent results cache, stored in the\n"
+                                  "given directory. Results are reused by the next runs\n"
+                                  "as long as their time to live is not expired")
+
+    self.parser.add_argument(Key.OPT_CACHE_TTL.value,
+                             action='store',
+                             type=float,
+                             dest=Key.CACHE_TTL.value,
+                             help="Defines the default time to live (in seconds) of the\n"
+                                  "persistent cache entries. It can be overriden by the\n"
+                                  "cache_ttl key of a category or a test. Tests without\n"
+                                  "time to live are never cached")
+
+    self.parser.add_argument(Key.OPT_CACHE_FINGERPRINT.value,
+                             action='store',
+                             dest=Key.CACHE_FINGERPRINT.value,
+                             help="String identifying the environment (kernel version,\n"
+                                  "boot id, etc.). Results stored with another fingerprint\n"
+                                  "are not used")
+
+    self.parser.add_argument(Key.OPT_REFRESH.value,
+                             action='store_true',
+                             dest=Key.REFRESH.value,
+                             help="Ignore the persistent cache entries and run all the\n"
+                                  "tests. New results are still stored in the cache")
+
+    self.parser.add_argument(Key.OPT_NO_NATIVE.value,
+                             action='store_false',
+                             dest=Key.NATIVE.value,
+                             help="Always execute the library scripts. By default the\n"
+                                  "simplest checks are run in-process, without starting\n"
+                                  "a shell")
+
+    self.parser.add_argument(Key.OPT_REPORT.value,
+                             action='append',
+                             dest=Key.REPORT.value,
+                             metavar="FORMAT[:PATH]",
+                             help="Generates a machine readable report while the tests are\n"
+                                  "running. Format is one of jsonl, junit or tap. Report\n"
+                                  "is written to stdout if path is missing or equal to \"-\",\n"
+                                  "then the console output goes to stderr. Option can be\n"
+                                  "used several times")
+
+    self.parser.add_argument(Key.OPT_JOBS.value,
+                             action='store',
+                             type=int,
+                             dest=Key.JOBS.value,
+                             help="Defines the number of test scripts executed in parallel.\n"
+                                  "Output is still displayed in the test tree order.\n"
+                                  "Default value : 1")
+
+    self.parser.add_argument(Key.OPT_EXECUTOR.value,
+                             action='store',
+                             dest=Key.EXECUTOR.value,
+                             choices=[Key.EXECUTOR_THREAD.value, Key.EXECUTOR_ASYNCIO.value,
+                                      Key.EXECUTOR_WORKER.value],
+                             help="Defines the engine used to execute the test scripts.\n"
+                                  "The asyncio engine runs all the scripts from a single\n"
+                                  "event loop. The worker engine sources the scripts from\n"
+                                  "persistent bash processes. Default value : thread")
+
+    self.parser.add_argument(Key.OPT_TIMEOUT.value,
+                             action='store',
+                             type=float,
+                             dest=Key.TIMEOUT.value,
+                             help="Defines the default timeout (in seconds) of a test script.\n"
+                                  "It can be overriden by the timeout key of a test. Scripts\n"
+                                  "running longer are killed and reported as TIMEOUT")
+
+    self.parser.add_argument(Key.OPT_DEADLINE.value,
+                             action='store',
+                             type=float,
+                             dest=Key.DEADLINE.value,
+                             help="Defines the maximum duration (in seconds) of the whole\n"
+                                  "run. When it expires, running scripts are killed and\n"
+                                  "remaining tests are reported as TIMEOUT")
+
     self.parser.add_argument(Key.OPT_FAIL_FAST.value,
                              action='store_true',
                              dest=Key.FAIL_FAST.value,
@@ -312,6 +574,8 @@ Available commands are :
       Create the business objet, then execute the entry point
     """
 
+    from sbit import check_library
+
     # Create the business object
     command = check_library.CheckLibrary(self.cfg)
 
@@ -330,6 +594,8 @@ Available commands are :
       Create the business objet, then execute the entry point
     """
 
+    from sbit import check_testsuite
+
     # Create the business object
     command = check_testsuite.CheckTestSuite(self.cfg)
 
@@ -348,8 +614,33 @@ Available commands are :
       Create the business objet, then execute the entry point
     """
 
-    # Create the business object
-    command = run_testsuite.RunTestSuite(self.cfg)
+    # Create the business object. Watch mode runs the suite the same way, then watches it
+    if self.cfg.watch:
+      from sbit import watch_testsuite
+      command = watch_testsuite.WatchTestSuite(self.cfg)
+    else:
+      from sbit import run_testsuite
+      command = run_testsuite.RunTestSuite(self.cfg)
 
     # Then call the dedicated method
     command.run_suite()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # __run_serve_suite
+  #
+  # -------------------------------------------------------------------------
+  def __run_serve_suite(self):
+    """ Method used to handle the serve command.
+      Create the business objet, then execute the entry point
+    """
+
+    from sbit import serve_testsuite
+
+    # Create the business object
+    command = serve_testsuite.ServeTestSuite(self.cfg)
+
+    # Then call the dedicated method
+    command.serve()
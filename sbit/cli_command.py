@@ -21,7 +21,10 @@
 cli targets.
 """
 
+import os
+import signal
 import subprocess
+import threading
 from sbit.model import Key
 
 
@@ -52,6 +55,15 @@ class CliCommand(object):
     # the tool execution
     self.cfg = configuration
 
+    # Process groups of the commands currently running. They are terminated on abort
+    self.running_commands = set()
+
+    # Lock protecting the running commands set
+    self.commands_lock = threading.Lock()
+
+    # Flag set once the running commands have been aborted
+    self.aborted = False
+
 
 
   # -------------------------------------------------------------------------
@@ -59,28 +71,181 @@ class CliCommand(object):
   # execute_command
   #
   # -------------------------------------------------------------------------
-  def execute_command(self, command):
+  def execute_command(self, command, timeout=None):
     """ This method run a command as a subprocess. Typical use case is
     running commands.
 
-    This method is a wrapper to subprocess.run , and will be moved soon
+    This method is a wrapper to subprocess.Popen , and will be moved soon
     in a helper object. It provides mutalisation of error handling
+
+    The command is started in its own process group. If timeout (in seconds)
+    expires, the whole group is killed and the return code is set to
+    Key.RETURN_CODE_TIMEOUT.
     """
 
     self.cfg.logging.debug("running : " + command)
 
+    # Execute the subprocess, output ans errors are piped
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               shell=True, start_new_session=True, universal_newlines=False)
+    self.register_command(process.pid)
+
     try:
-      # Execute the subprocess, output ans errors are piped
-      completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                 shell=True, check=True, universal_newlines=False)
-
-      # Return the output of the process to the caller
-      return completed.returncode, completed.stdout, completed.stderr
-
-    # We catch xecutionerror, but continue execution and return completed structure to the caller
-    # It has to be done since we execute tests that can fail. Thus global execution hould not stop
-    # on first error
-    except subprocess.CalledProcessError as exception:
-      # Return the output of the process to the caller
-      return exception.returncode, exception.stdout.decode(Key.UTF8.value), \
-             exception.stderr.decode(Key.UTF8.value)
+      stdout, stderr = process.communicate(timeout=timeout)
+      returncode = self.get_returncode(process.returncode)
+
+    # Script is still running. Kill it, and the processes it has started
+    except subprocess.TimeoutExpired:
+      self.cfg.logging.debug("timeout expired after " + str(timeout) + "s : " + command)
+      self.kill_process_group(process.pid)
+      stdout, stderr = process.communicate()
+      returncode = Key.RETURN_CODE_TIMEOUT.value
+
+    finally:
+      self.unregister_command(process.pid)
+
+    # Return the output of the process to the caller. We do not raise on non zero return code,
+    # it has to be done since we execute tests that can fail. Thus global execution hould not stop
+    # on first error. Output is decoded only on failure
+    if returncode == 0:
+      return returncode, stdout, stderr
+
+    return returncode, stdout.decode(Key.UTF8.value), stderr.decode(Key.UTF8.value)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # execute_command_async
+  #
+  # -------------------------------------------------------------------------
+  async def execute_command_async(self, command, timeout=None):
+    """ This method is the coroutine counterpart of execute_command. It runs a
+    command as an asyncio subprocess, thus many commands can be waited for
+    from a single event loop.
+
+    Timeout handling and return values are the same as the ones from
+    execute_command.
+    """
+
+    # Only the asyncio engine runs this coroutine, it has imported asyncio already
+    import asyncio
+
+    self.cfg.logging.debug("running : " + command)
+
+    # Execute the subprocess, output ans errors are piped
+    process = await asyncio.create_subprocess_shell(command, stdout=subprocess.PIPE,
+                                                    stderr=subprocess.PIPE,
+                                                    start_new_session=True)
+    self.register_command(process.pid)
+
+    # Outputs are read by tasks the timeout does not cancel, thus the output of a killed script
+    # is kept, as execute_command does
+    reads = asyncio.gather(process.stdout.read(), process.stderr.read())
+
+    try:
+      await asyncio.wait_for(asyncio.shield(asyncio.gather(reads, process.wait())), timeout)
+      returncode = self.get_returncode(process.returncode)
+
+    # Script is still running. Kill it, and the processes it has started
+    except asyncio.TimeoutError:
+      self.cfg.logging.debug("timeout expired after " + str(timeout) + "s : " + command)
+      self.kill_process_group(process.pid)
+      returncode = Key.RETURN_CODE_TIMEOUT.value
+
+    try:
+      # Pipes are closed once the process group has been killed
+      stdout, stderr = await reads
+      await process.wait()
+    finally:
+      self.unregister_command(process.pid)
+
+    # Output is decoded only on failure, the same way execute_command does
+    if returncode == 0:
+      return returncode, stdout, stderr
+
+    return returncode, stdout.decode(Key.UTF8.value), stderr.decode(Key.UTF8.value)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # kill_process_group
+  #
+  # -------------------------------------------------------------------------
+  def kill_process_group(self, pid):
+    """ This method kills the process group leaded by the given pid. Commands
+    are started in their own session, thus the group contains the shell, the
+    script and all the processes it has forked.
+    """
+
+    try:
+      os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+      # Group has already exited on its own
+      self.cfg.logging.debug("process group " + str(pid) + " already exited")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # register_command
+  #
+  # -------------------------------------------------------------------------
+  def register_command(self, pid):
+    """ This method adds a started command to the running commands. If the
+    commands have already been aborted, it is killed right away.
+    """
+
+    with self.commands_lock:
+      self.running_commands.add(pid)
+      if self.aborted:
+        self.kill_process_group(pid)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # unregister_command
+  #
+  # -------------------------------------------------------------------------
+  def unregister_command(self, pid):
+    """ This method removes a completed command from the running commands
+    """
+
+    with self.commands_lock:
+      self.running_commands.discard(pid)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # abort_commands
+  #
+  # -------------------------------------------------------------------------
+  def abort_commands(self):
+    """ This method kills all the running commands. Commands started later
+    are killed as soon as they are registered.
+    """
+
+    with self.commands_lock:
+      self.aborted = True
+      for pid in self.running_commands:
+        self.kill_process_group(pid)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_returncode
+  #
+  # -------------------------------------------------------------------------
+  def get_returncode(self, returncode):
+    """ This method translates the return code of a command killed by
+    abort_commands to Key.RETURN_CODE_SKIPPED.
+    """
+
+    if self.aborted and returncode == -signal.SIGKILL:
+      return Key.RETURN_CODE_SKIPPED.value
+
+    return returncode
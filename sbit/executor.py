@@ -0,0 +1,418 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the execution engines used to run the test scripts.
+
+Engines share the same interface. The submit method starts a command and
+immediatly returns a concurrent.futures.Future which will hold the tuple
+(return code, stdout, stderr, duration) once the command has completed.
+Duration is the wall clock execution time of the command, in seconds.
+
+Engines can be cancelled. Commands which have not started yet are cancelled,
+and running ones are killed.
+
+Engines also enforce the timeouts. Each command can have its own timeout, and
+the whole run can be bounded by a deadline. Commands which are still waiting
+for a slot when the deadline expires are not started at all.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sbit.bash_worker import BashWorker
+from sbit.model import Key
+
+# -----------------------------------------------------------------------------
+#
+#    Class ThreadEngine
+#
+# -----------------------------------------------------------------------------
+class ThreadEngine(object):
+  """This class runs the commands on a pool of threads. Each thread is
+  blocked on its subprocess until it completes.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, command, jobs, deadline=None):
+    """Default constructor. Command is the CliCommand object providing the
+    execute_command method. Deadline is a time.monotonic() value, or None.
+    """
+
+    # Object used to execute the commands
+    self.command = command
+
+    # Time at which all the commands have to be completed
+    self.deadline = deadline
+
+    # Pool of threads running the commands
+    self.pool = ThreadPoolExecutor(max_workers=jobs)
+
+    # List of the submitted futures, used to cancel them
+    self.futures = []
+
+    # Flag set once the engine has been cancelled
+    self.cancelled = False
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # submit
+  #
+  # -------------------------------------------------------------------------
+  def submit(self, script_cmd, timeout=None):
+    """Submit the command to the pool and return the associated future
+    """
+
+    future = self.pool.submit(self.__execute, script_cmd, timeout)
+    self.futures.append(future)
+    return future
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # __execute
+  #
+  # -------------------------------------------------------------------------
+  def __execute(self, script_cmd, timeout):
+    """Run a single command from a pool thread
+    """
+
+    # Engine may have been cancelled while the command was waiting for a thread
+    if self.cancelled:
+      return Key.RETURN_CODE_SKIPPED.value, "", "", 0.0
+
+    # Timeout is computed when the command starts, not when it was submitted
+    timeout = effective_timeout(timeout, self.deadline)
+    if timeout is not None and timeout <= 0:
+      logging.debug("Deadline expired, not running : " + script_cmd)
+      return Key.RETURN_CODE_TIMEOUT.value, "", "", 0.0
+
+    start = time.monotonic()
+    ret, out, err = self.run_command(script_cmd, timeout)
+    return ret, out, err, time.monotonic() - start
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # run_command
+  #
+  # -------------------------------------------------------------------------
+  def run_command(self, script_cmd, timeout):
+    """Run the command as a subprocess, and return the tuple (return code,
+    stdout, stderr)
+    """
+
+    return self.command.execute_command(script_cmd, timeout)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # shutdown
+  #
+  # -------------------------------------------------------------------------
+  def shutdown(self):
+    """Wait for the running commands, then release the pool
+    """
+
+    self.pool.shutdown()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # cancel
+  #
+  # -------------------------------------------------------------------------
+  def cancel(self):
+    """Cancel the commands waiting to be started, and kill the running ones
+    """
+
+    self.cancelled = True
+    for future in list(self.futures):
+      future.cancel()
+    self.command.abort_commands()
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class WorkerEngine
+#
+# -----------------------------------------------------------------------------
+class WorkerEngine(ThreadEngine):
+  """This class runs the commands from persistent bash workers. Each thread
+  of the pool owns a worker, started the first time the thread runs a
+  command. Commands are run by execute_command if a worker cannot be used.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, command, jobs, deadline=None):
+    """Default constructor. Command is the CliCommand object used to register
+    the running commands. Deadline is a time.monotonic() value, or None.
+    """
+
+    super().__init__(command, jobs, deadline)
+
+    # Worker of the current thread
+    self.local = threading.local()
+
+    # List of all the started workers, they are stopped on shutdown
+    self.workers = []
+
+    # Lock protecting the list of the workers
+    self.workers_lock = threading.Lock()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # run_command
+  #
+  # -------------------------------------------------------------------------
+  def run_command(self, script_cmd, timeout):
+    """Run the command from the worker of the current thread. A worker which
+    has exited is replaced, and the command is run by execute_command.
+    """
+
+    worker = getattr(self.local, "worker", None)
+    if worker is None:
+      try:
+        worker = BashWorker(self.command)
+      except OSError as exception:
+        logging.debug("Cannot start bash worker : " + str(exception))
+        return self.command.execute_command(script_cmd, timeout)
+
+      self.local.worker = worker
+      with self.workers_lock:
+        self.workers.append(worker)
+
+    try:
+      return worker.execute(script_cmd, timeout)
+    except OSError as exception:
+      logging.debug("Bash worker failed, running command again : " + str(exception))
+      self.local.worker = None
+      return self.command.execute_command(script_cmd, timeout)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # shutdown
+  #
+  # -------------------------------------------------------------------------
+  def shutdown(self):
+    """Wait for the running commands, then stop the workers and release the
+    pool
+    """
+
+    super().shutdown()
+
+    with self.workers_lock:
+      for worker in self.workers:
+        worker.close()
+      self.workers = []
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class AsyncioEngine
+#
+# -----------------------------------------------------------------------------
+class AsyncioEngine(object):
+  """This class runs the commands as asyncio subprocesses. All the commands
+  are waited for from a single event loop, running in a background thread.
+  Number of commands running at the same time is bounded by a semaphore.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, command, jobs, deadline=None):
+    """Default constructor. Command is the CliCommand object providing the
+    execute_command_async coroutine. Deadline is a time.monotonic() value,
+    or None.
+    """
+
+    # Object used to execute the commands
+    self.command = command
+
+    # Time at which all the commands have to be completed
+    self.deadline = deadline
+
+    # Maximum number of commands running at the same time
+    self.jobs = jobs
+
+    # Semaphore bounding the number of running commands. It is created from the event
+    # loop thread, the first time a command is executed
+    self.semaphore = None
+
+    # Flag set once the engine has been cancelled
+    self.cancelled = False
+
+    # Create the event loop and run it in its own thread. asyncio is imported only when this
+    # engine is used, it is the slowest module to import
+    import asyncio
+    self.loop = asyncio.new_event_loop()
+    self.thread = threading.Thread(target=self.loop.run_forever, name="sbit-asyncio",
+                                   daemon=True)
+    self.thread.start()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # __execute
+  #
+  # -------------------------------------------------------------------------
+  async def __execute(self, script_cmd, timeout):
+    """Coroutine running a single command once a slot is available
+    """
+
+    import asyncio
+
+    # Semaphore has to be created from the loop it is used by
+    if self.semaphore is None:
+      self.semaphore = asyncio.Semaphore(self.jobs)
+
+    async with self.semaphore:
+      # Engine may have been cancelled while the command was waiting for a slot
+      if self.cancelled:
+        return Key.RETURN_CODE_SKIPPED.value, "", "", 0.0
+
+      # Timeout is computed when the command starts, not when it was submitted
+      timeout = effective_timeout(timeout, self.deadline)
+      if timeout is not None and timeout <= 0:
+        logging.debug("Deadline expired, not running : " + script_cmd)
+        return Key.RETURN_CODE_TIMEOUT.value, "", "", 0.0
+
+      start = time.monotonic()
+      ret, out, err = await self.command.execute_command_async(script_cmd, timeout)
+      return ret, out, err, time.monotonic() - start
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # submit
+  #
+  # -------------------------------------------------------------------------
+  def submit(self, script_cmd, timeout=None):
+    """Schedule the command on the event loop and return the associated future
+    """
+
+    import asyncio
+
+    return asyncio.run_coroutine_threadsafe(self.__execute(script_cmd, timeout), self.loop)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # shutdown
+  #
+  # -------------------------------------------------------------------------
+  def shutdown(self):
+    """Stop the event loop and wait for its thread to exit
+    """
+
+    self.loop.call_soon_threadsafe(self.loop.stop)
+    self.thread.join()
+    self.loop.close()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # cancel
+  #
+  # -------------------------------------------------------------------------
+  def cancel(self):
+    """Cancel the commands waiting to be started, and kill the running ones
+    """
+
+    # Tasks are not cancelled, they would be interrupted in the middle of the subprocess
+    # creation. Waiting ones complete immediately as skipped, running ones are killed
+    self.cancelled = True
+    self.command.abort_commands()
+
+
+
+# -------------------------------------------------------------------------
+#
+# create_engine
+#
+# -------------------------------------------------------------------------
+def create_engine(command, cfg):
+  """This function instanciate the execution engine selected in the
+  configuration object.
+  """
+
+  logging.debug("Using " + cfg.executor + " engine with " + str(cfg.jobs) + " parallel jobs")
+
+  # The run deadline starts when the engine is created, right before the first test is submitted
+  deadline = None
+  if cfg.deadline is not None:
+    logging.debug("Run deadline is " + str(cfg.deadline) + " seconds")
+    deadline = time.monotonic() + cfg.deadline
+
+  if cfg.executor == Key.EXECUTOR_ASYNCIO.value:
+    return AsyncioEngine(command, cfg.jobs, deadline)
+
+  if cfg.executor == Key.EXECUTOR_WORKER.value:
+    return WorkerEngine(command, cfg.jobs, deadline)
+
+  return ThreadEngine(command, cfg.jobs, deadline)
+
+
+
+# -------------------------------------------------------------------------
+#
+# effective_timeout
+#
+# -------------------------------------------------------------------------
+def effective_timeout(timeout, deadline):
+  """This function returns the timeout to apply to a command starting now.
+  It is the smallest value between the command timeout and the time left
+  before the deadline. None means no timeout at all.
+  """
+
+  if deadline is None:
+    return timeout
+
+  remaining = deadline - time.monotonic()
+  if timeout is None or remaining < timeout:
+    return remaining
+
+  return timeout
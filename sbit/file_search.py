@@ -0,0 +1,241 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the search of strings in file contents. Patterns
+searched in the same file are registered before the run, then the file is
+opened and mapped in memory once, and all its patterns are searched at once.
+"""
+
+import mmap
+import os
+import re
+import threading
+
+# Characters which are operators in a grep basic regular expression when escaped by a
+# backslash, and literals otherwise. It is the opposite in a Python expression
+BRE_OPERATORS = "(){}|+?"
+
+# Expression matching one UTF-8 encoded non ASCII character. Files are searched as bytes, and
+# grep matches characters in a UTF-8 locale, thus any character is this or an ASCII byte
+UTF8_MULTIBYTE = b"[\\xc2-\\xdf][\\x80-\\xbf]|[\\xe0-\\xef][\\x80-\\xbf]{2}|[\\xf0-\\xf4][\\x80-\\xbf]{3}"
+
+# -----------------------------------------------------------------------------
+#
+#    Class FileSearch
+#
+# -----------------------------------------------------------------------------
+class FileSearch(object):
+  """This class stores, for each file, the patterns to search and the result
+  of the search. Patterns are grep basic regular expressions. A file is
+  searched the first time one of its results is needed.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self):
+    """Default constructor
+    """
+
+    # Hash table mapping file paths to the set of the patterns registered for them
+    self.patterns = {}
+
+    # Hash table mapping file paths to hash tables mapping patterns to the search result
+    self.results = {}
+
+    # Lock protecting the tables, checks may run from several threads
+    self.lock = threading.Lock()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # register
+  #
+  # -------------------------------------------------------------------------
+  def register(self, path, pattern):
+    """This method registers a pattern to search in the given file. It
+    returns False if the pattern is not supported.
+    """
+
+    if translate_bre(pattern) is None:
+      return False
+
+    with self.lock:
+      self.patterns.setdefault(path, set()).add(pattern)
+
+    return True
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # contains
+  #
+  # -------------------------------------------------------------------------
+  def contains(self, path, pattern):
+    """This method returns True if a line of the given file matches the
+    pattern, as grep does. It returns None if the pattern is not supported.
+    It raises OSError if the file cannot be read.
+    """
+
+    if translate_bre(pattern) is None:
+      return None
+
+    with self.lock:
+      # Pattern has not been registered, or registered after the file was searched
+      results = self.results.get(path)
+      if results is None or pattern not in results:
+        patterns = self.patterns.setdefault(path, set())
+        patterns.add(pattern)
+        if results is None:
+          results = self.results.setdefault(path, {})
+        results.update(search_file(path, [item for item in patterns if item not in results]))
+
+      return results[pattern]
+
+
+
+# -------------------------------------------------------------------------
+#
+# search_file
+#
+# -------------------------------------------------------------------------
+def search_file(path, patterns):
+  """This function searches all the patterns in the given file, and returns
+  a hash table mapping each pattern to the result.
+
+  The file is opened and mapped in memory once for all its patterns. Each
+  search stops at the first matching line. Patterns are not combined in a
+  single alternation, the re module only uses its literal prefix search on
+  separate expressions, which makes them much faster.
+  """
+
+  results = dict((pattern, False) for pattern in patterns)
+
+  with open(path, "rb") as working_file:
+    # Empty files cannot be mapped, and have no line to match
+    if os.fstat(working_file.fileno()).st_size == 0:
+      return results
+
+    with mmap.mmap(working_file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+      # Final newline ends the last line, it does not start an empty one
+      end = len(content)
+      if content[end - 1:end] == b"\n":
+        end -= 1
+
+      for pattern in patterns:
+        expression = re.compile(translate_bre(pattern), re.MULTILINE)
+        results[pattern] = expression.search(content, 0, end) is not None
+
+  return results
+
+
+
+# -------------------------------------------------------------------------
+#
+# translate_bre
+#
+# -------------------------------------------------------------------------
+def translate_bre(pattern):
+  """This function translates a grep basic regular expression to a Python
+  bytes expression, which matches the same lines as grep in a UTF-8 locale.
+  It returns None for the constructs it does not support (back references,
+  character classes, GNU extensions, etc.), thus the script is used instead.
+  """
+
+  result = b""
+  index = 0
+
+  # GNU grep anchors at the start of the pattern and after \(, \|, and at its end and before
+  # \), \|. At start is set while no character has been translated since such a position
+  at_start = True
+  while index < len(pattern):
+    char = pattern[index]
+    at_end = index == len(pattern) - 1 or pattern[index + 1:index + 3] in ("\\)", "\\|")
+
+    if char == "\\":
+      if index + 1 >= len(pattern):
+        return None
+      following = pattern[index + 1]
+      at_start = following in "(|"
+      if following == "{" and pattern.find("\\}", index) == -1:
+        return None
+      if following in BRE_OPERATORS:
+        result += following.encode()
+      elif following in ".[]*^$\\/":
+        result += re.escape(following).encode()
+      else:
+        return None
+      index += 2
+      continue
+
+    if char == "[":
+      # Bracket expression. A ] right after [ or [^ is part of the set
+      end = index + 1
+      if end < len(pattern) and pattern[end] == "^":
+        end += 1
+      if end < len(pattern) and pattern[end] == "]":
+        end += 1
+      end = pattern.find("]", end)
+      if end == -1:
+        return None
+      content = pattern[index + 1:end]
+      if "[" in content or "\\" in content or not content.isascii():
+        return None
+      content = content.replace("]", "\\]").encode()
+      if content.startswith(b"^"):
+        # Lines are matched one by one, thus a negated set never matches a newline. It matches
+        # any non ASCII character, which is several bytes long. A leading - is a literal
+        content = content[1:].replace(b"-", b"\\-", 1) if content[1:2] == b"-" else content[1:]
+        result += b"(?:[^\\n\\x80-\\xff" + content + b"]|" + UTF8_MULTIBYTE + b")"
+      else:
+        result += b"[" + content + b"]"
+      index = end + 1
+      at_start = False
+      continue
+
+    if char == "*" and at_start:
+      result += b"\\*"
+    elif char == "^" and not at_start:
+      result += b"\\^"
+    elif char == "$" and not at_end:
+      result += b"\\$"
+    elif char == ".":
+      result += b"(?:[^\\n\\x80-\\xff]|" + UTF8_MULTIBYTE + b")"
+    elif char in BRE_OPERATORS:
+      result += re.escape(char).encode()
+    elif not char.isascii():
+      # A repetition applies to the whole character, not to its last byte
+      result += b"(?:" + re.escape(char.encode()) + b")"
+    else:
+      result += char.encode()
+    index += 1
+    at_start = False
+
+  # Constructs grep rejects (unmatched parenthesis, repetition of nothing, etc.) are left to
+  # grep, thus it reports the error
+  try:
+    re.compile(result)
+  except re.error:
+    return None
+
+  return result
@@ -0,0 +1,388 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the watchers used by the watch mode. A watcher
+waits until one of the given files changes, then returns the changed paths.
+
+The inotify watcher watches the parent directories of the files, thus files
+which do not exist yet are watched too. Files whose parent directory cannot
+be watched are polled. The polling watcher is used when inotify is not
+available.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from sbit.native_checks import split_arguments
+
+# Library scripts whose first argument is the path of the file they check
+WATCHED_CHECKS = set(["fs_directory_dont_exist", "fs_directory_exist",
+                      "fs_file_contains_string", "fs_file_dont_contain_string",
+                      "fs_file_dont_exist", "fs_file_exist", "fs_symlink_exist",
+                      "xml_node_has_text_value"])
+
+# Interval (in seconds) between two checks of the polled files
+POLL_INTERVAL = 1.0
+
+# Delay (in seconds) left to the writer to complete its changes once an event is received
+SETTLE_DELAY = 0.1
+
+# Flags and event masks defined in sys/inotify.h
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# Events received for the entries of a watched directory, and for the directory itself
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+             IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# Header of an inotify event : watch descriptor, mask, cookie and length of the name
+EVENT_HEADER = struct.Struct("iIII")
+
+# -----------------------------------------------------------------------------
+#
+#    Class FileWatcher
+#
+# -----------------------------------------------------------------------------
+class FileWatcher(object):
+  """This class polls the given files. A file has changed when its type,
+  inode, size, modification or change time differ from the previous check,
+  or when it has been created or removed. Symbolic links are checked, and so
+  are their targets.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, paths, interval=POLL_INTERVAL):
+    """Default constructor. The state of the files is read immediately, the
+    changes are relative to it.
+    """
+
+    # Interval between two checks of the polled files
+    self.interval = interval
+
+    # Hash table mapping the watched paths to their last known state
+    self.states = {}
+    for path in paths:
+      self.states[path] = get_state(path)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # poll
+  #
+  # -------------------------------------------------------------------------
+  def poll(self, paths):
+    """This method checks the given paths, and returns the set of the ones
+    which have changed since the previous check
+    """
+
+    changed = set()
+    for path in paths:
+      state = get_state(path)
+      if state != self.states[path]:
+        self.states[path] = state
+        changed.add(path)
+
+    return changed
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # wait
+  #
+  # -------------------------------------------------------------------------
+  def wait(self):
+    """This method waits until at least one file changes, then returns the
+    set of the changed paths
+    """
+
+    while True:
+      changed = self.poll(self.states)
+      if len(changed) > 0:
+        return changed
+      time.sleep(self.interval)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """There is nothing to release
+    """
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class InotifyWatcher
+#
+# -----------------------------------------------------------------------------
+class InotifyWatcher(FileWatcher):
+  """This class waits for the inotify events of the parent directories of
+  the files, then checks only the files named by the events. The directory
+  of the target of a symbolic link is watched as well.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, paths, interval=POLL_INTERVAL):
+    """Default constructor. It raises OSError if inotify is not available.
+    """
+
+    FileWatcher.__init__(self, paths, interval)
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+      raise OSError("inotify is not available")
+
+    self.add_watch = libc.inotify_add_watch
+    self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if self.fd < 0:
+      raise OSError(ctypes.get_errno(), "Cannot initialize inotify")
+
+    # Hash tables mapping the watch descriptors to the directories, and the reverse. Paths of
+    # the same directory (through a symbolic link, a bind mount, etc.) share a descriptor
+    self.directories = {}
+    self.descriptors = {}
+
+    # Hash table mapping the (directory, name) tuples to the set of the paths they affect
+    self.names = {}
+
+    # Paths whose directories cannot be watched (they do not exist yet, etc.), thus polled
+    self.polled = set()
+
+    for path in self.states:
+      self.watch(path)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # watch
+  #
+  # -------------------------------------------------------------------------
+  def watch(self, path):
+    """This method watches the directory of the given path, and the one of
+    its target if it is a symbolic link. The path is polled if one of them
+    cannot be watched.
+    """
+
+    watched = True
+    for target in set([path, os.path.realpath(path)]):
+      directory, name = os.path.split(target)
+      if directory not in self.descriptors:
+        descriptor = self.add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if descriptor < 0:
+          watched = False
+          continue
+        self.directories.setdefault(descriptor, set()).add(directory)
+        self.descriptors[directory] = descriptor
+      self.names.setdefault((directory, name), set()).add(path)
+
+    if watched:
+      self.polled.discard(path)
+    else:
+      self.polled.add(path)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # read_events
+  #
+  # -------------------------------------------------------------------------
+  def read_events(self):
+    """This method reads the pending events, and returns the set of the
+    paths they may affect
+    """
+
+    paths = set()
+    while True:
+      try:
+        data = os.read(self.fd, 65536)
+      except BlockingIOError:
+        return paths
+
+      offset = 0
+      while offset < len(data):
+        descriptor, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+        name = os.fsdecode(data[offset + EVENT_HEADER.size:
+                                offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+        offset += EVENT_HEADER.size + length
+
+        # Events have been lost, any file may have changed
+        if mask & IN_Q_OVERFLOW:
+          paths.update(self.states)
+          continue
+
+        directories = self.directories.get(descriptor, set())
+
+        # Event about an entry of the directory
+        if len(name) > 0:
+          for directory in directories:
+            paths.update(self.names.get((directory, name), set()))
+          continue
+
+        # Directory itself has been removed or moved. Its files are polled until it is back
+        affected = set()
+        for (parent, entry), targets in self.names.items():
+          if parent in directories:
+            affected.update(targets)
+        paths.update(affected)
+
+        if mask & IN_IGNORED:
+          for directory in self.directories.pop(descriptor, set()):
+            del self.descriptors[directory]
+          self.polled.update(affected)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # wait
+  #
+  # -------------------------------------------------------------------------
+  def wait(self):
+    """This method waits until at least one file changes, then returns the
+    set of the changed paths
+    """
+
+    while True:
+      # Polled files are checked first. Their directory may have been created meanwhile, they
+      # are watched from now on
+      paths = set(self.polled)
+      for path in paths:
+        self.watch(path)
+      changed = self.poll(paths)
+
+      if len(changed) == 0:
+        timeout = self.interval if len(self.polled) > 0 else None
+        if len(select.select([self.fd], [], [], timeout)[0]) > 0:
+          time.sleep(SETTLE_DELAY)
+          changed = self.poll(self.read_events())
+
+      # Symbolic links may point to another directory now
+      for path in changed:
+        self.watch(path)
+
+      if len(changed) > 0:
+        return changed
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """This method releases the inotify instance, and all its watches
+    """
+
+    os.close(self.fd)
+
+
+
+# -------------------------------------------------------------------------
+#
+# create_watcher
+#
+# -------------------------------------------------------------------------
+def create_watcher(paths):
+  """This function returns the inotify watcher of the given files, or the
+  polling one if inotify is not available
+  """
+
+  try:
+    return InotifyWatcher(paths)
+  except OSError as exception:
+    logging.debug("Using polling watcher : " + str(exception))
+    return FileWatcher(paths)
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_state
+#
+# -------------------------------------------------------------------------
+def get_state(path):
+  """This function returns the state of a file, and of its target if it is
+  a symbolic link. Missing files have a None state.
+  """
+
+  state = []
+  for function in [os.lstat, os.stat]:
+    try:
+      status = function(path)
+      state.append((status.st_mode, status.st_ino, status.st_size, status.st_mtime_ns,
+                    status.st_ctime_ns))
+    except OSError:
+      state.append(None)
+
+  return tuple(state)
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_watched_path
+#
+# -------------------------------------------------------------------------
+def get_watched_path(script_path, args):
+  """This function returns the absolute path of the file checked by a test,
+  or None if its script does not check a file, or if the path cannot be
+  known before the script runs (shell expansions, etc.)
+  """
+
+  if os.path.basename(script_path) not in WATCHED_CHECKS:
+    return None
+
+  args = split_arguments(args, True)
+  if args is None or len(args) == 0:
+    return None
+
+  return os.path.abspath(args[0])
@@ -0,0 +1,249 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the network interface table. Interface states are
+read once from /sys/class/net, and addresses are dumped once from the kernel
+through a netlink socket, then interface checks are answered from the table.
+"""
+
+import os
+import socket
+import struct
+
+# Interface flags, from linux/if.h
+IFF_UP = 0x1
+
+# Netlink constants, from linux/netlink.h and linux/rtnetlink.h
+NETLINK_ROUTE = 0
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+# Formats of the netlink message header, of the address message and of the attribute header
+NLMSG_HEADER = struct.Struct("=IHHII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR_HEADER = struct.Struct("=HH")
+
+# -----------------------------------------------------------------------------
+#
+#    Class InterfaceTable
+#
+# -----------------------------------------------------------------------------
+class InterfaceTable(object):
+  """This class stores the state of each network interface (operational
+  state, flags and MTU), and their IPv4 and IPv6 addresses.
+
+  Attributes are read from <root>/sys/class/net, thus the root can point to
+  a fixture directory. Addresses are not part of sysfs, they are read from
+  the running kernel the first time they are needed.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, root="/"):
+    """Default constructor. /sys/class/net is scanned immediately. It raises
+    OSError if it cannot be read.
+    """
+
+    # Path to the network class directory
+    self.directory = os.path.join(root, "sys/class/net")
+
+    # Hash table mapping interface names to hash tables of their attributes
+    self.interfaces = {}
+
+    # Hash table mapping address families to hash tables mapping interface names to the list
+    # of their addresses. None until the addresses are loaded
+    self.addresses = None
+
+    self.load()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load
+  #
+  # -------------------------------------------------------------------------
+  def load(self):
+    """This method reads the attributes of all the interfaces. Attributes
+    which cannot be read are set to None.
+    """
+
+    for entry in os.scandir(self.directory):
+      attributes = {}
+      for attribute in ["ifindex", "flags", "mtu", "operstate"]:
+        try:
+          with open(os.path.join(entry.path, attribute), "r") as working_file:
+            attributes[attribute] = working_file.read().strip()
+        except OSError:
+          attributes[attribute] = None
+
+      self.interfaces[entry.name] = attributes
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # has_interface
+  #
+  # -------------------------------------------------------------------------
+  def has_interface(self, name):
+    """This method returns True if the given interface exists
+    """
+
+    return name in self.interfaces
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_attribute
+  #
+  # -------------------------------------------------------------------------
+  def get_attribute(self, name, attribute):
+    """This method returns the given attribute of an interface, as read from
+    sysfs, or None if it is not available
+    """
+
+    return self.interfaces[name][attribute]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # has_carrier
+  #
+  # -------------------------------------------------------------------------
+  def has_carrier(self, name):
+    """This method returns False if the interface would be flagged as
+    NO-CARRIER by ip link, that is administratively up but not running. The
+    kernel considers an interface running if its operational state is up or
+    unknown.
+    """
+
+    flags = int(self.get_attribute(name, "flags"), 16)
+    if not flags & IFF_UP:
+      return True
+
+    return self.get_attribute(name, "operstate") in ["up", "unknown"]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_addresses
+  #
+  # -------------------------------------------------------------------------
+  def get_addresses(self, name, family):
+    """This method returns the list of the addresses of the given interface
+    and family (socket.AF_INET or socket.AF_INET6). It raises OSError if the
+    addresses cannot be retrieved.
+    """
+
+    if self.addresses is None:
+      self.addresses = self.load_addresses()
+
+    return self.addresses[family].get(name, [])
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load_addresses
+  #
+  # -------------------------------------------------------------------------
+  def load_addresses(self):
+    """This method dumps the addresses of all the interfaces with a single
+    RTM_GETADDR netlink request. Interfaces are identified by their index,
+    which is mapped to their name using the sysfs attributes.
+    """
+
+    names = {}
+    for name, attributes in self.interfaces.items():
+      if attributes["ifindex"] is not None:
+        names[int(attributes["ifindex"])] = name
+
+    addresses = {socket.AF_INET: {}, socket.AF_INET6: {}}
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as netlink:
+      request = NLMSG_HEADER.pack(NLMSG_HEADER.size + IFADDRMSG.size, RTM_GETADDR,
+                                  NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+      netlink.sendall(request + IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0))
+
+      done = False
+      while not done:
+        data = netlink.recv(65536)
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+          length, msg_type, flags, seq, pid = NLMSG_HEADER.unpack_from(data, offset)
+          if length < NLMSG_HEADER.size:
+            raise OSError("Invalid netlink message")
+
+          if msg_type == NLMSG_DONE:
+            done = True
+            break
+
+          if msg_type == NLMSG_ERROR:
+            raise OSError("Netlink address dump failed")
+
+          if msg_type == RTM_NEWADDR:
+            self.parse_address(data[offset + NLMSG_HEADER.size:offset + length], names, addresses)
+
+          # Messages are aligned on 4 bytes
+          offset += (length + 3) & ~3
+
+    return addresses
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # parse_address
+  #
+  # -------------------------------------------------------------------------
+  def parse_address(self, message, names, addresses):
+    """This method parses a RTM_NEWADDR message, then stores the address in
+    the table. Local address is used if defined, as ip addr does for point to
+    point interfaces.
+    """
+
+    family, prefix_length, flags, scope, index = IFADDRMSG.unpack_from(message, 0)
+    if family not in addresses or index not in names:
+      return
+
+    attributes = {}
+    offset = IFADDRMSG.size
+    while offset + RTATTR_HEADER.size <= len(message):
+      length, attr_type = RTATTR_HEADER.unpack_from(message, offset)
+      if length < RTATTR_HEADER.size:
+        break
+      attributes[attr_type] = message[offset + RTATTR_HEADER.size:offset + length]
+      offset += (length + 3) & ~3
+
+    address = attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS))
+    if address is not None:
+      addresses[family].setdefault(names[index], []).append(socket.inet_ntop(family, address))
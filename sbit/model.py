@@ -25,7 +25,8 @@ used to load its content fom yaml configuration file.
 import os
 import logging
 from enum import Enum
-import yaml
+from sbit.suite_cache import USER_CACHE_DIR
+from sbit.suite_cache import load_suite_file
 
 
 # -----------------------------------------------------------------------------
@@ -44,36 +45,92 @@ class Key(Enum):
   # Define each and every key and associated string used in the tool
   AGGREGATION_LEVEL = "aggregation_level"
   ARGS = "args"
+  BATCH = "batch"
+  BATCH_OPTION = "--sbit-batch"
+  CACHE_DIR = "cache_dir"
+  CACHE_FINGERPRINT = "cache_fingerprint"
+  CACHE_STDERR = "stderr"
+  CACHE_STDOUT = "stdout"
+  CACHE_TIMESTAMP = "timestamp"
+  CACHE_TTL = "cache_ttl"
   CATEGORY = "category"
   CHECK_LIBRARY = "check-library"
   CHECK_SUITE = "check-suite"
+  EXECUTOR = "executor"
+  EXECUTOR_ASYNCIO = "asyncio"
+  EXECUTOR_THREAD = "thread"
+  EXECUTOR_WORKER = "worker"
+  FACTS_DIR_VARIABLE = "SBIT_FACTS_DIR"
   FAIL_FAST = "fail_fast"
+  INTERVAL = "interval"
+  JOBS = "jobs"
+  KERNEL_RELEASE_VARIABLE = "SBIT_KERNEL_RELEASE"
   LIBRARY = "library"
   LOG_LEVEL = "log_level"
   LOG_LEVEL_INFO = "INFO"
+  NATIVE = "native"
   NO_RESULT_CACHE = "no_result_cache"
   ONLY_ERRORS = "only_errors"
   OPT_AGGREGATION_LEVEL = "--aggregation-level"
+  OPT_CACHE_DIR = "--cache-dir"
+  OPT_CACHE_FINGERPRINT = "--cache-fingerprint"
+  OPT_CACHE_TTL = "--cache-ttl"
   OPT_CATEGORY = "--category"
+  OPT_DEADLINE = "--deadline"
+  OPT_EXECUTOR = "--executor"
   OPT_FAIL_FAST = "--fail-fast"
+  OPT_INTERVAL = "--interval"
   OPT_HELP_COMMAND = "Command to execute"
+  OPT_JOBS = "--jobs"
   OPT_LIBRARY = "--library"
   OPT_LOG_LEVEL = "--log-level"
+  OPT_NO_NATIVE = "--no-native"
   OPT_ONLY_ERRORS = "--only-errors"
+  OPT_REFRESH = "--refresh"
+  OPT_REPORT = "--report"
   OPT_SUITE = "--suite"
+  OPT_TIMEOUT = "--timeout"
+  OPT_WATCH = "--watch"
   OPT_SHOW_HINTS = "--show-hints"
+  OPT_SOCKET = "--socket"
   OPT_NO_RESULT_CACHE = "--no-result-cache"
+  REFRESH = "refresh"
+  REPORT = "report"
+  REPORT_JSONL = "jsonl"
+  REPORT_JUNIT = "junit"
+  REPORT_TAP = "tap"
+  RESULT_DURATION = "duration"
+  RESULT_HINT = "hint"
+  RESULT_RETURN_CODE = "return_code"
+  RESULT_STATUS = "status"
   RUN_SUITE = "run"
   SCRIPT = "script"
+  SERVE_SUITE = "serve"
+  SOCKET = "socket"
   DESCRIPTION = "description"
+  DEADLINE = "deadline"
   SUITE = "suite"
   SHOW_HINTS = "show_hints"
+  STATUS_KO = "KO"
+  STATUS_OK = "OK"
+  STATUS_SKIPPED = "SKIPPED"
+  STATUS_TIMEOUT = "TIMEOUT"
   TEST = "test"
   TEST_LIBRARY_PATH = "test_library_path"
   TEST_SUITE = "test-suite"
   TEST_SUITE_PATH = "test_suite_path"
+  TIMEOUT = "timeout"
   UTF8 = "utf-8"
+  WATCH = "watch"
   OUTPUT_RESULT_PADDING = 75
+  # Return code used for scripts killed on timeout. Value is out of the range of process exit
+  # codes and signal numbers, thus it cannot be confused with a code returned by a script
+  RETURN_CODE_TIMEOUT = -1000
+  # Return code used for tests which were not run, or terminated, because of fail fast
+  RETURN_CODE_SKIPPED = -1001
+  # Return code of the library scripts called with a wrong number of arguments. Scripts return
+  # -1 from their setup function, which is turned into 255 by the shell
+  RETURN_CODE_WRONG_ARGUMENTS = 255
 
 
 # -----------------------------------------------------------------------------
@@ -138,6 +195,62 @@ class Configuration(object):
     # diffrent argument values)
     self.use_results_cache = True
 
+    # Number of tests scripts executed in parallel by the worker pool. Default is to run
+    # the tests one at a time
+    self.jobs = 1
+
+    # Defines the engine used to execute the test scripts. Thread engine runs each script
+    # from a pool thread, asyncio engine waits for all the scripts from a single event loop,
+    # worker engine runs the scripts from persistent bash processes
+    self.executor = Key.EXECUTOR_THREAD.value
+
+    # Default timeout (in seconds) applied to each test script. It can be overriden per test
+    # using the timeout key in the test suite file. None means no timeout
+    self.timeout = None
+
+    # Maximum duration (in seconds) of the whole run. Scripts still running when it expires
+    # are killed. None means no deadline
+    self.deadline = None
+
+    # Directory storing the persistent results cache. None means the persistent cache is not used
+    self.cache_dir = None
+
+    # Default time to live (in seconds) of the persistent cache entries. It can be overriden per
+    # category or per test using the cache_ttl key. Tests without time to live are never cached
+    self.cache_ttl = None
+
+    # String identifying the environment. Results stored with another fingerprint are not used
+    self.cache_fingerprint = None
+
+    # Flag used to ignore the persistent cache entries. Results are still stored
+    self.refresh = False
+
+    # Flag used to stop the run at the first failed test
+    self.fail_fast = False
+
+    # List of the structured reports to generate. Each item is a "format:path" string. Path
+    # is optional, report is written to stdout if it is missing or equal to "-"
+    self.report = []
+
+    # Writers of the reports, opened while the options are checked. They are used by the first
+    # run, the next ones open the reports again
+    self.report_writers = []
+
+    # Flag used to run the library checks having a native implementation in-process. When it
+    # is False, the scripts are always executed
+    self.native = True
+
+    # Path to the Unix socket the daemon receives the run requests from
+    self.socket = "~/.sbit.sock"
+
+    # Interval (in seconds) between the runs scheduled by the daemon. None means runs are only
+    # executed on request
+    self.interval = None
+
+    # Flag used to watch the files checked by the tests once the suite has run, and to run again
+    # the tests whose files change
+    self.watch = False
+
   # ---------------------------------------------------------------------------
   #
   # load_configuration
@@ -161,18 +274,18 @@ class Configuration(object):
     try:
       # Check it the configuration file exist
       if os.path.isfile(self.filename):
-        # Yes then, load it
-        with open(self.filename, 'r') as working_file:
-          self.configuration = yaml.load(working_file)
-
-          # Now we may have to expand a few paths...
-          # First check if the configurationis really defined
-          if self.configuration is not None:
-            # First let's process test_suite_path
-            if Key.TEST_SUITE_PATH.value in self.configuration:
-              # Check if path starts with ~ and need expension
-              self.configuration[Key.TEST_SUITE_PATH.value] = \
-                          os.path.expanduser(self.configuration[Key.TEST_SUITE_PATH.value])
+        # Yes then, load it. It is compiled to the user cache directory as the suites are,
+        # thus PyYAML is not imported while the file does not change
+        self.configuration = load_suite_file(self.filename, USER_CACHE_DIR)
+
+        # Now we may have to expand a few paths...
+        # First check if the configurationis really defined
+        if self.configuration is not None:
+          # First let's process test_suite_path
+          if Key.TEST_SUITE_PATH.value in self.configuration:
+            # Check if path starts with ~ and need expension
+            self.configuration[Key.TEST_SUITE_PATH.value] = \
+                        os.path.expanduser(self.configuration[Key.TEST_SUITE_PATH.value])
 
     # Catch all OSError exceptions that may have occured. Mostly file errors...
     except OSError as exception:
@@ -221,8 +334,10 @@ class TestSuite(object):
   # load
   #
   # ---------------------------------------------------------------------------
-  def load(self, filename=None):
-    """ This method load the test suite definition from the given YAML file
+  def load(self, filename=None, cache_dir=None):
+    """ This method load the test suite definition from the given YAML file.
+    The compiled suite is used instead if it is up to date. It is stored next
+    to the suite file, or in the given cache directory.
     """
 
     # If a new filename has been passed as argument, then store it
@@ -242,8 +357,7 @@ class TestSuite(object):
       # Check it the configuration file exist
       if os.path.isfile(self.filename):
         # Yes then, load it
-        with open(self.filename, 'r') as working_file:
-          self.suite = yaml.load(working_file)
+        self.suite = load_suite_file(self.filename, cache_dir)
       else:
         # No then output an error
         self.logging.critical("The file " + self.filename + " does not exist. Aborting.")
@@ -253,3 +367,120 @@ class TestSuite(object):
     except OSError as exception:
       self.logging.critical("Error: " + exception.filename + "- " + exception.strerror)
       exit(1)
+
+
+
+# -----------------------------------------------------------------------------
+#
+# class TestResult
+#
+# -----------------------------------------------------------------------------
+class TestResult(object):
+  """This class defines the result of a single test. It is the structured
+  counterpart of the lines output to the console, and is used by the report
+  writers.
+  """
+
+  # ---------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # ---------------------------------------------------------------------------
+  def __init__(self, category_path, test, return_code, duration, hint):
+    """Default constructor. Test is the test node from the suite plan.
+    """
+
+    # List of the names of the categories, from the root to the category of the test
+    self.category_path = category_path
+
+    # Test definition
+    self.script = test.script
+    self.args = test.args
+    self.description = test.description
+
+    # Return code of the script, and time it took to run (in seconds)
+    self.return_code = return_code
+    self.duration = duration
+
+    # Hint associated to the return code. Empty on success
+    self.hint = hint
+
+
+
+  # ---------------------------------------------------------------------------
+  #
+  # get_status
+  #
+  # ---------------------------------------------------------------------------
+  def get_status(self):
+    """This method returns the status of the test (one of the Key.STATUS_*
+    values)
+    """
+
+    if self.return_code == 0:
+      return Key.STATUS_OK.value
+    if self.return_code == Key.RETURN_CODE_TIMEOUT.value:
+      return Key.STATUS_TIMEOUT.value
+    if self.return_code == Key.RETURN_CODE_SKIPPED.value:
+      return Key.STATUS_SKIPPED.value
+    return Key.STATUS_KO.value
+
+
+
+  # ---------------------------------------------------------------------------
+  #
+  # get_name
+  #
+  # ---------------------------------------------------------------------------
+  def get_name(self):
+    """This method returns the name of the test, which is its description if
+    defined, or the script command line otherwise
+    """
+
+    if self.description is not None:
+      return self.description
+
+    return self.get_command_line()
+
+
+
+  # ---------------------------------------------------------------------------
+  #
+  # get_command_line
+  #
+  # ---------------------------------------------------------------------------
+  def get_command_line(self):
+    """This method returns the script name, followed by the arguments if
+    any
+    """
+
+    if len(self.args) > 0:
+      return self.script + " " + self.args
+
+    return self.script
+
+
+
+  # ---------------------------------------------------------------------------
+  #
+  # to_dict
+  #
+  # ---------------------------------------------------------------------------
+  def to_dict(self):
+    """This method returns the result as a dictionnary, ready for
+    serialization. The return code is None if the script has been killed or
+    has not been run.
+    """
+
+    return_code = self.return_code
+    if self.get_status() in [Key.STATUS_TIMEOUT.value, Key.STATUS_SKIPPED.value]:
+      return_code = None
+
+    return {Key.CATEGORY.value: self.category_path,
+            Key.SCRIPT.value: self.script,
+            Key.ARGS.value: self.args,
+            Key.DESCRIPTION.value: self.description,
+            Key.RESULT_STATUS.value: self.get_status(),
+            Key.RESULT_RETURN_CODE.value: return_code,
+            Key.RESULT_DURATION.value: round(self.duration, 6),
+            Key.RESULT_HINT.value: self.hint}
@@ -0,0 +1,201 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the index of the mount table. It is parsed once
+from /proc/self/mountinfo, then mount checks are answered by a lookup on the
+mount point or on the source device.
+"""
+
+import os
+import re
+
+# Path to the mount table, relative to the root directory
+MOUNTINFO_PATH = "proc/self/mountinfo"
+
+# Options set on each mount. The super block options have them too, but a bind mount can be
+# read only while its file system is read write, thus they are taken from the mount only
+MOUNT_ONLY_OPTIONS = set(["ro", "rw"])
+
+# Characters escaped by the kernel in the mount table (space, tab, newline, backslash)
+ESCAPED_CHARACTER = re.compile(r"\\([0-7]{3})")
+
+# -----------------------------------------------------------------------------
+#
+#    Class MountEntry
+#
+# -----------------------------------------------------------------------------
+class MountEntry(object):
+  """This class describes a single mount
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, mount_point, source, fstype, options, super_options):
+    """Default constructor. Options is the set of the per mount options, and
+    super options the set of the super block options.
+    """
+
+    self.mount_point = mount_point
+    self.source = source
+    self.fstype = fstype
+    self.options = options
+    self.super_options = super_options - MOUNT_ONLY_OPTIONS
+
+    # Names of the options, without their value (size=10k gives size)
+    self.option_names = set(option.split("=", 1)[0]
+                            for option in self.options | self.super_options)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # has_option
+  #
+  # -------------------------------------------------------------------------
+  def has_option(self, option):
+    """This method returns True if the given option, or option name, is set.
+    File system specific options are searched in the super block options.
+    """
+
+    return option in self.options or option in self.super_options or \
+           option in self.option_names
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class MountIndex
+#
+# -----------------------------------------------------------------------------
+class MountIndex(object):
+  """This class indexes the mounts by mount point and by source device.
+
+  When several file systems are mounted on the same mount point, the last one
+  hides the others, thus it is the one indexed.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, root="/"):
+    """Default constructor. The mount table is parsed immediately. It raises
+    OSError if it cannot be read.
+    """
+
+    # Path to the mount table
+    self.filename = os.path.join(root, MOUNTINFO_PATH)
+
+    # Hash table mapping mount points to their MountEntry
+    self.mount_points = {}
+
+    # Hash table mapping source devices to the list of their MountEntry
+    self.sources = {}
+
+    self.load()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load
+  #
+  # -------------------------------------------------------------------------
+  def load(self):
+    """This method parses the mount table. Line format is :
+    id parent major:minor root mount_point options [optional...] - fstype source super_options
+    """
+
+    with open(self.filename, "r") as working_file:
+      lines = working_file.read().splitlines()
+
+    for line in lines:
+      fields = line.split()
+      if "-" not in fields[6:]:
+        continue
+
+      separator = fields.index("-", 6)
+      if len(fields) < separator + 3:
+        continue
+
+      super_options = set()
+      if len(fields) > separator + 3:
+        super_options = set(fields[separator + 3].split(","))
+
+      entry = MountEntry(unescape(fields[4]), unescape(fields[separator + 2]),
+                         fields[separator + 1], set(fields[5].split(",")), super_options)
+
+      self.mount_points[entry.mount_point] = entry
+      self.sources.setdefault(entry.source, []).append(entry)
+
+      # Device can be given through a link (/dev/disk/by-uuid, /dev/mapper, etc.)
+      if entry.source.startswith("/"):
+        real_source = os.path.realpath(entry.source)
+        if real_source != entry.source:
+          self.sources.setdefault(real_source, []).append(entry)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_mount
+  #
+  # -------------------------------------------------------------------------
+  def get_mount(self, mount_point):
+    """This method returns the MountEntry of the given mount point, or None
+    if nothing is mounted on it
+    """
+
+    return self.mount_points.get(os.path.normpath(mount_point))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_source_mounts
+  #
+  # -------------------------------------------------------------------------
+  def get_source_mounts(self, source):
+    """This method returns the list of the MountEntry of the given device.
+    The list is empty if it is not mounted.
+    """
+
+    mounts = self.sources.get(source)
+    if mounts is None and source.startswith("/"):
+      mounts = self.sources.get(os.path.realpath(source))
+
+    return mounts or []
+
+
+
+# -------------------------------------------------------------------------
+#
+# unescape
+#
+# -------------------------------------------------------------------------
+def unescape(field):
+  """This function decodes the octal sequences used by the kernel to escape
+  the characters of the paths
+  """
+
+  return ESCAPED_CHARACTER.sub(lambda match: chr(int(match.group(1), 8)), field)
@@ -0,0 +1,789 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements in-process versions of the simplest library
+scripts. Running them from Python avoids starting a shell, and the commands
+forked by the shell, for checks reading a single file.
+
+Native checks return the same codes as the scripts, thus hints still come from
+the @SBIT lines of the scripts. Kernel files are read from the system facts
+snapshot, shared with the scripts. The scripts remain the reference, they are
+used whenever a native check cannot reproduce exactly what the shell would do
+(shell expansion in arguments, unreadable files, etc.).
+
+Only the scripts of the bundled library are replaced. A script of another
+library having the same name is executed, unless it is a copy of the bundled
+one.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shlex
+import socket
+import stat
+import time
+from sbit.model import Key
+
+# Directories of the bundled library, in the source tree and once installed
+BUNDLED_LIBRARIES = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "test-library"),
+                     "/usr/share/sbit/test-library"]
+
+# Hash table caching, for each script path, whether it is a bundled script
+BUNDLED_SCRIPTS = {}
+
+# Characters which would be interpreted by the shell. Arguments using them are passed to the script
+SHELL_CHARACTERS = set("$`\\\"'*?[]{}~;&|<>()!#")
+
+# Characters which are still interpreted by the shell between double quotes
+DOUBLE_QUOTED_CHARACTERS = set("$`\\!")
+
+# -----------------------------------------------------------------------------
+#
+#    Class NativeCheckFallback
+#
+# -----------------------------------------------------------------------------
+class NativeCheckFallback(Exception):
+  """This exception is raised by a native check which cannot produce the same
+  result as the script. The script is then executed.
+  """
+
+
+
+# -------------------------------------------------------------------------
+#
+# read_lines
+#
+# -------------------------------------------------------------------------
+def read_lines(facts, name):
+  """This function returns the lines of the given fact. Files which cannot be
+  read are left to the scripts, which have their own way to fail.
+  """
+
+  lines = facts.get_lines(name)
+  if lines is None:
+    raise NativeCheckFallback(name)
+
+  return lines
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_provider
+#
+# -------------------------------------------------------------------------
+def get_provider(provider):
+  """This function returns the given provider. Checks are left to the scripts
+  if the provider cannot be created.
+  """
+
+  if provider is None:
+    raise NativeCheckFallback()
+
+  return provider
+
+
+
+# -------------------------------------------------------------------------
+#
+# contains_word
+#
+# -------------------------------------------------------------------------
+def contains_word(line, word):
+  """This function returns True if word is found in line, as grep -w would
+  """
+
+  return re.search(r"(?<!\w)" + re.escape(word) + r"(?!\w)", line) is not None
+
+
+
+# -------------------------------------------------------------------------
+#
+# Native checks. Each of them receives the list of arguments, which has the
+# expected length, and the system facts snapshot. It returns the code the
+# script would have returned.
+#
+# -------------------------------------------------------------------------
+def fs_file_exist(args, facts):
+  """Native version of fs_file_exist
+  """
+  return 0 if os.path.isfile(args[0]) else 1
+
+
+
+def fs_file_dont_exist(args, facts):
+  """Native version of fs_file_dont_exist
+  """
+  return 1 if os.path.isfile(args[0]) else 0
+
+
+
+def fs_directory_exist(args, facts):
+  """Native version of fs_directory_exist
+  """
+  return 0 if os.path.isdir(args[0]) else 1
+
+
+
+def fs_directory_dont_exist(args, facts):
+  """Native version of fs_directory_dont_exist
+  """
+  return 1 if os.path.isdir(args[0]) else 0
+
+
+
+def fs_symlink_exist(args, facts):
+  """Native version of fs_symlink_exist
+  """
+  return 0 if os.path.islink(args[0]) else 1
+
+
+
+def cpu_feature_is_available(args, facts):
+  """Native version of cpu_feature_is_available. Only the first Features line
+  of /proc/cpuinfo is searched
+  """
+  for line in read_lines(facts, "cpuinfo"):
+    if line.startswith("Features"):
+      return 0 if contains_word(line, args[0]) else 1
+  return 1
+
+
+
+def cpu_available_processor_count(args, facts):
+  """Native version of cpu_available_processor_count
+  """
+  count = 0
+  for line in read_lines(facts, "cpuinfo"):
+    if line.startswith("processor"):
+      count += 1
+  return 0 if args[0] == str(count) else 1
+
+
+
+def mem_available_physical_amount(args, facts):
+  """Native version of mem_available_physical_amount. Amount is compared as
+  a string, in kB
+  """
+  values = []
+  for line in read_lines(facts, "meminfo"):
+    if line.startswith("MemTotal"):
+      values.append(line.split()[1])
+  return 0 if args[0] == "\n".join(values) else 1
+
+
+
+def kernel_has_filesystem_available(args, facts):
+  """Native version of kernel_has_filesystem_available
+  """
+  for line in read_lines(facts, "filesystems"):
+    if contains_word(line, args[0]):
+      return 0
+  return 1
+
+
+
+def kernel_has_version(args, facts):
+  """Native version of kernel_has_version
+  """
+  return 0 if args[0] == facts.get_kernel_release() else 1
+
+
+
+def deb_package_is_installed(args, facts):
+  """Native version of deb_package_is_installed. Package must have a single
+  installed instance
+  """
+  if ":" in args[0]:
+    raise NativeCheckFallback(args[0])
+  return 0 if get_provider(facts.get_packages()).count_installed(args[0]) == 1 else 1
+
+
+
+def deb_package_is_not_installed(args, facts):
+  """Native version of deb_package_is_not_installed
+  """
+  if ":" in args[0]:
+    raise NativeCheckFallback(args[0])
+  return 1 if get_provider(facts.get_packages()).count_installed(args[0]) == 1 else 0
+
+
+
+def check_process_states(processes, pids, zombie_code, dead_code):
+  """This function returns the given codes if one of the processes is in
+  zombie or in uninterruptible (reported as dead) state, 0 otherwise
+  """
+  for pid in pids:
+    if processes.get_state(pid) == "Z":
+      return zombie_code
+    if processes.get_state(pid) == "D":
+      return dead_code
+  return 0
+
+
+
+def process_is_running(args, facts):
+  """Native version of process_is_running
+  """
+  processes = get_provider(facts.get_processes())
+  pids = processes.get_pids(args[0])
+  if len(pids) == 0:
+    return 1
+  return check_process_states(processes, pids, 2, 3)
+
+
+
+def process_is_not_running(args, facts):
+  """Native version of process_is_not_running
+  """
+  return 1 if len(get_provider(facts.get_processes()).get_pids(args[0])) > 0 else 0
+
+
+
+def process_is_running_once(args, facts):
+  """Native version of process_is_running_once and
+  process_is_running_single_instance
+  """
+  processes = get_provider(facts.get_processes())
+  pids = processes.get_pids(args[0])
+  if len(pids) == 0:
+    return 1
+  if len(pids) != 1:
+    return 2
+  return check_process_states(processes, pids, 3, 4)
+
+
+
+def process_is_running_multiple_instance(args, facts):
+  """Native version of process_is_running_multiple_instance. Count is
+  compared as a string
+  """
+  processes = get_provider(facts.get_processes())
+  pids = processes.get_pids(args[0])
+  if len(pids) == 0:
+    return 1
+  if str(len(pids)) != args[1]:
+    return 2
+  return check_process_states(processes, pids, 3, 4)
+
+
+
+def process_is_running_with_args(args, facts):
+  """Native version of process_is_running_with_args. One of the processes
+  must have the expected argument in its command line
+  """
+  processes = get_provider(facts.get_processes())
+  pids = processes.get_pids(args[0])
+  if len(pids) == 0:
+    return 1
+  for pid in pids:
+    if contains_word(processes.get_command(pid), args[1]):
+      return 0
+  return 2
+
+
+
+def process_is_not_running_with_args(args, facts):
+  """Native version of process_is_not_running_with_args. As the script does,
+  it fails as soon as a process does not have the argument
+  """
+  processes = get_provider(facts.get_processes())
+  for pid in processes.get_pids(args[0]):
+    if not contains_word(processes.get_command(pid), args[1]):
+      return 1
+  return 0
+
+
+
+def get_interface(facts, name):
+  """This function returns the interface table if the given interface
+  exists, None otherwise
+  """
+  if "/" in name or name in [".", ".."]:
+    raise NativeCheckFallback(name)
+  interfaces = get_provider(facts.get_interfaces())
+  return interfaces if interfaces.has_interface(name) else None
+
+
+
+def has_address(interfaces, name, family, address):
+  """This function returns True if the given interface has the address
+  """
+  try:
+    return address in interfaces.get_addresses(name, family)
+  except OSError:
+    raise NativeCheckFallback(name)
+
+
+
+def net_interface_is_available(args, facts):
+  """Native version of net_interface_is_available
+  """
+  return 0 if get_interface(facts, args[0]) is not None else 1
+
+
+
+def net_interface_has_address_ipv4(args, facts):
+  """Native version of net_interface_has_address_ipv4. A missing interface
+  returns 1, as the hint describes
+  """
+  interfaces = get_interface(facts, args[0])
+  if interfaces is None:
+    return 1
+  return 0 if has_address(interfaces, args[0], socket.AF_INET, args[1]) else 2
+
+
+
+def net_interface_has_address_ipv6(args, facts):
+  """Native version of net_interface_has_address_ipv6
+  """
+  interfaces = get_interface(facts, args[0])
+  if interfaces is None:
+    return 1
+  return 0 if has_address(interfaces, args[0], socket.AF_INET6, args[1]) else 1
+
+
+
+def net_interface_has_carrier(args, facts):
+  """Native version of net_interface_has_carrier. A missing interface
+  returns 1, as the hint describes
+  """
+  interfaces = get_interface(facts, args[0])
+  if interfaces is None or interfaces.get_attribute(args[0], "flags") is None:
+    return 1
+  return 0 if interfaces.has_carrier(args[0]) else 1
+
+
+
+def net_interface_has_mtu(args, facts):
+  """Native version of net_interface_has_mtu. MTU is compared as a string
+  """
+  interfaces = get_interface(facts, args[0])
+  if interfaces is None:
+    return 1
+  return 0 if interfaces.get_attribute(args[0], "mtu") == args[1] else 1
+
+
+
+def net_interface_is_up(args, facts):
+  """Native version of net_interface_is_up
+  """
+  interfaces = get_interface(facts, args[0])
+  if interfaces is None:
+    return 1
+  return 0 if interfaces.get_attribute(args[0], "operstate") == "up" else 1
+
+
+
+def net_interface_is_down(args, facts):
+  """Native version of net_interface_is_down
+  """
+  interfaces = get_interface(facts, args[0])
+  if interfaces is None:
+    return 1
+  return 0 if interfaces.get_attribute(args[0], "operstate") == "down" else 1
+
+
+
+def is_block_device(path):
+  """This function returns True if the given path is a block device, as
+  test -b does
+  """
+  try:
+    return stat.S_ISBLK(os.stat(path).st_mode)
+  except OSError:
+    return False
+
+
+
+def fs_is_mounted(args, facts):
+  """Native version of fs_is_mounted. Mount point must match exactly
+  """
+  if not os.path.isdir(args[0]):
+    return 2
+  return 0 if get_provider(facts.get_mounts()).get_mount(args[0]) is not None else 1
+
+
+
+def dev_is_mounted(args, facts):
+  """Native version of dev_is_mounted
+  """
+  if not is_block_device(args[0]):
+    return 2
+  return 0 if len(get_provider(facts.get_mounts()).get_source_mounts(args[0])) > 0 else 1
+
+
+
+def dev_is_mounted_on(args, facts):
+  """Native version of dev_is_mounted_on
+  """
+  if not is_block_device(args[0]):
+    return 3
+  if not os.path.isdir(args[1]):
+    return 4
+  mounts = get_provider(facts.get_mounts()).get_source_mounts(args[0])
+  if len(mounts) == 0:
+    return 1
+  for mount in mounts:
+    if mount.mount_point == os.path.normpath(args[1]):
+      return 0
+  return 2
+
+
+
+def fs_is_read_only(args, facts):
+  """Native version of fs_is_read_only. A mount point without file system
+  is not read only
+  """
+  if not os.path.isdir(args[0]):
+    return 2
+  mount = get_provider(facts.get_mounts()).get_mount(args[0])
+  return 0 if mount is not None and mount.has_option("ro") else 1
+
+
+
+def fs_is_writable(args, facts):
+  """Native version of fs_is_writable
+  """
+  if not os.path.isdir(args[0]):
+    return 2
+  mount = get_provider(facts.get_mounts()).get_mount(args[0])
+  return 0 if mount is not None and mount.has_option("rw") else 1
+
+
+
+def fs_has_mount_option_activated(args, facts):
+  """Native version of fs_has_mount_option_activated. Option matches either
+  a whole option or the name of an option having a value
+  """
+  if not os.path.isdir(args[0]):
+    return 2
+  mount = get_provider(facts.get_mounts()).get_mount(args[0])
+  if mount is None:
+    return 1
+  return 0 if mount.has_option(args[1]) else 3
+
+
+
+def fs_dont_have_mount_option_activated(args, facts):
+  """Native version of fs_dont_have_mount_option_activated
+  """
+  if not os.path.isdir(args[0]):
+    return 2
+  mount = get_provider(facts.get_mounts()).get_mount(args[0])
+  if mount is None:
+    return 1
+  return 3 if mount.has_option(args[1]) else 0
+
+
+
+def prepare_file_search(args, facts):
+  """This function registers the pattern of a file content check, thus all
+  the patterns of a file are searched at once
+  """
+  facts.get_file_search().register(args[0], args[1])
+
+
+
+def search_file_content(args, facts):
+  """This function returns True if the file contains the pattern, as grep
+  does
+  """
+  try:
+    found = facts.get_file_search().contains(args[0], args[1])
+  except OSError:
+    raise NativeCheckFallback(args[0])
+  if found is None:
+    raise NativeCheckFallback(args[1])
+  return found
+
+
+
+def fs_file_contains_string(args, facts):
+  """Native version of fs_file_contains_string. String is a grep basic
+  regular expression
+  """
+  if not os.path.isfile(args[0]):
+    return 1
+  return 0 if search_file_content(args, facts) else 2
+
+
+
+def fs_file_dont_contain_string(args, facts):
+  """Native version of fs_file_dont_contain_string
+  """
+  if not os.path.isfile(args[0]):
+    return 1
+  return 2 if search_file_content(args, facts) else 0
+
+
+
+def xml_node_has_text_value(args, facts):
+  """Native version of xml_node_has_text_value. Query is evaluated against
+  the cached document of the file.
+  """
+  if not os.path.isfile(args[0]):
+    return 1
+
+  try:
+    value = get_provider(facts.get_xml_documents()).evaluate(args[0], args[1])
+  except (OSError, ValueError):
+    raise NativeCheckFallback(args[1])
+
+  # Command substitution removes the trailing newlines of the xmllint output
+  if value is None:
+    return 2
+  return 0 if value.rstrip("\n") == args[2] else 3
+
+
+
+def date_is_year(args, facts):
+  """Native version of date_is_year
+  """
+  return 0 if args[0] == time.strftime("%Y") else 1
+
+
+
+def date_year_is_not(args, facts):
+  """Native version of date_year_is_not
+  """
+  return 1 if args[0] == time.strftime("%Y") else 0
+
+
+
+# Hash table mapping the library script names to the native checks, and to the number of
+# arguments expected by the scripts
+NATIVE_CHECKS = {"cpu_available_processor_count": (cpu_available_processor_count, 1),
+                 "cpu_feature_is_available": (cpu_feature_is_available, 1),
+                 "date_is_year": (date_is_year, 1),
+                 "date_year_is_not": (date_year_is_not, 1),
+                 "deb_package_is_installed": (deb_package_is_installed, 1),
+                 "deb_package_is_not_installed": (deb_package_is_not_installed, 1),
+                 "dev_is_mounted": (dev_is_mounted, 1),
+                 "dev_is_mounted_on": (dev_is_mounted_on, 2),
+                 "fs_directory_dont_exist": (fs_directory_dont_exist, 1),
+                 "fs_directory_exist": (fs_directory_exist, 1),
+                 "fs_file_contains_string": (fs_file_contains_string, 2),
+                 "fs_file_dont_contain_string": (fs_file_dont_contain_string, 2),
+                 "fs_dont_have_mount_option_activated": (fs_dont_have_mount_option_activated, 2),
+                 "fs_file_dont_exist": (fs_file_dont_exist, 1),
+                 "fs_file_exist": (fs_file_exist, 1),
+                 "fs_has_mount_option_activated": (fs_has_mount_option_activated, 2),
+                 "fs_is_mounted": (fs_is_mounted, 1),
+                 "fs_is_read_only": (fs_is_read_only, 1),
+                 "fs_is_writable": (fs_is_writable, 1),
+                 "fs_symlink_exist": (fs_symlink_exist, 1),
+                 "kernel_has_filesystem_available": (kernel_has_filesystem_available, 1),
+                 "kernel_has_version": (kernel_has_version, 1),
+                 "mem_available_physical_amount": (mem_available_physical_amount, 1),
+                 "net_interface_has_address_ipv4": (net_interface_has_address_ipv4, 2),
+                 "net_interface_has_address_ipv6": (net_interface_has_address_ipv6, 2),
+                 "net_interface_has_carrier": (net_interface_has_carrier, 1),
+                 "net_interface_has_mtu": (net_interface_has_mtu, 2),
+                 "net_interface_is_available": (net_interface_is_available, 1),
+                 "net_interface_is_down": (net_interface_is_down, 1),
+                 "net_interface_is_up": (net_interface_is_up, 1),
+                 "process_is_not_running": (process_is_not_running, 1),
+                 "process_is_not_running_with_args": (process_is_not_running_with_args, 2),
+                 "process_is_running": (process_is_running, 1),
+                 "process_is_running_multiple_instance": (process_is_running_multiple_instance, 2),
+                 "process_is_running_once": (process_is_running_once, 1),
+                 "process_is_running_single_instance": (process_is_running_once, 1),
+                 "process_is_running_with_args": (process_is_running_with_args, 2),
+                 "xml_node_has_text_value": (xml_node_has_text_value, 3)}
+
+# Library scripts quoting all the uses of their arguments. Quoted arguments are split by the
+# native checks, instead of being left to the script
+QUOTING_CHECKS = set(["xml_node_has_text_value"])
+
+
+
+# Hash table mapping the library script names to the functions preparing their native checks
+NATIVE_PREPARES = {"fs_file_contains_string": prepare_file_search,
+                   "fs_file_dont_contain_string": prepare_file_search}
+
+
+
+# -------------------------------------------------------------------------
+#
+# split_arguments
+#
+# -------------------------------------------------------------------------
+def split_arguments(args, quoting=False):
+  """This function splits the arguments string as the shell would. It
+  returns None if the arguments have to be passed to the script.
+
+  If quoting is True, quoted strings are supported. The characters they
+  contain are not interpreted, except for the expansions done between double
+  quotes.
+  """
+
+  # Leave the script handle any expansion
+  if not quoting:
+    if len(SHELL_CHARACTERS.intersection(args)) > 0:
+      return None
+  else:
+    quote = None
+    for char in args:
+      if quote is None and char in "'\"":
+        quote = char
+      elif quote is None and char in SHELL_CHARACTERS:
+        return None
+      elif quote == char:
+        quote = None
+      elif quote == "\"" and char in DOUBLE_QUOTED_CHARACTERS:
+        return None
+
+    # Unterminated quote is a shell syntax error
+    if quote is not None:
+      return None
+
+  args = shlex.split(args)
+
+  # Arguments looking like options would be interpreted by the commands called from the script
+  for arg in args:
+    if arg.startswith("-"):
+      return None
+
+  return args
+
+
+
+# -------------------------------------------------------------------------
+#
+# prepare_native_check
+#
+# -------------------------------------------------------------------------
+def prepare_native_check(script_path, args, facts):
+  """This function is called for each test before the run starts. It lets
+  the native checks register the work they can share (patterns searched in
+  the same file, etc.).
+  """
+
+  prepare = NATIVE_PREPARES.get(os.path.basename(script_path))
+  if prepare is None or not has_native_check(script_path):
+    return
+
+  args = split_arguments(args, os.path.basename(script_path) in QUOTING_CHECKS)
+  if args is not None and len(args) == NATIVE_CHECKS[os.path.basename(script_path)][1]:
+    prepare(args, facts)
+
+
+
+# -------------------------------------------------------------------------
+#
+# has_native_check
+#
+# -------------------------------------------------------------------------
+def has_native_check(script_path):
+  """This function returns True if a native check is defined for the given
+  script, and if the script is the one of the bundled library
+  """
+
+  if os.path.basename(script_path) not in NATIVE_CHECKS:
+    return False
+
+  bundled = BUNDLED_SCRIPTS.get(script_path)
+  if bundled is None:
+    bundled = is_bundled_script(script_path)
+    if not bundled:
+      logging.debug("Script is not the bundled one, it is executed : " + script_path)
+    BUNDLED_SCRIPTS[script_path] = bundled
+
+  return bundled
+
+
+
+# -------------------------------------------------------------------------
+#
+# is_bundled_script
+#
+# -------------------------------------------------------------------------
+def is_bundled_script(script_path):
+  """This function returns True if the given script is stored in the bundled
+  library, or if its content is the same as the bundled script of the same
+  name
+  """
+
+  try:
+    real_path = os.path.realpath(script_path)
+    for library in BUNDLED_LIBRARIES:
+      if os.path.dirname(real_path) == os.path.realpath(library):
+        return True
+
+    digest = None
+    for library in BUNDLED_LIBRARIES:
+      reference = os.path.join(library, os.path.basename(script_path))
+      if os.path.isfile(reference):
+        if digest is None:
+          digest = get_file_digest(real_path)
+        if get_file_digest(reference) == digest:
+          return True
+  except OSError:
+    pass
+
+  return False
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_file_digest
+#
+# -------------------------------------------------------------------------
+def get_file_digest(path):
+  """This function returns the SHA-256 digest of the content of a file
+  """
+
+  with open(path, "rb") as working_file:
+    return hashlib.sha256(working_file.read()).digest()
+
+
+
+# -------------------------------------------------------------------------
+#
+# run_native_check
+#
+# -------------------------------------------------------------------------
+def run_native_check(script_path, args, facts):
+  """This function runs the native check of the given script. It returns the
+  result as the execution engine does (return code, stdout, stderr and
+  duration), or None if the script has to be executed instead.
+  """
+
+  check, arg_count = NATIVE_CHECKS[os.path.basename(script_path)]
+
+  start = time.monotonic()
+  args = split_arguments(args, os.path.basename(script_path) in QUOTING_CHECKS)
+  if args is None:
+    return None
+
+  # Scripts return -1 from setup when the argument count is wrong, which the shell turns into 255
+  if len(args) != arg_count:
+    return (Key.RETURN_CODE_WRONG_ARGUMENTS.value, b"", b"", time.monotonic() - start)
+
+  try:
+    ret = check(args, facts)
+  except NativeCheckFallback:
+    return None
+
+  return (ret, b"", b"", time.monotonic() - start)
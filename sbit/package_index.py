@@ -0,0 +1,107 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the index of the dpkg status database. The status
+file is parsed once, then package checks are answered from the index.
+"""
+
+import os
+
+# Path to the dpkg status file, relative to the root directory
+DPKG_STATUS_PATH = "var/lib/dpkg/status"
+
+# -----------------------------------------------------------------------------
+#
+#    Class PackageIndex
+#
+# -----------------------------------------------------------------------------
+class PackageIndex(object):
+  """This class maps package names to the status of their installed
+  instances. Multi-arch packages have one instance per architecture.
+
+  The root directory is the one containing var/lib/dpkg. It defaults to the
+  system root, and can point to a fixture directory.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, root="/"):
+    """Default constructor. The status file is parsed immediately. It raises
+    OSError if the file cannot be read.
+    """
+
+    # Path to the status file
+    self.filename = os.path.join(root, DPKG_STATUS_PATH)
+
+    # Hash table mapping package names to the list of the Status fields of their instances
+    self.packages = {}
+
+    self.load()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load
+  #
+  # -------------------------------------------------------------------------
+  def load(self):
+    """This method parses the status file. Only the Package and Status fields
+    are kept.
+    """
+
+    with open(self.filename, "r", encoding="utf-8", errors="replace") as working_file:
+      content = working_file.read()
+
+    # Each package is described by a paragraph, paragraphs are separated by blank lines
+    for paragraph in content.split("\n\n"):
+      name = None
+      status = None
+      for line in paragraph.splitlines():
+        if line.startswith("Package:"):
+          name = line[8:].strip()
+        elif line.startswith("Status:"):
+          status = line[7:].strip()
+
+      if name is not None and status is not None:
+        self.packages.setdefault(name, []).append(status)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # count_installed
+  #
+  # -------------------------------------------------------------------------
+  def count_installed(self, name):
+    """This method returns the number of instances of the given package
+    which are installed, that is the ones listed as "ii" by dpkg -l
+    """
+
+    count = 0
+    for status in self.packages.get(name, []):
+      # Status field is made of the wanted state, the error flag and the package state
+      tokens = status.split()
+      if len(tokens) == 3 and tokens[0] == "install" and tokens[2] == "installed":
+        count += 1
+
+    return count
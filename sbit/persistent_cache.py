@@ -0,0 +1,197 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the persistent results cache. Results of the test
+scripts are stored on disk, thus they can be reused by the next runs until
+their time to live expires.
+
+Entries are keyed on the content of the script, its arguments and an optional
+environment fingerprint. Modifying a script invalidates all its entries.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from sbit.model import Key
+
+# -----------------------------------------------------------------------------
+#
+#    Class PersistentCache
+#
+# -----------------------------------------------------------------------------
+class PersistentCache(object):
+  """This class stores the test results in a directory, one JSON file per
+  entry. File name is the hash of the entry key.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, directory, fingerprint=None):
+    """Default constructor. Directory is created if it does not exist.
+    """
+
+    # Directory storing the cache entries
+    self.directory = os.path.expanduser(directory)
+
+    # Optional string identifying the environment. Results from another environment are not used
+    self.fingerprint = fingerprint
+    if self.fingerprint is None:
+      self.fingerprint = ""
+
+    # Hash table mapping script paths to the hash of their content
+    self.script_hashes = {}
+
+    # Lock protecting the script hashes table
+    self.lock = threading.Lock()
+
+    try:
+      os.makedirs(self.directory, exist_ok=True)
+    except OSError as exception:
+      logging.critical("Cannot create cache directory " + self.directory + " : " +
+                       exception.strerror)
+      exit(1)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_entry_path
+  #
+  # -------------------------------------------------------------------------
+  def get_entry_path(self, script_path, args):
+    """This method returns the path to the file storing the entry of the given
+    script and arguments. None is returned if the script cannot be read.
+    """
+
+    # Script content is hashed only once per run
+    with self.lock:
+      if not script_path in self.script_hashes:
+        try:
+          with open(script_path, "rb") as script:
+            self.script_hashes[script_path] = hashlib.sha256(script.read()).hexdigest()
+        except OSError as exception:
+          logging.error("Cannot hash script " + script_path + " : " + exception.strerror)
+          self.script_hashes[script_path] = None
+      script_hash = self.script_hashes[script_path]
+
+    if script_hash is None:
+      return None
+
+    key = "\0".join([script_hash, args, self.fingerprint])
+    return os.path.join(self.directory, hashlib.sha256(key.encode(Key.UTF8.value)).hexdigest())
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load
+  #
+  # -------------------------------------------------------------------------
+  def load(self, script_path, args, ttl):
+    """This method returns the stored tuple (return code, stdout, stderr,
+    duration) of the given script and arguments. Duration is zero, since the
+    script has not been executed. None is returned if there is no entry, or
+    if it is older than ttl seconds.
+    """
+
+    entry_path = self.get_entry_path(script_path, args)
+    if entry_path is None:
+      return None
+
+    try:
+      with open(entry_path, "r") as entry_file:
+        entry = json.load(entry_file)
+    except (OSError, ValueError):
+      return None
+
+    # An entry which has not the expected fields, written by another version, is a miss
+    try:
+      age = time.time() - entry[Key.CACHE_TIMESTAMP.value]
+      result = (entry[Key.RESULT_RETURN_CODE.value], entry[Key.CACHE_STDOUT.value],
+                entry[Key.CACHE_STDERR.value], 0.0)
+    except (KeyError, TypeError):
+      logging.debug("Invalid persistent cache entry for " + script_path + " " + args)
+      return None
+
+    if age > ttl:
+      logging.debug("Persistent cache entry expired for " + script_path + " " + args)
+      return None
+
+    logging.debug("Persistent cache hit for " + script_path + " " + args)
+    return result
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # store
+  #
+  # -------------------------------------------------------------------------
+  def store(self, script_path, args, result):
+    """This method stores the tuple (return code, stdout, stderr, duration) of
+    the given script and arguments. Duration is not stored. Entry is written
+    to a temporary file, then renamed, thus concurrent runs never read a
+    partial entry.
+    """
+
+    entry_path = self.get_entry_path(script_path, args)
+    if entry_path is None:
+      return
+
+    ret, out, err = result[0:3]
+
+    # Output is bytes on success, and str on failure. It is always stored as str
+    if isinstance(out, bytes):
+      out = out.decode(Key.UTF8.value, errors="replace")
+    if isinstance(err, bytes):
+      err = err.decode(Key.UTF8.value, errors="replace")
+
+    entry = {Key.CACHE_TIMESTAMP.value: time.time(),
+             Key.RESULT_RETURN_CODE.value: ret,
+             Key.CACHE_STDOUT.value: out,
+             Key.CACHE_STDERR.value: err}
+
+    try:
+      handle, temp_path = tempfile.mkstemp(dir=self.directory)
+    except OSError as exception:
+      logging.warning("Cannot store cache entry for " + script_path + " : " + exception.strerror)
+      return
+
+    stored = False
+    try:
+      with os.fdopen(handle, "w") as entry_file:
+        json.dump(entry, entry_file)
+      os.replace(temp_path, entry_path)
+      stored = True
+    except OSError as exception:
+      logging.warning("Cannot store cache entry for " + script_path + " : " + exception.strerror)
+    finally:
+      # Temporary file is removed if the entry could not be written or renamed
+      if not stored:
+        try:
+          os.unlink(temp_path)
+        except OSError:
+          pass
@@ -0,0 +1,146 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the process table. /proc is scanned once, then
+process checks are answered from the snapshot.
+"""
+
+import os
+
+# -----------------------------------------------------------------------------
+#
+#    Class ProcessTable
+#
+# -----------------------------------------------------------------------------
+class ProcessTable(object):
+  """This class stores the name, state and command line of each process, and
+  an index mapping process names to their pids.
+
+  Processes are indexed by the names pidof matches : the command name from
+  /proc/<pid>/stat, and both the full path and the base name of the first
+  command line argument.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, root="/"):
+    """Default constructor. /proc is scanned immediately. It raises OSError if
+    it cannot be read.
+    """
+
+    # Path to the proc file system
+    self.proc = os.path.join(root, "proc")
+
+    # Hash table mapping pids to tuples made of the command name, the state and the arguments
+    self.processes = {}
+
+    # Hash table mapping the process names to the list of their pids
+    self.names = {}
+
+    self.load()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load
+  #
+  # -------------------------------------------------------------------------
+  def load(self):
+    """This method scans /proc and fills the table. Processes terminating
+    during the scan are ignored.
+    """
+
+    for entry in os.scandir(self.proc):
+      if not entry.name.isdigit():
+        continue
+
+      try:
+        with open(os.path.join(entry.path, "stat"), "rb") as working_file:
+          stat = working_file.read().decode("utf-8", "replace")
+        with open(os.path.join(entry.path, "cmdline"), "rb") as working_file:
+          cmdline = working_file.read().decode("utf-8", "replace")
+      except OSError:
+        continue
+
+      # Command name is between parenthesis, and may contain spaces or parenthesis itself
+      comm = stat[stat.find("(") + 1:stat.rfind(")")]
+      state = stat[stat.rfind(")") + 2:stat.rfind(")") + 3]
+      args = [arg for arg in cmdline.split("\0") if len(arg) > 0]
+
+      pid = int(entry.name)
+      self.processes[pid] = (comm, state, args)
+
+      names = set([comm])
+      if len(args) > 0:
+        names.add(args[0])
+        names.add(os.path.basename(args[0]))
+      for name in names:
+        self.names.setdefault(name, []).append(pid)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_pids
+  #
+  # -------------------------------------------------------------------------
+  def get_pids(self, name):
+    """This method returns the pids of the processes matching the given
+    name, in decreasing order as pidof outputs them
+    """
+
+    pids = set(self.names.get(name, []))
+    pids.update(self.names.get(os.path.basename(name), []))
+
+    return sorted(pids, reverse=True)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_state
+  #
+  # -------------------------------------------------------------------------
+  def get_state(self, pid):
+    """This method returns the state of the given process (R, S, D, Z, etc.)
+    """
+
+    return self.processes[pid][1]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_command
+  #
+  # -------------------------------------------------------------------------
+  def get_command(self, pid):
+    """This method returns the command line of the given process, as output
+    by ps. Processes without arguments are named between brackets.
+    """
+
+    comm, state, args = self.processes[pid]
+    if len(args) == 0:
+      return "[" + comm + "]"
+
+    return " ".join(args)
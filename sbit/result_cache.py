@@ -0,0 +1,108 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the in-run results cache. A given script with a
+given set of arguments and timeout is executed only once per run.
+"""
+
+import logging
+import threading
+
+# -----------------------------------------------------------------------------
+#
+#    Class ResultCache
+#
+# -----------------------------------------------------------------------------
+class ResultCache(object):
+  """This class memoizes the futures holding the tuple (return code, stdout,
+  stderr, duration) of the executed scripts.
+
+  The future is stored as soon as the script is submitted. Thus a request
+  for a script still running waits for that execution and shares its result,
+  instead of starting the script again (single flight).
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self):
+    """Default constructor
+    """
+
+    # Hash table mapping (script, args, timeout) tuples to futures
+    self.futures = {}
+
+    # Lock protecting the table, since lookups can come from several threads
+    self.lock = threading.Lock()
+
+    # Counters of the cache activity
+    self.hits = 0
+    self.misses = 0
+
+    # Number of hits on an execution which was still running
+    self.in_flight_hits = 0
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_or_submit
+  #
+  # -------------------------------------------------------------------------
+  def get_or_submit(self, script, args, timeout, submit):
+    """This method returns the future of the given script, arguments and
+    timeout. If there is none, submit is called to start the script, and the
+    future it returns is stored.
+
+    Timeout is part of the key, since a script killed by a short timeout may
+    complete with a longer one.
+    """
+
+    key = (script, args, timeout)
+
+    with self.lock:
+      if key in self.futures:
+        future = self.futures[key]
+        self.hits += 1
+        if not future.done():
+          self.in_flight_hits += 1
+        logging.debug("Cache hit for " + script + " " + args)
+        return future
+
+      self.misses += 1
+      logging.debug("Cache miss for " + script + " " + args)
+      future = submit()
+      self.futures[key] = future
+      return future
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_statistics
+  #
+  # -------------------------------------------------------------------------
+  def get_statistics(self):
+    """This method returns a string describing the cache activity
+    """
+
+    return "Results cache : " + str(self.hits) + " hits (" + str(self.in_flight_hits) + \
+           " in flight), " + str(self.misses) + " misses"
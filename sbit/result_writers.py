@@ -0,0 +1,328 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the writers used to generate machine readable
+reports from the test results (JSON Lines, JUnit XML and TAP).
+
+Writers are streaming. Each result is written and flushed as soon as it is
+known, thus the report can be ingested while the run is still in progress.
+"""
+
+import json
+import sys
+from sbit.model import Key
+
+# -----------------------------------------------------------------------------
+#
+#    Class ResultWriter
+#
+# -----------------------------------------------------------------------------
+class ResultWriter(object):
+  """This class is the base class of the report writers. It handles the
+  output stream, derivated classes implement the format itself.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, path=None):
+    """Default constructor. Report is written to stdout if path is None or
+    equal to "-".
+    """
+
+    # Path to the report file
+    self.path = path
+
+    # Stream the report is written to
+    if path is None or path == "-":
+      self.stream = sys.stdout
+    else:
+      self.stream = open(path, "w")
+
+    # Number of results written so far
+    self.count = 0
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # is_stdout
+  #
+  # -------------------------------------------------------------------------
+  def is_stdout(self):
+    """This method returns True if the report is written to stdout
+    """
+
+    return self.stream is sys.stdout
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # write
+  #
+  # -------------------------------------------------------------------------
+  def write(self, data):
+    """This method writes data to the stream, then flush it
+    """
+
+    self.stream.write(data)
+    self.stream.flush()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # start
+  #
+  # -------------------------------------------------------------------------
+  def start(self):
+    """This method is called before the first result is written
+    """
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # add_result
+  #
+  # -------------------------------------------------------------------------
+  def add_result(self, result):
+    """This method writes a single TestResult
+    """
+
+    self.count += 1
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """This method is called after the last result has been written
+    """
+
+    if not self.is_stdout():
+      self.stream.close()
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class JsonLinesWriter
+#
+# -----------------------------------------------------------------------------
+class JsonLinesWriter(ResultWriter):
+  """This class writes one JSON object per line and per test
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # add_result
+  #
+  # -------------------------------------------------------------------------
+  def add_result(self, result):
+    """This method writes a single TestResult
+    """
+
+    ResultWriter.add_result(self, result)
+    self.write(json.dumps(result.to_dict()) + "\n")
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class TapWriter
+#
+# -----------------------------------------------------------------------------
+class TapWriter(ResultWriter):
+  """This class writes a Test Anything Protocol (version 13) stream. The
+  plan is output at the end, since the number of tests is known only once
+  the run is over.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # start
+  #
+  # -------------------------------------------------------------------------
+  def start(self):
+    """This method outputs the TAP version line
+    """
+
+    self.write("TAP version 13\n")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # add_result
+  #
+  # -------------------------------------------------------------------------
+  def add_result(self, result):
+    """This method writes a single TestResult
+    """
+
+    ResultWriter.add_result(self, result)
+
+    # Test line, category path is part of the name to identify the test
+    name = ":".join(result.category_path) + " - " + result.get_name()
+    status = result.get_status()
+    if status == Key.STATUS_OK.value:
+      line = "ok " + str(self.count) + " - " + name
+    elif status == Key.STATUS_SKIPPED.value:
+      line = "ok " + str(self.count) + " - " + name + " # SKIP fail fast"
+    else:
+      line = "not ok " + str(self.count) + " - " + name
+
+    # Failure details are output as YAML block
+    if status in [Key.STATUS_KO.value, Key.STATUS_TIMEOUT.value]:
+      line += "\n  ---\n"
+      line += "  status: " + status + "\n"
+      line += "  script: " + json.dumps(result.script) + "\n"
+      line += "  args: " + json.dumps(result.args) + "\n"
+      line += "  return_code: " + json.dumps(result.to_dict()[Key.RESULT_RETURN_CODE.value]) + "\n"
+      line += "  duration: " + str(round(result.duration, 6)) + "\n"
+      line += "  hint: " + json.dumps(result.hint) + "\n"
+      line += "  ..."
+
+    self.write(line + "\n")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """This method outputs the plan
+    """
+
+    self.write("1.." + str(self.count) + "\n")
+    ResultWriter.close(self)
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class JUnitWriter
+#
+# -----------------------------------------------------------------------------
+class JUnitWriter(ResultWriter):
+  """This class writes a JUnit XML report. Test cases are written as soon as
+  they are known, thus the enclosing test suite does not carry the counters.
+  Category path is used as the test case class name.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # start
+  #
+  # -------------------------------------------------------------------------
+  def start(self):
+    """This method outputs the XML header and opens the test suite
+    """
+
+    self.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n  <testsuite name="sbit">\n')
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # add_result
+  #
+  # -------------------------------------------------------------------------
+  def add_result(self, result):
+    """This method writes a single TestResult
+    """
+
+    # Imported here, it pulls urllib which is slow to import and only used by this report
+    from xml.sax.saxutils import escape
+    from xml.sax.saxutils import quoteattr
+
+    ResultWriter.add_result(self, result)
+
+    testcase = '    <testcase classname=' + quoteattr(".".join(result.category_path))
+    testcase += ' name=' + quoteattr(result.get_name())
+    testcase += ' time="' + "%.6f" % result.duration + '"'
+
+    status = result.get_status()
+    if status == Key.STATUS_OK.value:
+      testcase += '/>\n'
+    elif status == Key.STATUS_SKIPPED.value:
+      testcase += '>\n      <skipped message="fail fast"/>\n    </testcase>\n'
+    else:
+      testcase += '>\n      <failure type=' + quoteattr(status)
+      testcase += ' message=' + quoteattr(result.hint) + '>'
+      testcase += escape(result.get_command_line())
+
+      # Return code is None if the script has been killed by the timeout
+      return_code = result.to_dict()[Key.RESULT_RETURN_CODE.value]
+      if return_code is None:
+        testcase += ' timed out'
+      else:
+        testcase += ' returned ' + escape(str(return_code))
+      testcase += '</failure>\n    </testcase>\n'
+
+    self.write(testcase)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """This method closes the test suite
+    """
+
+    self.write('  </testsuite>\n</testsuites>\n')
+    ResultWriter.close(self)
+
+
+
+# Hash table mapping the report formats to the writer classes
+WRITERS = {Key.REPORT_JSONL.value: JsonLinesWriter,
+           Key.REPORT_JUNIT.value: JUnitWriter,
+           Key.REPORT_TAP.value: TapWriter}
+
+
+
+# -------------------------------------------------------------------------
+#
+# create_writer
+#
+# -------------------------------------------------------------------------
+def create_writer(report):
+  """This function instanciate the writer described by the given report
+  string, which is "format" or "format:path".
+  """
+
+  tokens = report.split(":", 1)
+  path = None
+  if len(tokens) > 1:
+    path = tokens[1]
+
+  return WRITERS[tokens[0]](path)
@@ -32,9 +32,27 @@ and run a test suite, either from top level category or from any midlevel or sub
 
 import logging
 import os
+import shlex
+import sys
+import tempfile
+import threading
+from concurrent.futures import CancelledError
+from concurrent.futures import Future
 from sbit.cli_command import CliCommand
+from sbit.executor import create_engine
 from sbit.model import Key
+from sbit.model import TestResult
+from sbit.native_checks import has_native_check
+from sbit.native_checks import prepare_native_check
+from sbit.native_checks import run_native_check
 from sbit.model import TestSuite
+from sbit.result_writers import create_writer
+from sbit.suite_plan import PATH_SEPARATOR
+from sbit.suite_plan import SuitePlan
+from sbit.system_facts import SystemFacts
+from sbit.test_library import TestLibrary
+from sbit.persistent_cache import PersistentCache
+from sbit.result_cache import ResultCache
 from sbit.ansi_colors import Colors
 
 # -----------------------------------------------------------------------------
@@ -62,12 +80,48 @@ class RunTestSuite(CliCommand):
     # Initialize ancestor
     CliCommand.__init__(self, cfg)
 
-    # Initialize the hash table used to cache test results
-    self.results_cache = {}
+    # Initialize the cache used to share test results between identical tests
+    self.results_cache = ResultCache()
 
     # Current test site. Object used to sore YAML structure loaded from file
     self.suite = None
 
+    # Execution plan built from the suite, the tests are run from it
+    self.plan = None
+
+    # Index of the scripts available from the test library
+    self.library = None
+
+    # Persistent results cache, shared by successive runs. None if it is not activated
+    self.persistent_cache = None
+
+    # Execution engine used to run the test scripts. It is created by run_suite
+    self.engine = None
+
+    # Counter of the tests skipped because of fail fast
+    self.skipped_tests = 0
+
+    # Lock used to abort the run only once
+    self.abort_lock = threading.Lock()
+
+    # Snapshot of the kernel files, read once and shared by the checks of the run
+    self.facts = SystemFacts()
+
+    # Environment variables exported to the scripts. None until the first script is executed
+    self.facts_environment = None
+
+    # Hash table storing the tests waiting to be executed in batch mode. Key is a tuple made of
+    # the script path and the timeout, value is the list of (args, future) tuples
+    self.pending_batches = {}
+
+    # Writers generating the machine readable reports, and stream used for the console output
+    self.writers = []
+    self.console = sys.stdout
+
+    # Hash table storing the scheduled tests. Key is the test offset in the plan, and value
+    # is a tuple made of the resolved script path and the future holding execution result
+    self.scheduled_tests = {}
+
   # -------------------------------------------------------------------------
   #
   # run_suite
@@ -78,7 +132,28 @@ class RunTestSuite(CliCommand):
     Runing test suite is made of several steps ientified below.
 
     It calls dedicated method for each step. The main steps are :
-    .
+    . load the suite and index the library
+    . run the selected categories
+    """
+
+    self.load_suite()
+
+    try:
+      self.run_selection(self.cfg.category)
+    except ValueError as exception:
+      logging.critical(str(exception))
+      exit(1)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # load_suite
+  #
+  # -------------------------------------------------------------------------
+  def load_suite(self):
+    """This method loads the test suite, indexes the library and opens the
+    persistent cache. It is done once, even if the suite is run many times.
     """
 
     # Check that there is a configuration file first
@@ -86,9 +161,15 @@ class RunTestSuite(CliCommand):
       logging.critical("The configuration file object is not defined")
       exit(1)
 
-    # Instanciate a TestSuite object and load its content from the YAML file
+    # Persistent cache directory can come from the command line or from the config file
+    if self.cfg.cache_dir is None and self.cfg.configuration is not None and \
+       Key.CACHE_DIR.value in self.cfg.configuration:
+      self.cfg.cache_dir = self.cfg.configuration[Key.CACHE_DIR.value]
+
+    # Instanciate a TestSuite object and load its content from the YAML file. The compiled
+    # suite is stored in the persistent cache directory if there is one
     self.suite = TestSuite()
-    self.suite.load(self.cfg.suite)
+    self.suite.load(self.cfg.suite, self.cfg.cache_dir)
 
     # Check that the path to script library is defined (can come from config file or command line)
     if self.cfg.library:
@@ -111,6 +192,21 @@ class RunTestSuite(CliCommand):
         # Yes, then copy it into self.library
         self.cfg.library = self.cfg.configuration[Key.TEST_LIBRARY_PATH.value]
 
+    # Scan the library directories once, scripts are then resolved from the index
+    self.library = TestLibrary(self.cfg.library)
+
+    # Convert the suite to the flat execution plan, and resolve the scripts once for all the runs
+    try:
+      self.plan = SuitePlan(self.suite.suite)
+    except ValueError as exception:
+      logging.critical(str(exception))
+      exit(1)
+    self.plan.resolve(self.library)
+
+    if self.cfg.cache_dir is not None:
+      logging.debug("Using persistent cache : " + self.cfg.cache_dir)
+      self.persistent_cache = PersistentCache(self.cfg.cache_dir, self.cfg.cache_fingerprint)
+
     # Check that the path to test suite file is defined (can come from config file or command line)
     if self.cfg.suite:
       logging.debug("Using test suite : " + self.cfg.suite)
@@ -118,103 +214,592 @@ class RunTestSuite(CliCommand):
       logging.critical("The suite path is not defined")
       exit(1)
 
-    # Check that the path to test suite file is defined (can come from config file or command line)
-    if self.cfg.category is None or len(self.cfg.category) == 0:
-      # No category given, then add all the root categories
-      self.cfg.category = []
-      for suite in self.suite.suite:
-        self.cfg.category.append(suite[Key.CATEGORY.value])
 
-    # Iterate the list of categories and call the run test category method
-    for category in self.cfg.category:
-      self.find_category_and_run_test(category)
+
+  # -------------------------------------------------------------------------
+  #
+  # run_selection
+  #
+  # -------------------------------------------------------------------------
+  def run_selection(self, categories):
+    """This method runs the given list of categories, or all the root
+    categories if it is empty. It raises ValueError if a category is not
+    found. It returns True if all the tests were successful.
+    """
+
+    # Results and facts of a previous run are not reused
+    self.reset_run()
+
+    # Search all the selected categories before running anything
+    selected = self.select_categories(categories)
+
+    success = True
+
+    # Create the execution engine, then submit the tests from all the selected categories. Tests
+    # are running in background while results are output in the tree order
+    self.engine = create_engine(self, self.cfg)
+    try:
+      # Native checks register the work they share before any of them runs
+      if self.cfg.native:
+        for category in selected:
+          self.prepare_test_recursively(category)
+
+      for category in selected:
+        self.schedule_test_recursively(category, self.cfg.cache_ttl)
+
+      # Tests of the scripts supporting batch mode are grouped, now that they are all known
+      self.submit_batches()
+
+      # Open the reports before the first result is known, they are written while the run goes
+      self.open_reports()
+
+      # Iterate the list of categories and output the results
+      for category in selected:
+        success &= self.run_category(category)
+    finally:
+      self.engine.shutdown()
+      self.close_reports()
+      self.cleanup_facts()
+
+    # Output the list of skipped tests has been output with the results, now output the total
+    if self.skipped_tests > 0:
+      self.display("Fail fast : " + str(self.skipped_tests) + " tests skipped")
+
+    # Output the cache activity
+    if self.cfg.use_results_cache:
+      self.display(self.results_cache.get_statistics())
+
+    return success
+
 
 
   # -------------------------------------------------------------------------
   #
-  # find_category_and_run_test
+  # reset_run
   #
   # -------------------------------------------------------------------------
-  def find_category_and_run_test(self, category):
-    """This method search for the given category, then execute recursively
-    all the tst defined at its level, then at the sub level. Category can be
-     either the root of the tree, or a sub category.
+  def reset_run(self):
+    """This method creates the state of a new run. Suite, library and
+    persistent cache are kept, they do not depend on the run.
+    """
+
+    self.results_cache = ResultCache()
+    self.scheduled_tests = {}
+    self.pending_batches = {}
+    self.skipped_tests = 0
+    self.facts = SystemFacts()
+    self.facts_environment = None
+    self.aborted = False
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # open_reports
+  #
+  # -------------------------------------------------------------------------
+  def open_reports(self):
+    """This method creates the writers of the reports requested on the
+    command line. If a report is written to stdout, the console output is
+    moved to stderr to keep the report parsable.
+    """
+
+    # Reports opened while the options were checked are used by the first run only
+    writers = self.cfg.report_writers
+    self.cfg.report_writers = []
+    if len(writers) == 0:
+      for report in self.cfg.report:
+        try:
+          writers.append(create_writer(report))
+        except OSError as exception:
+          raise ValueError("Cannot open report " + report + " : " + exception.strerror)
+
+    for writer in writers:
+      logging.debug("Using report : " + type(writer).__name__ + " to " + (writer.path or "-"))
+      if writer.is_stdout():
+        self.console = sys.stderr
+      writer.start()
+      self.writers.append(writer)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close_reports
+  #
+  # -------------------------------------------------------------------------
+  def close_reports(self):
+    """This method terminates the reports, and closes their files
+    """
+
+    for writer in self.writers:
+      writer.close()
+    self.writers = []
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # display
+  #
+  # -------------------------------------------------------------------------
+  def display(self, line):
+    """This method outputs a line of the human readable results
+    """
+
+    print(line, file=self.console, flush=True)
+
+
+  # -------------------------------------------------------------------------
+  #
+  # select_categories
+  #
+  # -------------------------------------------------------------------------
+  def select_categories(self, categories):
+    """This method returns the list of the categories to run, or the root
+    categories if the given list is empty. It raises ValueError if a category
+    is not found.
+    """
+
+    # No category given, then add all the root categories
+    if categories is None or len(categories) == 0:
+      return [self.plan.categories[offset] for offset in self.plan.roots]
+
+    return [self.find_category(category) for category in categories]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # find_category
+  #
+  # -------------------------------------------------------------------------
+  def find_category(self, category):
+    """This method search for the given category in the test tree. Category
+    can be either the root of the tree, or a sub category.
 
     The root will be defined as "category", an subcategories as :
       "category:subcategory1:subsubcategory2"
+
+    Case is ignored, the category is retrieved from the path index of the
+    plan. It raises ValueError if the category is not found.
     """
 
-    #
-    # Seek the given category in the test tree
-    #
-
-    # First let's split the category in its component names (aka tokens)
-    tokens = category.split(":")
-
-    # And now let's walk in the tree
-    categories = self.suite.suite
-
-    # Counter used to know how many toeksn have been processed so far
-    counter = 0
-
-    # Variable used to concatenate category in a path. Join on args from cli is likely to loose case
-    # Thus we use data from the YAML test fie
-    cat_to_display = ""
-
-    # Iterate the full tokens array
-    while counter < len(tokens):
-
-      # Use a flag to know if the search tokens has been found or not
-      token_was_found = False
-
-      # Iterate the categories at this level
-      for cur in categories:
-        # And test if we have fond the searched category
-        if cur[Key.CATEGORY.value].lower() == tokens[counter].lower():
-          # Mark token as found
-          token_was_found = True
-
-          # Push category name to disply variable
-          if len(cat_to_display) > 0:
-            # Let's add a separator if this categor is not the fist in the display variable
-            cat_to_display += ":"
-
-          cat_to_display += cur[Key.CATEGORY.value]
-
-          # Update current category
-          if Key.TEST_SUITE.value in cur:
-            categories = cur[Key.TEST_SUITE.value]
-          else:
-            categories = {}
-            categories[0] = cur
-
-          # Have we reached the end of the tokens list ?
-          if counter == len(tokens) - 1:
-            # Yes, thus exit this loop
-            categories = {}
-            categories[0] = cur
-            break
-          else:
-            # Not yet, let's goo deeper
-            continue
-
-      # Check if we have found something or not ?
-      if not token_was_found:
-        self.cfg.logging.critical("The token " + tokens[counter] + " defined in the category to "
-                                  "execute was not found in the test suite definition file")
-        exit(1)
+    return self.plan.find(category)
 
-      # Increment the tokens counter
-      counter += 1
+
+
+  # -------------------------------------------------------------------------
+  #
+  # run_category
+  #
+  # -------------------------------------------------------------------------
+  def run_category(self, category):
+    """This method output the header of the given category, then execute
+    recursively all the tests defined at its level, then at the sub level.
+    It returns True if all the tests were successful.
+    """
 
     # Category has been found. Now let's recurse...
-    print("[+] " + Colors.FG_YELLOW.value + Colors.BOLD.value + cat_to_display + Colors.RESET.value)
-    print("------------------------------------")
-    if Key.DESCRIPTION.value in categories[0]:
-      print(" " + categories[0][Key.DESCRIPTION.value])
-    msg_buffer = []
-    self.execute_test_recursively(categories[0], output_msg=msg_buffer)
-    print("")
+    self.display("[+] " + Colors.FG_YELLOW.value + Colors.BOLD.value + \
+                 PATH_SEPARATOR.join(category.path) + Colors.RESET.value)
+    self.display("------------------------------------")
+    if category.description is not None:
+      self.display(" " + category.description)
+
+    success = self.execute_test_recursively(category)
+    self.display("")
+
+    return success
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # prepare_test_recursively
+  #
+  # -------------------------------------------------------------------------
+  def prepare_test_recursively(self, category):
+    """This method walks down the test tree and prepares the native checks.
+    Patterns searched in the same file are registered, thus the file is read
+    once for all of them.
+    """
+
+    for test in self.plan.get_tests(category):
+      self.prepare_test(test)
+
+    for cur in self.plan.get_children(category):
+      self.prepare_test_recursively(cur)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # prepare_test
+  #
+  # -------------------------------------------------------------------------
+  def prepare_test(self, test):
+    """This method prepares the native check of the given test, if its
+    script has one
+    """
+
+    if test.script_path is not None and has_native_check(test.script_path):
+      prepare_native_check(test.script_path, test.args, self.facts)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # schedule_test_recursively
+  #
+  # -------------------------------------------------------------------------
+  def schedule_test_recursively(self, category, cache_ttl=None):
+    """This method walks down the test tree and submit every test to the
+    execution engine. It does not wait for the results, they are retrieved later
+    by execute_test_recursively, which keeps the output in the tree order.
+
+    The persistent cache time to live is inherited from the parent category,
+    unless the category defines its own.
+    """
+
+    # Time to live defined in the category takes precedence over the inherited one
+    if category.cache_ttl is not None:
+      cache_ttl = category.cache_ttl
+
+    # Submit the tests defined at category level
+    for test in self.plan.get_tests(category):
+      self.schedule_test(test, cache_ttl)
+
+    # Then recurse the sub categories
+    for cur in self.plan.get_children(category):
+      self.schedule_test_recursively(cur, cache_ttl)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # schedule_test
+  #
+  # -------------------------------------------------------------------------
+  def schedule_test(self, test, cache_ttl=None):
+    """This method search the script of the given test in the library, then
+    submit its execution to the engine. The script path and the future
+    used to retrieve the result are stored in the scheduled tests table.
+    """
+
+    # Test can be reached through several selected categories. Schedule it only once
+    if test.offset in self.scheduled_tests:
+      return
+
+    # Path to the real test has been retrieved from the library index when the plan was built
+    script_path = test.script_path
+
+    # Check that the script has been found
+    if script_path is None:
+      logging.error("Script " + test.script + " does not exist in library. "
+                    "Mark test as failed.")
+      self.scheduled_tests[test.offset] = (None, None)
+      return
+
+    # Script exist, if args are defined, concatenate to the script command line
+    args = test.args
+    script_cmd = script_path
+    if len(args) > 0:
+      script_cmd += " " + args
+
+    # Timeout defined in the test takes precedence over the default one
+    timeout = self.cfg.timeout
+    if test.timeout is not None:
+      timeout = test.timeout
+
+    # Same thing for the persistent cache time to live
+    if test.cache_ttl is not None:
+      cache_ttl = test.cache_ttl
+
+    # Function submitting the test. The persistent cache is consulted first
+    def submit():
+      """Submit the test, unless the persistent cache already has a result
+      """
+      return self.submit_test(script_path, script_cmd, args, timeout, cache_ttl)
+
+    # If the cache is activated, then share the future of the first execution, even if it
+    # is still running
+    if self.cfg.use_results_cache:
+      future = self.results_cache.get_or_submit(test.script, args, timeout, submit)
+    else:
+      # Not using cache, thus submit the test
+      future = submit()
+
+    # Watch for the first failure, to stop the run as soon as possible
+    if self.cfg.fail_fast:
+      future.add_done_callback(self.check_fail_fast)
+
+    # Store the future to retrieve the result when output is generated
+    self.scheduled_tests[test.offset] = (script_path, future)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # submit_test
+  #
+  # -------------------------------------------------------------------------
+  def submit_test(self, script_path, script_cmd, args, timeout, cache_ttl):
+    """This method returns the future holding the result of the given test.
+    If the persistent cache has a valid entry, the future is already done.
+    Otherwise the script is submitted to the engine, and its result will be
+    stored in the persistent cache once completed.
+    """
+
+    # Without time to live, the test is not eligible to the persistent cache
+    if self.persistent_cache is None or cache_ttl is None:
+      return self.execute_script(script_path, script_cmd, args, timeout)
+
+    # Use the stored result unless a refresh has been requested
+    if not self.cfg.refresh:
+      result = self.persistent_cache.load(script_path, args, cache_ttl)
+      if result is not None:
+        future = Future()
+        future.set_result(result)
+        return future
+
+    # Run the script, then store its result. Killed scripts have no meaningful result to store
+    future = self.execute_script(script_path, script_cmd, args, timeout)
+
+    def store_result(done):
+      """Callback storing the result once the script has completed
+      """
+      if done.cancelled() or done.exception() is not None:
+        return
+      if done.result()[0] not in [Key.RETURN_CODE_TIMEOUT.value, Key.RETURN_CODE_SKIPPED.value]:
+        self.persistent_cache.store(script_path, args, done.result())
+
+    future.add_done_callback(store_result)
+    return future
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # execute_script
+  #
+  # -------------------------------------------------------------------------
+  def execute_script(self, script_path, script_cmd, args, timeout):
+    """This method returns the future holding the result of the given script.
+    Scripts having a native implementation are run in-process, thus the
+    future is already done. Other scripts are submitted to the engine, as are
+    the scripts the native check cannot handle.
+    """
+
+    if self.cfg.native and not self.engine.cancelled and has_native_check(script_path):
+      result = run_native_check(script_path, args, self.facts)
+      if result is not None:
+        logging.debug("Using native check : " + script_cmd)
+        future = Future()
+        future.set_result(result)
+        return future
+
+    # Scripts read the kernel files from the snapshot, export it before the first one starts
+    self.export_facts()
+
+    # Scripts supporting batch mode are executed once all the tests have been scheduled
+    metadata = self.library.get_metadata(script_path)
+    if metadata is not None and metadata.batch and "\n" not in args:
+      future = Future()
+      self.pending_batches.setdefault((script_path, timeout), []).append((args, future))
+      return future
+
+    return self.engine.submit(script_cmd, timeout)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # submit_batches
+  #
+  # -------------------------------------------------------------------------
+  def submit_batches(self):
+    """This method submits the tests waiting for batch mode. Scripts are
+    executed once for all their argument sets, which are written to the
+    script stdin. Timeout applies to each argument set, thus the batch gets
+    the sum of the timeouts.
+    """
+
+    for (script_path, timeout), tests in self.pending_batches.items():
+      # A single test does not need a batch
+      if len(tests) == 1:
+        args, future = tests[0]
+        script_cmd = script_path
+        if len(args) > 0:
+          script_cmd += " " + args
+        self.chain_future(self.engine.submit(script_cmd, timeout), future)
+        continue
+
+      # Write the argument sets to the file used as the script input
+      handle, input_path = tempfile.mkstemp(prefix="sbit-batch-")
+      with os.fdopen(handle, "w") as working_file:
+        for args, future in tests:
+          working_file.write(args + "\n")
+
+      logging.debug("Using batch mode : " + script_path + " (" + str(len(tests)) + " tests)")
+      batch_cmd = script_path + " " + Key.BATCH_OPTION.value + " < " + shlex.quote(input_path)
+      if timeout is not None:
+        timeout = timeout * len(tests)
+
+      batch = self.engine.submit(batch_cmd, timeout)
+      batch.add_done_callback(lambda done, script_path=script_path, tests=tests,
+                              input_path=input_path:
+                              self.dispatch_batch(script_path, tests, input_path, done))
+
+    self.pending_batches = {}
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # chain_future
+  #
+  # -------------------------------------------------------------------------
+  def chain_future(self, source, target):
+    """This method copies the outcome of the source future to the target
+    future once it is done
+    """
+
+    def copy_result(done):
+      """Callback copying the result, or the cancellation
+      """
+      if done.cancelled():
+        target.cancel()
+      elif done.exception() is not None:
+        target.set_exception(done.exception())
+      else:
+        target.set_result(done.result())
+
+    source.add_done_callback(copy_result)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # dispatch_batch
+  #
+  # -------------------------------------------------------------------------
+  def dispatch_batch(self, script_path, tests, input_path, done):
+    """This method is called when a batch completes. The return codes output
+    by the script are dispatched to the futures of the tests. If the batch
+    has been killed, or its output is not valid, all the tests get the
+    batch result.
+    """
+
+    os.unlink(input_path)
+
+    # Batch was cancelled before it started, thus were the tests
+    if done.cancelled():
+      for args, future in tests:
+        future.cancel()
+      return
+
+    if done.exception() is not None:
+      for args, future in tests:
+        future.set_exception(done.exception())
+      return
+
+    ret, out, err, duration = done.result()
+
+    # Script outputs a return code per argument set, in the input order
+    codes = []
+    if ret == 0:
+      try:
+        codes = [int(line) for line in out.decode(Key.UTF8.value).split()]
+      except ValueError:
+        codes = []
+
+    if len(codes) != len(tests):
+      if ret == 0:
+        logging.error("Batch execution of " + script_path + " returned " + str(len(codes)) +
+                      " results for " + str(len(tests)) + " tests. Mark tests as failed.")
+        ret = -1
+      for args, future in tests:
+        future.set_result((ret, out, err, duration))
+      return
+
+    # Tests shared the same execution, thus they share its duration
+    for (args, future), code in zip(tests, codes):
+      future.set_result((code, b"", err, duration / len(tests)))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # export_facts
+  #
+  # -------------------------------------------------------------------------
+  def export_facts(self):
+    """This method exports the system facts snapshot to the environment
+    inherited by the scripts. It is done only once per run.
+    """
+
+    if self.facts_environment is None:
+      self.facts_environment = self.facts.export()
+      os.environ.update(self.facts_environment)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # cleanup_facts
+  #
+  # -------------------------------------------------------------------------
+  def cleanup_facts(self):
+    """This method removes the exported snapshot and its environment
+    variables
+    """
+
+    if self.facts_environment is not None:
+      for variable in self.facts_environment:
+        os.environ.pop(variable, None)
+      self.facts_environment = None
+
+    self.facts.cleanup()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # check_fail_fast
+  #
+  # -------------------------------------------------------------------------
+  def check_fail_fast(self, future):
+    """This method is called when a test completes, whatever the order of
+    completion is. If the test failed, the run is aborted.
+    """
+
+    if future.cancelled() or future.exception() is not None:
+      return
+
+    if future.result()[0] not in [0, Key.RETURN_CODE_SKIPPED.value]:
+      self.abort_run()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # abort_run
+  #
+  # -------------------------------------------------------------------------
+  def abort_run(self):
+    """This method stops the run. Tests which have not started yet are not
+    executed, and running scripts are terminated. They are reported as
+    skipped.
+    """
+
+    # Abort can be requested from several threads at the same time
+    with self.abort_lock:
+      if self.engine.cancelled:
+        return
+
+      logging.info("Fail fast : a test has failed, aborting the run")
+      self.engine.cancel()
 
 
 
@@ -223,126 +808,68 @@ class RunTestSuite(CliCommand):
   # execute_test_recursively
   #
   # -------------------------------------------------------------------------
-  def execute_test_recursively(self, category, current_level=0, output_msg=None):
-    """This method is in charge of doing real test execution, and recurse down
-    to the test tree (going down in the subcategories).
+  def execute_test_recursively(self, category, current_level=0):
+    """This method is in charge of collecting test results from the engine,
+    and recurse down to the test tree (going down in the subcategories). Results
+    are retrieved in the tree order, whatever the order of completion is.
+
+    Each test line is printed as soon as its result is known. The category
+    line needs the result of the whole subtree, thus it is printed once the
+    subtree is done. If the subtree has lines to display, a header line is
+    printed first to keep the tree readable.
+
+    The structured result of each test is sent to the report writers.
+
+    It returns True if all the tests of the subtree were successful.
     """
 
-    # Generate a local output buffer
-    local_msg = []
+    # Indentation of the lines of this category has been generated with the plan
+    indent = self.plan.indents[current_level]
+
+    # Lines of this level are output only if below aggregation level. Otherwise they are
+    # aggregated in the result of the parent category
+    displayed = self.is_displayed(current_level)
+
+    # Does this category have lines displayed below its own line ?
+    has_displayed_children = displayed and (category.has_tests or \
+                             (category.has_subcategories and \
+                              self.is_displayed(current_level + 1)))
 
-    # Generate output string
-    output = ""
-    output = "".join("  " for i in range(current_level))
-    output += " - Testing " + category[Key.CATEGORY.value]
+    # Result of the category is not known yet. Output a header, its result is output later
+    if has_displayed_children:
+      self.display(indent + " - Testing " + category.name)
 
     # Flags used to mark if the locally defined and subcategories tests were successfull
     success_local = True
     success_subtest = True
 
-    # Defines variables used to store stderr and stdout content
-    err = None
-    out = None
-
     # Execute test defined at category level
-    if not Key.TEST.value in category:
+    if not category.has_tests:
       # No test is defined, only output a deug log and move to nxt category
-      logging.debug("No test defined in category " + category[Key.CATEGORY.value])
+      logging.debug("No test defined in category " + category.name)
     else:
       # Let's iterate all the tests in the current category
-      for test in category[Key.TEST.value]:
-        # Initialize local variables
-        ret = -1
+      for test in self.plan.get_tests(category):
+        # Retrieve the result of the test, waiting for the engine to complete its execution
+        script_path, ret, out, err, duration = self.get_result(test)
 
-        # Now, let's generate the path to the real test. Let'siterate all the path from
-        # the library. User defined path have been inserted to head of the array.
-        script_found = False
-
-        for item in self.cfg.library:
-          # Generate current path
-          script_path = item + "/" + test[Key.SCRIPT.value]
-          script_path = os.path.expanduser(script_path)
-
-          # Does the file exist ?
-          logging.debug("Checking if script " + script_path + " exist and is executable...")
-          if os.path.isfile(script_path) and os.access(script_path, os.X_OK | os.R_OK):
-            # Yes found it, thus exit the search loop
-            logging.debug("Found " + script_path)
-            script_found = True
-            break
-
-        # Check that the script has been found. Loop can end without positive hit.
-        if not script_found:
-          logging.error("Script " + script_path +" does not exist. Mark test as failed.")
-          ret = -1
-        # Script exist, we can try to execute it
-        else:
-          # If args are defined, concatenate to the script command line
-          script_cmd = script_path
-          if Key.ARGS.value in test:
-            script_cmd += " " + test[Key.ARGS.value]
-
-          # If the cache is activated, then store the result in the hash table
-          if self.cfg.use_results_cache:
-            logging.debug("Using result cache")
-            # Is the value already in cache ? If not then create the sub hashtable
-            # Subtable is used to hash arguments for a given script
-            if not test[Key.SCRIPT.value] in self.results_cache.keys():
-              logging.debug("Create SUB hashtable for " + test[Key.SCRIPT.value])
-              self.results_cache[test[Key.SCRIPT.value]] = {}
-
-            # Check if we already have a result for these arguments, if no store the result
-            if test[Key.ARGS.value] in self.results_cache[test[Key.SCRIPT.value]].keys():
-              logging.debug("Cache hit for " + test[Key.SCRIPT.value] + " " + test[Key.ARGS.value])
-              logging.debug("Using previous result " +
-                            str(self.results_cache[test[Key.SCRIPT.value]][test[Key.ARGS.value]]))
-              ret = self.results_cache[test[Key.SCRIPT.value]][test[Key.ARGS.value]]
-            else:
-              logging.debug("Cache miss for " + test[Key.SCRIPT.value] + " " + test[Key.ARGS.value])
-              logging.debug("Executing test script")
-              ret, out, err = self.execute_command(script_cmd)
-
-          else:
-            # Not using cache, thus execute the test
-            ret, out, err = self.execute_command(script_cmd)
+        # Stop the run at the first failure. Failures are checked in completion order by
+        # check_fail_fast, this one catches the scripts which were not found
+        if self.cfg.fail_fast and ret not in [0, Key.RETURN_CODE_SKIPPED.value]:
+          self.abort_run()
 
         # Output generation is moved after test execution to be able to output failed test in bold
         # And filter output using the --errors-only flag.
-        test_output = ""
-
-        # Generate the output message describing the current test
-        test_output = "".join("  " for i in range(current_level))
+        test_output = self.format_test(indent, test, script_path, ret)
 
-        # Output the BOLD ANSI sequence
-        if ret != 0:
-          test_output += Colors.FG_RED.value
-
-        # Check if there is a test description in the YAML file
-        if Key.DESCRIPTION.value in test:
-          # YEs, thus out the description
-          test_output += "   - " + test[Key.DESCRIPTION.value]
-        else:
-          # No description available, thus default to outputing the test script name
-          test_output += "   - Running : " + test[Key.SCRIPT.value]
-
-
-        # Output the RESET ANSI sequence
-        if ret != 0:
-          test_output += Colors.RESET.value
-
-        # Concatenate the current test informaton to the output
-        test_output += "".join(" " for i in range(Key.OUTPUT_RESULT_PADDING.value - \
-                               len(test_output)))
-
-        # And generate the colored result output. Green is a success, red a failure
+        # Update the local result. Skipped tests are counted, they are output once the run is done
         if ret == 0:
           success_local &= True
-          test_output += "[" + Colors.FG_GREEN.value + Colors.BOLD.value + " OK "
-          test_output += Colors.RESET.value + "]"
+        elif ret == Key.RETURN_CODE_SKIPPED.value:
+          success_local &= False
+          self.skipped_tests += 1
         else:
           success_local &= False
-          test_output += "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO "
-          test_output += Colors.RESET.value + "]"
 
           # Output the returns to the debug log
           logging.debug("Return code : " + str(ret))
@@ -351,81 +878,192 @@ class RunTestSuite(CliCommand):
           if err is not None:
             logging.debug("Stderr      : " + str(err))
 
-          # Test failed,check if hinting is activated, if yes, concatenated to output buffer
-          if self.cfg.show_hints:
-            test_output += "\n"
-            test_output += "".join("  " for i in range(current_level))
-            test_output += "     " + Colors.FG_CYAN.value + "Hint : "
-            test_output += self.show_hints(script_path, ret) + Colors.RESET.value
-
-        # Push the line to output to the message buffer only if below aggregation level
-        if self.cfg.aggregation_level is None or (current_level < int(self.cfg.aggregation_level)):
-          local_msg.append(test_output)
-
-        # If the cache is activated, then store the result in the hash table
-        if self.cfg.use_results_cache:
-          logging.debug("Using result cache")
-          # Is the value already in cache ? If not then create the sub hashtable
-          # Subtable is used to hash arguments for a given script
-          if not test[Key.SCRIPT.value] in self.results_cache.keys():
-            logging.debug("Create SUB hashtable for " + test[Key.SCRIPT.value])
-            self.results_cache[test[Key.SCRIPT.value]] = {}
-          else:
-            # Check if we already have a result for these arguments, if no store the result
-            if not test[Key.ARGS.value] in self.results_cache[test[Key.SCRIPT.value]].keys():
-              logging.debug("Cache miss for " + test[Key.SCRIPT.value] + " " + test[Key.ARGS.value])
-              self.results_cache[test[Key.SCRIPT.value]][test[Key.ARGS.value]] = ret
-            else:
-              logging.debug("Cache hit for " + test[Key.SCRIPT.value] + " " + test[Key.ARGS.value])
+        # Print the line as soon as the result is known, only if below aggregation level
+        if displayed:
+          self.display(test_output)
+
+        # Send the structured result to the reports
+        self.report_result(test, script_path, ret, duration)
+
+    # Iterate the sub cateries and recursivly execute tests
+    # For each sub category in the test suite
+    for cur in self.plan.get_children(category):
+      # Recurse suite tree, then use the return value to compute the new subtest state
+      success_subtest &= self.execute_test_recursively(cur, current_level + 1)
+
+    # Now that the subtree is done, generate the category result line. If a header has been
+    # output, this line closes the category
+    if has_displayed_children:
+      output = indent + " - Result of " + category.name
+    else:
+      output = indent + " - Testing " + category.name
 
     # Add string right padding to align at Key.OUTPUT_RESULT_PADDING.value
     output += "".join(" " for i in range(Key.OUTPUT_RESULT_PADDING.value - len(output)))
 
-    # Iterate the sub cateries and recursivly execute tests
-    if Key.TEST_SUITE.value in category:
-      # For each sub category in the test suite
-      for cur in category[Key.TEST_SUITE.value]:
-        # Recurse suite tree
-        res, out = self.execute_test_recursively(cur, current_level + 1, output_msg)
+    output += self.format_category_status(category, success_local, success_subtest)
+
+    # Print the category result only if below aggregation level
+    if displayed:
+      self.display(output)
+
+    # Return the local test result and the subtest result
+    return success_local & success_subtest
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_result
+  #
+  # -------------------------------------------------------------------------
+  def get_result(self, test):
+    """This method waits for the result of a scheduled test. It returns a
+    tuple made of the script path, the return code, the output, the error
+    output and the duration of the test.
+    """
+
+    # Initialize local variables
+    ret = -1
+    err = None
+    out = None
+    duration = 0.0
+
+    # Retrieve the script path and the future submitted by schedule_test
+    script_path, future = self.scheduled_tests[test.offset]
+
+    # Script was not found in the library, thus the test is failed. Otherwise wait for
+    # the engine to complete its execution. Future has been cancelled if the run has
+    # been aborted before the test started
+    if future is not None:
+      try:
+        ret, out, err, duration = future.result()
+      except CancelledError:
+        ret = Key.RETURN_CODE_SKIPPED.value
+
+    return script_path, ret, out, err, duration
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # report_result
+  #
+  # -------------------------------------------------------------------------
+  def report_result(self, test, script_path, ret, duration):
+    """This method sends the structured result of a test to the report
+    writers. Hints are included for failed tests.
+    """
+
+    if len(self.writers) > 0:
+      hint = ""
+      if ret not in [0, Key.RETURN_CODE_SKIPPED.value]:
+        hint = self.show_hints(script_path, ret)
+      result = TestResult(self.plan.categories[test.category].path, test, ret, duration, hint)
+      for writer in self.writers:
+        writer.add_result(result)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # format_test
+  #
+  # -------------------------------------------------------------------------
+  def format_test(self, indent, test, script_path, ret):
+    """This method generates the line describing the result of a test. The
+    hint of a failed test is added on a second line if hints are activated.
+    """
+
+    # Generate the output message describing the current test
+    test_output = indent
+
+    # Output the BOLD ANSI sequence. Skipped tests have not failed, they are not highlighted
+    if ret not in [0, Key.RETURN_CODE_SKIPPED.value]:
+      test_output += Colors.FG_RED.value
+
+    # Check if there is a test description in the YAML file
+    if test.description is not None:
+      # YEs, thus out the description
+      test_output += "   - " + test.description
+    else:
+      # No description available, thus default to outputing the test script name
+      test_output += "   - Running : " + test.script
+
+
+    # Output the RESET ANSI sequence
+    if ret not in [0, Key.RETURN_CODE_SKIPPED.value]:
+      test_output += Colors.RESET.value
+
+    # Concatenate the current test informaton to the output
+    test_output += "".join(" " for i in range(Key.OUTPUT_RESULT_PADDING.value - \
+                           len(test_output)))
+
+    # And generate the colored result output. Green is a success, red a failure, purple
+    # a script killed on timeout, and grey a test skipped by fail fast
+    if ret == 0:
+      test_output += "[" + Colors.FG_GREEN.value + Colors.BOLD.value + " OK "
+      test_output += Colors.RESET.value + "]"
+    elif ret == Key.RETURN_CODE_SKIPPED.value:
+      # Test was not run because of fail fast. There is no hint to display
+      test_output += "[" + Colors.FG_DARKGREY.value + Colors.BOLD.value + " SKIPPED "
+      test_output += Colors.RESET.value + "]"
+    else:
+      if ret == Key.RETURN_CODE_TIMEOUT.value:
+        test_output += "[" + Colors.FG_PURPLE.value + Colors.BOLD.value + " TIMEOUT "
+      else:
+        test_output += "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO "
+      test_output += Colors.RESET.value + "]"
+
+      # Test failed,check if hinting is activated, if yes, concatenated to output buffer
+      if self.cfg.show_hints:
+        test_output += "\n"
+        test_output += indent + "     " + Colors.FG_CYAN.value + "Hint : "
+        test_output += self.show_hints(script_path, ret) + Colors.RESET.value
 
-        # Then use the return values to compute the new subtest state
-        success_subtest &= res
+    return test_output
 
-        # Concatenate the string buffers
-        local_msg += out
+
+
+  # -------------------------------------------------------------------------
+  #
+  # format_category_status
+  #
+  # -------------------------------------------------------------------------
+  def format_category_status(self, category, success_local, success_subtest):
+    """This method generates the colored result of a category, from the
+    results of its own tests and of its subcategories
+    """
 
     # Were local tests sucessful ? yes thus a green OK
     if success_local:
       if success_subtest:
-        output += "[" + Colors.FG_GREEN.value + Colors.BOLD.value + " OK "
-        output += Colors.RESET.value + "]"
-      else:
-        # We have to deal now with the case of "no local tests". If no local test are defined,
-        # thus it has to go red and not orange
-        if not Key.TEST.value in category:
-          output += "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO "
-          output += Colors.RESET.value + "]"
-        else:
-          output += "[" + Colors.FG_ORANGE.value + Colors.BOLD.value + " Partiel "
-          output += Colors.RESET.value + "]"
-    else:
-      # Nope... thus a red KO
-      output += "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO " + Colors.RESET.value + "]"
+        return "[" + Colors.FG_GREEN.value + Colors.BOLD.value + " OK " + Colors.RESET.value + "]"
 
-    # Push the line to output to the message buffer only if below aggregation level
-    if self.cfg.aggregation_level is None or (current_level < int(self.cfg.aggregation_level)):
-      local_msg.insert(0, output)
+      # We have to deal now with the case of "no local tests". If no local test are defined,
+      # thus it has to go red and not orange
+      if not category.has_tests:
+        return "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO " + Colors.RESET.value + "]"
 
-    # Concatenate local and output buffers
-    output_msg = local_msg + output_msg
+      return "[" + Colors.FG_ORANGE.value + Colors.BOLD.value + " Partiel " + \
+             Colors.RESET.value + "]"
 
-    # If we are back to top level, the print the message buffer
-    if current_level == 0:
-      for msg in output_msg:
-        print(msg)
+    # Nope... thus a red KO
+    return "[" + Colors.FG_RED.value + Colors.BOLD.value + " KO " + Colors.RESET.value + "]"
 
-    # Return the local test result and the subtest result
-    return(success_local & success_subtest, output_msg)
+
+
+  # -------------------------------------------------------------------------
+  #
+  # is_displayed
+  #
+  # -------------------------------------------------------------------------
+  def is_displayed(self, level):
+    """This method returns True if the lines of the given tree level have to
+    be output, according to the aggregation level.
+    """
+
+    return self.cfg.aggregation_level is None or level < int(self.cfg.aggregation_level)
 
 
 
@@ -437,7 +1075,8 @@ class RunTestSuite(CliCommand):
   def show_hints(self, script_path, hint_code):
     """This method is in charge of retreiving the hint string from the script
     givenin arguent. It assumes that the script returned a none zero value,
-    and that a hint is defined in command in the script.
+    and that a hint is defined in command in the script. Hints come from
+    the meta data table of the library, thus the script is read only once.
 
     Hints format are :
     # @SBIT hint hint_code hit_message
@@ -446,30 +1085,18 @@ class RunTestSuite(CliCommand):
     an aempty string is returned.
     """
 
-    # Check that file exists
-    if not os.path.isfile(script_path):
-      # Yes found it, thus exit the search loop
-      logging.error("Script " + script_path + " does not exist")
+    # Script has been killed, it had no chance to return a code
+    if hint_code == Key.RETURN_CODE_TIMEOUT.value:
+      return "Script did not complete before timeout"
+
+    # Script was not found in the library, there is nothing to read
+    if script_path is None:
       return ""
 
-    # Checkcthat file exists
-    if not os.access(script_path, os.R_OK):
-      # Yes found it, thus exit the search loop
-      logging.error("Script " + script_path + " is not readable")
+    # Meta data are parsed once per script, then kept in the library table
+    metadata = self.library.get_metadata(script_path)
+    if metadata is None:
       return ""
 
-    # We can read the script, now let'search for the hint line in the file. Stop at first match
-    for line in open(script_path):
-      # Split line into individual words
-      tokens = line.split()
-
-      # Need at least five items on the line to be a match candidate
-      if len(tokens) > 4:
-        # Check that this line structure is somethin like "# @SBIT hint hint_code _hint_message"
-        if tokens[0] == "#" and tokens[1].lower() == "@sbit" and tokens[2].lower() == "hint" and \
-           tokens[3] == str(hint_code):
-          # Yes :)  ten its a match, return the end of the line
-          return " ".join(tokens[4:])
-
-    # Still here ? then no hint is defined, return an empty string
-    return ""
+    # If no hint is defined, return an empty string
+    return metadata.hints.get(str(hint_code), "")
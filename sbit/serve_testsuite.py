@@ -0,0 +1,391 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the daemon mode. The suite is loaded and the
+library indexed once, then runs are requested through a Unix socket.
+
+Protocol is one JSON object per line, in both directions. Requests are :
+  {"command": "run", "category": ["cat:subcat", ...]}  run the categories now
+  {"command": "last"}                                  result of the last scheduled run
+  {"command": "ping"}                                  check the daemon is alive
+
+Category is optional, it defaults to the categories given on the command
+line. Run responses hold the status, the global success flag, the duration,
+the list of the test results (the fields of the JSON Lines report) and the
+console output.
+
+Reports given on the command line are opened once, when the daemon starts.
+They receive the results of all the runs, and are closed when it stops.
+"""
+
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from sbit.model import Key
+from sbit.result_writers import ResultWriter
+from sbit.run_testsuite import RunTestSuite
+
+# Maximum size of a request line
+MAX_REQUEST_SIZE = 65536
+
+# -----------------------------------------------------------------------------
+#
+#    Class ResultCollector
+#
+# -----------------------------------------------------------------------------
+class ResultCollector(ResultWriter):
+  """This class keeps the results of a run in memory, as dictionnaries
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self):
+    """Default constructor. Results are not written to any stream.
+    """
+
+    self.path = None
+    self.stream = None
+    self.count = 0
+
+    # List of the results, in the tree order
+    self.results = []
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # is_stdout
+  #
+  # -------------------------------------------------------------------------
+  def is_stdout(self):
+    """Results are not written to stdout
+    """
+
+    return False
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # add_result
+  #
+  # -------------------------------------------------------------------------
+  def add_result(self, result):
+    """This method stores a single TestResult
+    """
+
+    self.count += 1
+    self.results.append(result.to_dict())
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close
+  #
+  # -------------------------------------------------------------------------
+  def close(self):
+    """There is no stream to close
+    """
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class ServeTestSuite
+#
+# -----------------------------------------------------------------------------
+class ServeTestSuite(RunTestSuite):
+  """This class implements the daemon. Runs are executed one at a time, the
+  requests received during a run wait for its completion. Results and
+  system facts are not shared between runs, the persistent cache is.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, cfg):
+    """Default constructor
+    """
+
+    RunTestSuite.__init__(self, cfg)
+
+    # Lock serializing the runs
+    self.run_lock = threading.Lock()
+
+    # Response of the last scheduled run. None until the first one completes
+    self.last_response = None
+
+    # Event set when the daemon stops, it ends the scheduled runs
+    self.stopped = threading.Event()
+
+    # Writers of the reports given on the command line, open while the daemon runs
+    self.reports = []
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # serve
+  #
+  # -------------------------------------------------------------------------
+  def serve(self):
+    """This method loads the suite, then serves the requests until the
+    daemon is terminated
+    """
+
+    self.load_suite()
+
+    # Open the reports once, the runs only add their results to them
+    RunTestSuite.open_reports(self)
+    self.reports = self.writers
+    self.writers = []
+
+    socket_path = os.path.expanduser(self.cfg.socket)
+    self.remove_stale_socket(socket_path)
+
+    # Runs are requested by any local process the socket is accessible to. Restrict it to
+    # the owner, access can be granted later by changing its mode
+    previous_umask = os.umask(0o077)
+    try:
+      server = socketserver.ThreadingUnixStreamServer(socket_path, self.create_handler())
+    finally:
+      os.umask(previous_umask)
+    server.daemon_threads = True
+
+    # Terminate properly on SIGTERM, the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    scheduler = None
+    if self.cfg.interval is not None:
+      scheduler = threading.Thread(target=self.schedule_runs, name="sbit-scheduler", daemon=True)
+      scheduler.start()
+
+    logging.info("Serving " + self.cfg.suite + " on " + socket_path)
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      self.stopped.set()
+      server.server_close()
+      os.unlink(socket_path)
+
+      # Wait for the run in progress, then terminate the reports
+      with self.run_lock:
+        for writer in self.reports:
+          writer.close()
+        self.reports = []
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # open_reports
+  #
+  # -------------------------------------------------------------------------
+  def open_reports(self):
+    """This method adds the reports of the daemon to the writers of the run.
+    They are already open, and the console of the run is kept.
+    """
+
+    self.writers.extend(self.reports)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close_reports
+  #
+  # -------------------------------------------------------------------------
+  def close_reports(self):
+    """This method releases the writers of the run. The reports of the daemon
+    stay open for the next runs.
+    """
+
+    self.writers = []
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # remove_stale_socket
+  #
+  # -------------------------------------------------------------------------
+  def remove_stale_socket(self, socket_path):
+    """This method removes the socket left by a daemon which has not been
+    terminated properly. It exits if another daemon is listening to it.
+    """
+
+    if not os.path.exists(socket_path):
+      return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+      try:
+        client.connect(socket_path)
+      except OSError:
+        logging.debug("Removing stale socket " + socket_path)
+        os.unlink(socket_path)
+        return
+
+    logging.critical("A daemon is already listening on " + socket_path)
+    exit(1)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # create_handler
+  #
+  # -------------------------------------------------------------------------
+  def create_handler(self):
+    """This method returns the class handling the connections. Each line
+    received is a request, each response is sent back as a line.
+    """
+
+    daemon = self
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+      """Handler of a client connection
+      """
+
+      def handle(self):
+        """Answer the requests until the client closes the connection
+        """
+        while True:
+          line = self.rfile.readline(MAX_REQUEST_SIZE)
+          if len(line) == 0:
+            return
+          response = daemon.handle_request(line)
+          self.wfile.write(json.dumps(response).encode(Key.UTF8.value) + b"\n")
+          self.wfile.flush()
+
+    return RequestHandler
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # handle_request
+  #
+  # -------------------------------------------------------------------------
+  def handle_request(self, line):
+    """This method decodes a request, executes it, and returns the response
+    """
+
+    try:
+      request = json.loads(line.decode(Key.UTF8.value))
+      if not isinstance(request, dict):
+        raise ValueError("Request is not an object")
+    except ValueError as exception:
+      return error_response("Invalid request : " + str(exception))
+
+    command = request.get("command")
+    if command == "ping":
+      return {Key.RESULT_STATUS.value: "ok"}
+
+    if command == "last":
+      if self.last_response is None:
+        return error_response("No scheduled run has completed yet")
+      return self.last_response
+
+    if command == "run":
+      categories = request.get(Key.CATEGORY.value, self.cfg.category)
+      if isinstance(categories, str):
+        categories = [categories]
+      if categories is not None and \
+         (not isinstance(categories, list) or not all(isinstance(item, str) for item in categories)):
+        return error_response("Category must be a string or a list of strings")
+      return self.run_request(categories)
+
+    return error_response("Unknown command : " + str(command))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # run_request
+  #
+  # -------------------------------------------------------------------------
+  def run_request(self, categories):
+    """This method runs the given categories, and returns the response
+    holding the results
+    """
+
+    with self.run_lock:
+      collector = ResultCollector()
+      self.console = io.StringIO()
+      self.writers = [collector]
+      start = time.monotonic()
+
+      try:
+        success = self.run_selection(categories)
+      except ValueError as exception:
+        return error_response(str(exception))
+      finally:
+        # Writers are released by the run, unless it failed before opening them
+        self.close_reports()
+
+      return {Key.RESULT_STATUS.value: "ok",
+              "success": success,
+              Key.RESULT_DURATION.value: round(time.monotonic() - start, 6),
+              "results": collector.results,
+              "output": self.console.getvalue(),
+              "timestamp": time.time()}
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # schedule_runs
+  #
+  # -------------------------------------------------------------------------
+  def schedule_runs(self):
+    """This method runs the categories given on the command line at the
+    configured interval. The last response is kept for the last command.
+    """
+
+    while not self.stopped.is_set():
+      self.last_response = self.run_request(self.cfg.category)
+      self.stopped.wait(self.cfg.interval)
+
+
+
+# -------------------------------------------------------------------------
+#
+# error_response
+#
+# -------------------------------------------------------------------------
+def error_response(message):
+  """This function returns the response sent when a request fails
+  """
+
+  return {Key.RESULT_STATUS.value: "error", "message": message}
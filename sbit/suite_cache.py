@@ -0,0 +1,179 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the cache of the compiled test suites, and of the
+compiled configuration files. A file is parsed once, then its content is
+stored in the marshal format, which loads about a hundred times faster than
+the YAML file, even with the libyaml loader.
+
+The compiled file is stored next to the YAML file (.name.sbitc), or in the
+given cache directory. Files stored in a read only directory (/etc/sbit, etc.)
+are compiled to the user cache directory. The compiled file is keyed on the
+absolute path, the modification time and the size of the YAML file. Any change
+of the file compiles it again.
+
+PyYAML is imported only when a file has to be parsed, thus a run from an up
+to date compiled suite does not pay for it.
+"""
+
+import logging
+import marshal
+import os
+
+# Version of the compiled suite format. Files written with another version are compiled again
+COMPILED_FORMAT = 1
+
+# Suffix of the compiled suite files
+COMPILED_SUFFIX = ".sbitc"
+
+# Directory storing the compiled files when the directory of the YAML file is read only
+USER_CACHE_DIR = "~/.cache/sbit"
+
+# -------------------------------------------------------------------------
+#
+# load_yaml
+#
+# -------------------------------------------------------------------------
+def load_yaml(stream):
+  """This function parses the given YAML stream with the safe loader. The
+  libyaml based one is used when PyYAML has been built with it, it is several
+  times faster than the pure Python one.
+  """
+
+  import yaml
+
+  return yaml.load(stream, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+
+# -------------------------------------------------------------------------
+#
+# load_suite_file
+#
+# -------------------------------------------------------------------------
+def load_suite_file(filename, cache_dir=None):
+  """This function returns the content of the given suite file. The compiled
+  suite is used if it is up to date, otherwise the YAML file is parsed and
+  the compiled suite is written for the next runs. It raises OSError if the
+  suite file cannot be read.
+  """
+
+  path = os.path.abspath(filename)
+  status = os.stat(path)
+  key = (COMPILED_FORMAT, marshal.version, path, status.st_mtime_ns, status.st_size)
+
+  compiled_path = get_compiled_path(path, cache_dir)
+  suite = read_compiled_suite(compiled_path, key)
+  if suite is not None:
+    logging.debug("Using compiled suite : " + compiled_path)
+    return suite[0]
+
+  with open(path, "r") as working_file:
+    content = load_yaml(working_file)
+
+  write_compiled_suite(compiled_path, key, content)
+  return content
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_compiled_path
+#
+# -------------------------------------------------------------------------
+def get_compiled_path(path, cache_dir=None):
+  """This function returns the path of the compiled suite of the given suite
+  file. Compiled suites stored in a cache directory are named after the hash
+  of the suite path, since suites from several directories can share a name.
+  """
+
+  if cache_dir is None:
+    directory, name = os.path.split(path)
+    if os.access(directory, os.W_OK):
+      return os.path.join(directory, "." + name + COMPILED_SUFFIX)
+    cache_dir = USER_CACHE_DIR
+
+  import hashlib
+
+  name = hashlib.sha256(path.encode("utf-8")).hexdigest()
+  return os.path.join(os.path.expanduser(cache_dir), "suite-" + name + COMPILED_SUFFIX)
+
+
+
+# -------------------------------------------------------------------------
+#
+# read_compiled_suite
+#
+# -------------------------------------------------------------------------
+def read_compiled_suite(compiled_path, key):
+  """This function returns a tuple holding the content of the compiled suite,
+  or None if it does not exist, if it cannot be read, or if it has been
+  compiled from another version of the suite file
+  """
+
+  try:
+    with open(compiled_path, "rb") as working_file:
+      compiled_key, content = marshal.load(working_file)
+  except (OSError, EOFError, ValueError, TypeError):
+    return None
+
+  if compiled_key != key:
+    logging.debug("Compiled suite is out of date : " + compiled_path)
+    return None
+
+  return (content,)
+
+
+
+# -------------------------------------------------------------------------
+#
+# write_compiled_suite
+#
+# -------------------------------------------------------------------------
+def write_compiled_suite(compiled_path, key, content):
+  """This function writes the compiled suite. File is written under a
+  temporary name then renamed, thus concurrent runs never read a partial
+  file. Failures are not fatal, the suite is parsed again by the next run.
+  """
+
+  try:
+    data = marshal.dumps((key, content))
+  except ValueError as exception:
+    # Values without marshal support (dates, etc.) are kept only in the parsed suite
+    logging.debug("Cannot compile suite : " + str(exception))
+    return
+
+  import tempfile
+
+  directory = os.path.dirname(compiled_path)
+  try:
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(prefix=".sbit-suite-", dir=directory)
+  except OSError as exception:
+    logging.debug("Cannot write compiled suite " + compiled_path + " : " + str(exception))
+    return
+
+  try:
+    with os.fdopen(handle, "wb") as working_file:
+      working_file.write(data)
+    os.replace(temporary_path, compiled_path)
+    logging.debug("Suite compiled to " + compiled_path)
+  except OSError as exception:
+    logging.debug("Cannot write compiled suite " + compiled_path + " : " + str(exception))
+    os.unlink(temporary_path)
@@ -0,0 +1,275 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the execution plan of a test suite. The nested
+structure loaded from the suite file is converted once into two flat arrays,
+one for the categories and one for the tests, in the tree order.
+
+Nodes refer to each other by their offset in these arrays. The tests of a
+category are contiguous, thus they are a range of the tests array. Category
+paths are indexed in lower case, a category is found with a single lookup.
+"""
+
+from sbit.model import Key
+
+# Separator of the category names in a category path
+PATH_SEPARATOR = ":"
+
+# -----------------------------------------------------------------------------
+#
+# get_duration
+#
+# -----------------------------------------------------------------------------
+def get_duration(definition, key, owner):
+  """This function returns the duration, in seconds, stored under the given
+  key of a category or test definition. Owner names the category or the test
+  in the error message. It raises ValueError if the value is not a number.
+  """
+
+  try:
+    return float(definition[key.value])
+  except (TypeError, ValueError):
+    raise ValueError("The " + key.value + " of " + owner + " is not a number : " +
+                     str(definition[key.value]))
+
+# -----------------------------------------------------------------------------
+#
+#    Class CategoryNode
+#
+# -----------------------------------------------------------------------------
+class CategoryNode(object):
+  """This class stores a category of the plan
+  """
+
+  __slots__ = ["offset", "name", "path", "description", "depth", "parent", "children",
+               "first_test", "last_test", "has_tests", "has_subcategories", "cache_ttl"]
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, offset, definition, parent, path):
+    """Default constructor. Definition is the category from the suite file,
+    path is the list of the category names from the root.
+    """
+
+    # Offset of the node in the categories array, and of its parent. Parent is None at the root
+    self.offset = offset
+    self.parent = parent
+
+    # Name and description of the category. Path is the list of the names from the root
+    self.name = definition[Key.CATEGORY.value]
+    self.description = definition.get(Key.DESCRIPTION.value)
+    self.path = path
+    self.depth = len(path) - 1
+
+    # Offsets of the subcategories in the categories array
+    self.children = ()
+
+    # Range of the tests of the category in the tests array
+    self.first_test = 0
+    self.last_test = 0
+
+    # Flags set if the category defines tests, and subcategories, even empty ones
+    self.has_tests = Key.TEST.value in definition
+    self.has_subcategories = Key.TEST_SUITE.value in definition
+
+    # Persistent cache time to live defined by the category. None if it is inherited
+    self.cache_ttl = None
+    if Key.CACHE_TTL.value in definition:
+      self.cache_ttl = get_duration(definition, Key.CACHE_TTL, "category " + str(self.name))
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestNode
+#
+# -----------------------------------------------------------------------------
+class TestNode(object):
+  """This class stores a test of the plan
+  """
+
+  __slots__ = ["offset", "category", "script", "args", "description", "timeout", "cache_ttl",
+               "script_path"]
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, offset, definition, category):
+    """Default constructor. Definition is the test from the suite file.
+    """
+
+    # Offset of the node in the tests array, and of its category in the categories array
+    self.offset = offset
+    self.category = category
+
+    # Script name, arguments and description of the test
+    self.script = definition[Key.SCRIPT.value]
+    self.args = definition.get(Key.ARGS.value)
+    self.args = "" if self.args is None else str(self.args)
+    self.description = definition.get(Key.DESCRIPTION.value)
+
+    # Timeout and persistent cache time to live defined by the test. None if they are inherited
+    self.timeout = None
+    if Key.TIMEOUT.value in definition:
+      self.timeout = get_duration(definition, Key.TIMEOUT, "test " + str(self.script))
+
+    self.cache_ttl = None
+    if Key.CACHE_TTL.value in definition:
+      self.cache_ttl = get_duration(definition, Key.CACHE_TTL, "test " + str(self.script))
+
+    # Path of the script in the library. None until resolved, or if it is not in the library
+    self.script_path = None
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class SuitePlan
+#
+# -----------------------------------------------------------------------------
+class SuitePlan(object):
+  """This class stores the flat representation of a test suite
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, suite):
+    """Default constructor. Suite is the content of the suite file.
+    """
+
+    # Categories and tests, in the tree order
+    self.categories = []
+    self.tests = []
+
+    # Offsets of the root categories
+    self.roots = []
+
+    # Hash table mapping the lower case category paths to the category offsets. If several
+    # categories have the same path, the first one is used
+    self.index = {}
+
+    for definition in suite or []:
+      self.roots.append(self.add_category(definition, None, []))
+
+    # Indentation prefixes of the output lines, indexed by tree level
+    depth = max([category.depth for category in self.categories] + [0])
+    self.indents = ["  " * level for level in range(depth + 2)]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # add_category
+  #
+  # -------------------------------------------------------------------------
+  def add_category(self, definition, parent, parent_path):
+    """This method appends the given category and its subtree to the plan,
+    and returns the offset of the category
+    """
+
+    category = CategoryNode(len(self.categories), definition, parent,
+                            parent_path + [definition[Key.CATEGORY.value]])
+    self.categories.append(category)
+    self.index.setdefault(PATH_SEPARATOR.join(category.path).lower(), category.offset)
+
+    # Tests are appended before the subcategories, thus they are contiguous
+    category.first_test = len(self.tests)
+    for test in definition.get(Key.TEST.value) or []:
+      self.tests.append(TestNode(len(self.tests), test, category.offset))
+    category.last_test = len(self.tests)
+
+    category.children = tuple(self.add_category(child, category.offset, category.path)
+                              for child in definition.get(Key.TEST_SUITE.value) or [])
+
+    return category.offset
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # resolve
+  #
+  # -------------------------------------------------------------------------
+  def resolve(self, library):
+    """This method resolves the script paths of all the tests from the
+    library index
+    """
+
+    for test in self.tests:
+      test.script_path = library.resolve(test.script)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # find
+  #
+  # -------------------------------------------------------------------------
+  def find(self, path):
+    """This method returns the category of the given path. Case is ignored.
+    It raises ValueError if the category is not found.
+    """
+
+    offset = self.index.get(path.lower())
+    if offset is not None:
+      return self.categories[offset]
+
+    # Report the first token which was not found
+    tokens = path.split(PATH_SEPARATOR)
+    count = 1
+    while PATH_SEPARATOR.join(tokens[:count]).lower() in self.index:
+      count += 1
+
+    raise ValueError("The token " + tokens[count - 1] + " defined in the category to "
+                     "execute was not found in the test suite definition file")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_tests
+  #
+  # -------------------------------------------------------------------------
+  def get_tests(self, category):
+    """This method returns the list of the tests of the given category
+    """
+
+    return self.tests[category.first_test:category.last_test]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_children
+  #
+  # -------------------------------------------------------------------------
+  def get_children(self, category):
+    """This method returns the list of the subcategories of the given
+    category
+    """
+
+    return [self.categories[offset] for offset in category.children]
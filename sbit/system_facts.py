@@ -0,0 +1,292 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the snapshot of the system facts (kernel files
+read by many checks) taken once per run.
+
+Facts are read the first time a native check needs them. When a script is
+executed, the snapshot is completed and exported to a directory, whose path
+is given to the scripts by the SBIT_FACTS_DIR environment variable.
+
+The snapshot also holds the providers, which index a system database (dpkg
+status, process table, network interfaces, mount table, file contents, XML
+documents) once per run to answer the native checks.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from sbit.file_search import FileSearch
+from sbit.interface_table import InterfaceTable
+from sbit.model import Key
+from sbit.mount_index import MountIndex
+from sbit.package_index import PackageIndex
+from sbit.process_table import ProcessTable
+from sbit.xml_documents import XmlDocuments
+
+# Hash table mapping the fact names to the kernel files they are read from. Fact names are
+# the names of the files in the exported directory
+FACT_FILES = {"cpuinfo": "/proc/cpuinfo",
+              "filesystems": "/proc/filesystems",
+              "meminfo": "/proc/meminfo",
+              "mounts": "/proc/mounts"}
+
+# -----------------------------------------------------------------------------
+#
+#    Class SystemFacts
+#
+# -----------------------------------------------------------------------------
+class SystemFacts(object):
+  """This class stores the content of the kernel files shared by the checks.
+  Each file is read at most once per run.
+
+  Files are read relatively to the root directory, which can point to a
+  fixture directory instead of the system root.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, root="/"):
+    """Default constructor
+    """
+
+    # Root directory of the system files
+    self.root = root
+
+    # Hash table mapping fact names to their content. Content is None if the file cannot be read
+    self.facts = {}
+
+    # Kernel release, as output by uname -r
+    self.kernel_release = None
+
+    # Hash table mapping provider names to their index. Index is None if it cannot be built
+    self.providers = {}
+
+    # Lock protecting the facts and providers tables, checks may run from several threads
+    self.lock = threading.RLock()
+
+    # Directory the facts have been exported to. None until export is called
+    self.directory = None
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get
+  #
+  # -------------------------------------------------------------------------
+  def get(self, name):
+    """This method returns the content of the given fact, reading it the
+    first time it is needed. None is returned if the file cannot be read.
+    """
+
+    with self.lock:
+      if name not in self.facts:
+        filename = os.path.join(self.root, FACT_FILES[name].lstrip("/"))
+        try:
+          with open(filename, "r") as working_file:
+            self.facts[name] = working_file.read()
+        except (OSError, UnicodeDecodeError) as exception:
+          logging.debug("Cannot read " + filename + " : " + str(exception))
+          self.facts[name] = None
+
+      return self.facts[name]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_lines
+  #
+  # -------------------------------------------------------------------------
+  def get_lines(self, name):
+    """This method returns the content of the given fact as a list of lines,
+    or None if the file cannot be read.
+    """
+
+    content = self.get(name)
+    if content is None:
+      return None
+
+    return content.splitlines()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_provider
+  #
+  # -------------------------------------------------------------------------
+  def get_provider(self, name, factory):
+    """This method returns the given provider, creating it with factory the
+    first time it is needed. None is returned if it cannot be created.
+    """
+
+    with self.lock:
+      if name not in self.providers:
+        try:
+          self.providers[name] = factory()
+        except (OSError, ValueError) as exception:
+          logging.debug("Cannot create provider " + name + " : " + str(exception))
+          self.providers[name] = None
+
+      return self.providers[name]
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_packages
+  #
+  # -------------------------------------------------------------------------
+  def get_packages(self):
+    """This method returns the index of the dpkg status database
+    """
+
+    return self.get_provider("packages", lambda: PackageIndex(self.root))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_processes
+  #
+  # -------------------------------------------------------------------------
+  def get_processes(self):
+    """This method returns the process table
+    """
+
+    return self.get_provider("processes", lambda: ProcessTable(self.root))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_interfaces
+  #
+  # -------------------------------------------------------------------------
+  def get_interfaces(self):
+    """This method returns the network interface table
+    """
+
+    return self.get_provider("interfaces", lambda: InterfaceTable(self.root))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_mounts
+  #
+  # -------------------------------------------------------------------------
+  def get_mounts(self):
+    """This method returns the index of the mount table
+    """
+
+    return self.get_provider("mounts", lambda: MountIndex(self.root))
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_file_search
+  #
+  # -------------------------------------------------------------------------
+  def get_file_search(self):
+    """This method returns the table of the patterns searched in files
+    """
+
+    return self.get_provider("files", FileSearch)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_xml_documents
+  #
+  # -------------------------------------------------------------------------
+  def get_xml_documents(self):
+    """This method returns the cache of the parsed XML documents
+    """
+
+    return self.get_provider("xml", XmlDocuments)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_kernel_release
+  #
+  # -------------------------------------------------------------------------
+  def get_kernel_release(self):
+    """This method returns the kernel release
+    """
+
+    with self.lock:
+      if self.kernel_release is None:
+        self.kernel_release = os.uname().release
+
+      return self.kernel_release
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # export
+  #
+  # -------------------------------------------------------------------------
+  def export(self):
+    """This method writes all the facts to a temporary directory, then
+    returns the environment variables giving access to them. Facts which
+    cannot be read are not written, thus scripts fail the same way they
+    would reading the kernel file.
+    """
+
+    if self.directory is None:
+      directory = tempfile.mkdtemp(prefix="sbit-facts-")
+      for name in sorted(FACT_FILES):
+        content = self.get(name)
+        if content is not None:
+          with open(os.path.join(directory, name), "w") as working_file:
+            working_file.write(content)
+
+      logging.debug("System facts exported to " + directory)
+      self.directory = directory
+
+    return {Key.FACTS_DIR_VARIABLE.value: self.directory,
+            Key.KERNEL_RELEASE_VARIABLE.value: self.get_kernel_release()}
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # cleanup
+  #
+  # -------------------------------------------------------------------------
+  def cleanup(self):
+    """This method removes the exported directory
+    """
+
+    if self.directory is not None:
+      shutil.rmtree(self.directory, ignore_errors=True)
+      self.directory = None
@@ -0,0 +1,233 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the index of the test library. Library directories
+are scanned once, then scripts are resolved without accessing the file system.
+
+It also provides the meta data table. The @SBIT lines defined in the header of
+a script are parsed the first time they are needed, then kept for the rest of
+the run.
+"""
+
+import logging
+import os
+import threading
+from sbit.model import Key
+
+# -----------------------------------------------------------------------------
+#
+#    Class ScriptMetadata
+#
+# -----------------------------------------------------------------------------
+class ScriptMetadata(object):
+  """This class stores the meta data parsed from the @SBIT lines of a script.
+
+  Meta data format is :
+  # @SBIT description short_description
+  # @SBIT hint hint_code hint_message
+  # @SBIT batch
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self):
+    """Default constructor
+    """
+
+    # Short description of the script
+    self.description = None
+
+    # Hash table mapping hint codes (as strings) to hint messages
+    self.hints = {}
+
+    # List of the hint codes defined more than once. Only the first definition is used
+    self.duplicate_hints = []
+
+    # Flag set if the script supports the batch mode. It then reads argument sets from stdin, and
+    # outputs a return code per set
+    self.batch = False
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # parse
+  #
+  # -------------------------------------------------------------------------
+  def parse(self, lines):
+    """This method fills the meta data from the lines of the script.
+    """
+
+    for line in lines:
+      # Split line into individual words
+      tokens = line.split()
+
+      # Check that this line structure is "# @SBIT batch"
+      if len(tokens) == 3 and tokens[0] == "#" and tokens[1].lower() == "@sbit" and \
+         tokens[2].lower() == Key.BATCH.value:
+        self.batch = True
+
+      # Need at least three items on the line to be a match candidate
+      if len(tokens) < 3 or tokens[0] != "#" or tokens[1].lower() != "@sbit":
+        continue
+
+      # Check that this line structure is somethin like "# @SBIT description _description"
+      if tokens[2].lower() == "description":
+        if self.description is None:
+          self.description = " ".join(tokens[3:])
+
+      # Check that this line structure is somethin like "# @SBIT hint hint_code _hint_message"
+      elif tokens[2].lower() == "hint" and len(tokens) > 4:
+        if tokens[3] in self.hints:
+          self.duplicate_hints.append(tokens[3])
+        else:
+          self.hints[tokens[3]] = " ".join(tokens[4:])
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestLibrary
+#
+# -----------------------------------------------------------------------------
+class TestLibrary(object):
+  """This class stores the scripts available in the test library directories.
+  The index maps a script name to its resolved path.
+
+  Directories are scanned in the order of the library path list. When the
+  same script exists in several directories, the first one wins, as the user
+  defined paths are at the head of the list.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, paths):
+    """Default constructor. Paths is the list of the library directories.
+    """
+
+    # List of the library directories, home prefix expanded
+    self.paths = [os.path.expanduser(path) for path in paths]
+
+    # Hash table mapping script names to their resolved paths
+    self.scripts = {}
+
+    # Hash table mapping script paths to their parsed meta data
+    self.metadata = {}
+
+    # Lock protecting the meta data table, since it can be filled from several threads
+    self.lock = threading.Lock()
+
+    # Scan the directories to build the index
+    self.scan()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # scan
+  #
+  # -------------------------------------------------------------------------
+  def scan(self):
+    """This method scans the library directories and fills the index with
+    the executable scripts they contain.
+    """
+
+    self.scripts = {}
+
+    for path in self.paths:
+      logging.debug("Scanning library path " + path)
+      try:
+        with os.scandir(path) as iterator:
+          for entry in iterator:
+            # Script from a higher priority directory has already been found
+            if entry.name in self.scripts:
+              continue
+
+            # Only keep the executable files
+            if entry.is_file() and os.access(entry.path, os.X_OK | os.R_OK):
+              self.scripts[entry.name] = entry.path
+
+      # Missing or unreadable directories are not fatal, other paths may provide the scripts
+      except OSError as exception:
+        logging.warning("Cannot scan library path " + path + " : " + exception.strerror)
+
+    logging.debug("Found " + str(len(self.scripts)) + " scripts in library")
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # resolve
+  #
+  # -------------------------------------------------------------------------
+  def resolve(self, script):
+    """This method returns the path to the given script, or None if it is
+    not available from the library.
+    """
+
+    # Most of the scripts are at the top level of the directories, thus they are in the index
+    if script in self.scripts:
+      return self.scripts[script]
+
+    # Scripts stored in sub directories are not indexed. Search them the slow way
+    if "/" in script:
+      for path in self.paths:
+        script_path = os.path.join(path, script)
+        if os.path.isfile(script_path) and os.access(script_path, os.X_OK | os.R_OK):
+          # Store it to avoid searching it twice
+          self.scripts[script] = script_path
+          return script_path
+
+    return None
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_metadata
+  #
+  # -------------------------------------------------------------------------
+  def get_metadata(self, script_path):
+    """This method returns the ScriptMetadata of the given script. The script
+    is read only the first time, then meta data are served from the table.
+    None is returned if the script cannot be read.
+    """
+
+    with self.lock:
+      if script_path in self.metadata:
+        return self.metadata[script_path]
+
+      metadata = None
+      try:
+        with open(script_path, errors="replace") as script:
+          metadata = ScriptMetadata()
+          metadata.parse(script)
+
+      # Failure is stored too, there is no need to try again
+      except OSError as exception:
+        logging.error("Script " + script_path + " is not readable : " + exception.strerror)
+
+      self.metadata[script_path] = metadata
+      return metadata
@@ -0,0 +1,316 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the watch mode. The selected categories are run
+once, then the files checked by the tests are watched. When some of them
+change, only the tests checking them are executed again, and the results of
+their categories are updated up to the root of the tree.
+"""
+
+import logging
+import signal
+import sys
+from sbit.ansi_colors import Colors
+from sbit.executor import create_engine
+from sbit.file_watcher import create_watcher
+from sbit.file_watcher import get_watched_path
+from sbit.model import Key
+from sbit.run_testsuite import RunTestSuite
+from sbit.suite_plan import PATH_SEPARATOR
+
+# -----------------------------------------------------------------------------
+#
+#    Class WatchTestSuite
+#
+# -----------------------------------------------------------------------------
+class WatchTestSuite(RunTestSuite):
+  """This class runs the suite, then runs again the tests whose files have
+  changed, until it is interrupted. Reports are kept open, they receive the
+  results of all the executions.
+
+  Results of the categories are not computed again from the whole tree. Each
+  category counts its failed tests and failed subcategories, thus a test
+  result change only updates its category and the parents it changes.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self, cfg):
+    """Default constructor
+    """
+
+    RunTestSuite.__init__(self, cfg)
+
+    # Flag set while the files are watched. Reports are closed once it is cleared
+    self.watching = False
+
+    # Hash table mapping the category offsets to their parent category. Parent is None for
+    # the selected categories
+    self.parents = {}
+
+    # Hash table mapping the test offsets to their persistent cache time to live
+    self.test_cache_ttls = {}
+
+    # Hash table mapping the test offsets to their success flag
+    self.test_success = {}
+
+    # Hash tables mapping the category offsets to their count of failed tests, and to their
+    # count of failed subcategories
+    self.failed_tests = {}
+    self.failed_subcategories = {}
+
+    # Hash table mapping the watched paths to the list of the tests checking them
+    self.watched_tests = {}
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # run_suite
+  #
+  # -------------------------------------------------------------------------
+  def run_suite(self):
+    """This method runs the selected categories, then watches the files
+    checked by their tests until it is interrupted
+    """
+
+    self.load_suite()
+
+    self.watching = True
+    try:
+      selected = self.select_categories(self.cfg.category)
+
+      self.run_selection(self.cfg.category)
+
+      # Results of the first run are needed to compute the changes, collect them before the
+      # next run resets them. Parents are indexed before the subcategories also selected
+      for category in sorted(selected, key=lambda item: item.depth):
+        self.index_category(category, None, self.cfg.cache_ttl)
+
+      self.watch_tests()
+    except ValueError as exception:
+      logging.critical(str(exception))
+      exit(1)
+    finally:
+      self.watching = False
+      self.close_reports()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # close_reports
+  #
+  # -------------------------------------------------------------------------
+  def close_reports(self):
+    """This method closes the reports once the watch mode is over. They are
+    kept open between the runs.
+    """
+
+    if not self.watching:
+      RunTestSuite.close_reports(self)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # index_category
+  #
+  # -------------------------------------------------------------------------
+  def index_category(self, category, parent, cache_ttl):
+    """This method walks down the test tree, and stores the results of the
+    first run, the parents of the categories and the watched paths. It
+    returns True if all the tests of the subtree were successful.
+    """
+
+    # Category can be reached through several selected categories. Index it only once
+    if category.offset in self.parents:
+      return self.is_successful(category)
+
+    if category.cache_ttl is not None:
+      cache_ttl = category.cache_ttl
+
+    self.parents[category.offset] = parent
+    self.failed_tests[category.offset] = 0
+    self.failed_subcategories[category.offset] = 0
+
+    for test in self.plan.get_tests(category):
+      script_path, ret, out, err, duration = self.get_result(test)
+      self.test_cache_ttls[test.offset] = cache_ttl
+      self.test_success[test.offset] = ret == 0
+      if ret != 0:
+        self.failed_tests[category.offset] += 1
+
+      if script_path is not None:
+        path = get_watched_path(script_path, test.args)
+        if path is not None:
+          self.watched_tests.setdefault(path, []).append(test)
+
+    for cur in self.plan.get_children(category):
+      if not self.index_category(cur, category, cache_ttl):
+        self.failed_subcategories[category.offset] += 1
+
+    return self.is_successful(category)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # is_successful
+  #
+  # -------------------------------------------------------------------------
+  def is_successful(self, category):
+    """This method returns True if all the tests of the category and of its
+    subcategories were successful
+    """
+
+    return self.failed_tests[category.offset] == 0 and \
+           self.failed_subcategories[category.offset] == 0
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # watch_tests
+  #
+  # -------------------------------------------------------------------------
+  def watch_tests(self):
+    """This method waits for the changes of the watched files, and runs the
+    tests checking them, until the user interrupts it
+    """
+
+    if len(self.watched_tests) == 0:
+      self.display("Watch : no test checks a file, there is nothing to watch")
+      return
+
+    # Results did change since the previous run, the persistent cache cannot answer
+    self.cfg.refresh = True
+
+    # Terminate properly on SIGTERM, the reports are closed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    watcher = create_watcher(self.watched_tests)
+    self.display("Watch : " + str(len(self.watched_tests)) + " files watched. "
+                 "Press Ctrl-C to stop")
+    try:
+      while True:
+        changed = sorted(watcher.wait())
+
+        tests = []
+        for path in changed:
+          self.display("[~] " + Colors.FG_YELLOW.value + Colors.BOLD.value + path + \
+                       Colors.RESET.value + " changed")
+          for test in self.watched_tests[path]:
+            if all(test is not cur for cur in tests):
+              tests.append(test)
+
+        self.run_tests(tests)
+        self.display("")
+    except KeyboardInterrupt:
+      pass
+    finally:
+      watcher.close()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # run_tests
+  #
+  # -------------------------------------------------------------------------
+  def run_tests(self, tests):
+    """This method runs the given tests, outputs their results grouped by
+    category, then the results of the categories which have been updated
+    """
+
+    self.reset_run()
+    self.engine = create_engine(self, self.cfg)
+    try:
+      if self.cfg.native:
+        for test in tests:
+          self.prepare_test(test)
+
+      for test in tests:
+        self.schedule_test(test, self.test_cache_ttls[test.offset])
+
+      self.submit_batches()
+
+      updated = []
+      current = None
+      for test in tests:
+        script_path, ret, out, err, duration = self.get_result(test)
+        category = self.plan.categories[test.category]
+
+        if category is not current:
+          self.display(" - Testing " + PATH_SEPARATOR.join(category.path))
+          current = category
+        self.display(self.format_test("", test, script_path, ret))
+        self.report_result(test, script_path, ret, duration)
+
+        for cur in self.update_test(test, ret == 0):
+          if all(cur is not item for item in updated):
+            updated.append(cur)
+    finally:
+      self.engine.shutdown()
+      self.cleanup_facts()
+
+    # Output the categories from the deepest one, as the run does
+    for category in updated:
+      output = " - Result of " + PATH_SEPARATOR.join(category.path)
+      output += "".join(" " for i in range(Key.OUTPUT_RESULT_PADDING.value - len(output)))
+      output += self.format_category_status(category, self.failed_tests[category.offset] == 0,
+                                            self.failed_subcategories[category.offset] == 0)
+      self.display(output)
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # update_test
+  #
+  # -------------------------------------------------------------------------
+  def update_test(self, test, success):
+    """This method stores the new result of a test, then updates the counters
+    of its category, and of the parents whose result changes. It returns the
+    list of the updated categories, from the deepest one.
+    """
+
+    if self.test_success[test.offset] == success:
+      return []
+    self.test_success[test.offset] = success
+
+    category = self.plan.categories[test.category]
+    was_successful = self.is_successful(category)
+    self.failed_tests[category.offset] += -1 if success else 1
+
+    updated = [category]
+    while was_successful != self.is_successful(category):
+      parent = self.parents[category.offset]
+      if parent is None:
+        break
+
+      was_successful = self.is_successful(parent)
+      self.failed_subcategories[parent.offset] += -1 if self.is_successful(category) else 1
+      category = parent
+      updated.append(category)
+
+    return updated
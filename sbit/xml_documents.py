@@ -0,0 +1,272 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" This module implements the cache of the parsed XML documents. Each file
+is parsed once, then XPath queries are evaluated against the parsed document,
+and output as xmllint --xpath would.
+"""
+
+import os
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+
+# Query returning the string value of a node set
+STRING_FUNCTION = re.compile(r"^string\((.*)\)$")
+
+# Last step of a query selecting an attribute
+ATTRIBUTE_STEP = re.compile(r"/@([A-Za-z_][\w.-]*)$")
+
+# Last step of a query selecting text nodes
+TEXT_STEP = "/text()"
+
+# Characters escaped by xmllint in text nodes and in attribute values
+TEXT_ESCAPES = [("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")]
+ATTRIBUTE_ESCAPES = TEXT_ESCAPES + [("\"", "&quot;")]
+
+# -----------------------------------------------------------------------------
+#
+#    Class XmlDocuments
+#
+# -----------------------------------------------------------------------------
+class XmlDocuments(object):
+  """This class stores the parsed XML documents, keyed by path. A document is
+  parsed again if the modification time or the size of the file changed.
+
+  Only the part of XPath supported by ElementTree is evaluated. Queries and
+  documents xmllint would handle differently (CDATA sections, entities,
+  namespaces, functions, etc.) raise ValueError, thus the script is used.
+  """
+
+  # -------------------------------------------------------------------------
+  #
+  # __init__
+  #
+  # -------------------------------------------------------------------------
+  def __init__(self):
+    """Default constructor
+    """
+
+    # Hash table mapping file paths to tuples made of the modification time, the size and
+    # the document
+    self.documents = {}
+
+    # Lock protecting the table, checks may run from several threads
+    self.lock = threading.Lock()
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # get_document
+  #
+  # -------------------------------------------------------------------------
+  def get_document(self, path):
+    """This method returns the document node of the given file. It raises
+    OSError if the file cannot be read, and ValueError if it cannot be parsed.
+    """
+
+    with self.lock:
+      status = os.stat(path)
+      cached = self.documents.get(path)
+      if cached is not None and cached[0] == status.st_mtime_ns and cached[1] == status.st_size:
+        return cached[2]
+
+      document = parse_document(path)
+      self.documents[path] = (status.st_mtime_ns, status.st_size, document)
+      return document
+
+
+
+  # -------------------------------------------------------------------------
+  #
+  # evaluate
+  #
+  # -------------------------------------------------------------------------
+  def evaluate(self, path, query):
+    """This method evaluates the query on the given file. It returns what
+    xmllint --xpath would output, or None if the node set is empty (xmllint
+    then fails).
+    """
+
+    document = self.get_document(path)
+
+    # string() returns the value of the first node, and an empty string for an empty node set
+    string_value = False
+    match = STRING_FUNCTION.match(query)
+    if match is not None:
+      string_value = True
+      query = match.group(1)
+
+    attribute = None
+    text = False
+    match = ATTRIBUTE_STEP.search(query)
+    if match is not None:
+      attribute = match.group(1)
+      query = query[:match.start()]
+    elif query.endswith(TEXT_STEP):
+      text = True
+      query = query[:-len(TEXT_STEP)]
+
+    # Functions other than last(), namespaces, axes and unions are not supported by ElementTree
+    if len(query.strip("/")) == 0 or re.search(r"[():|\s]", query.replace("last()", "")) is not None:
+      raise ValueError("Unsupported query " + query)
+
+    # Document node is the context node, thus relative and absolute paths are the same
+    try:
+      elements = document.findall("." + query if query.startswith("/") else "./" + query)
+    except (SyntaxError, KeyError, TypeError) as exception:
+      raise ValueError(str(exception))
+
+    elements = [element for element in elements
+                if element is not document and isinstance(element.tag, str)]
+
+    # Each selected node is a tuple made of its output and of its string value
+    if attribute is not None:
+      nodes = [(" " + attribute + "=\"" + escape(element.get(attribute), ATTRIBUTE_ESCAPES) + "\"",
+                element.get(attribute))
+               for element in elements if attribute in element.attrib]
+    elif text:
+      nodes = [(escape(value, TEXT_ESCAPES), value)
+               for element in elements for value in get_text_nodes(element)]
+    elif string_value:
+      nodes = [(None, get_string_value(element)) for element in elements]
+    else:
+      nodes = [(serialize(element), None) for element in elements]
+
+    if string_value:
+      result = nodes[0][1] if len(nodes) > 0 else ""
+    elif len(nodes) == 0:
+      return None
+    elif len(nodes) == 1:
+      result = nodes[0][0]
+    else:
+      # Separator between nodes depends on the libxml2 version
+      raise ValueError("Several nodes selected by " + query)
+
+    # Encoding of the output depends on the document and on the libxml2 version
+    if not result.isascii() or "\r" in result:
+      raise ValueError("Cannot reproduce the output of " + query)
+
+    return result
+
+
+
+# -------------------------------------------------------------------------
+#
+# parse_document
+#
+# -------------------------------------------------------------------------
+def parse_document(path):
+  """This function parses the given file, and returns a document node whose
+  only child is the root element. Comments and processing instructions are
+  kept, since they split the text nodes.
+  """
+
+  with open(path, "rb") as working_file:
+    content = working_file.read()
+
+  # xmllint outputs CDATA sections as is, and does not substitute entities
+  if b"<![CDATA[" in content or b"<!ENTITY" in content:
+    raise ValueError("Unsupported construct in " + path)
+
+  parser = ElementTree.XMLParser(target=ElementTree.TreeBuilder(insert_comments=True,
+                                                                insert_pis=True))
+  try:
+    parser.feed(content)
+    root = parser.close()
+  except ElementTree.ParseError as exception:
+    raise ValueError(str(exception))
+
+  document = ElementTree.Element(None)
+  document.append(root)
+  return document
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_text_nodes
+#
+# -------------------------------------------------------------------------
+def get_text_nodes(element):
+  """This function returns the values of the text nodes which are children of
+  the given element
+  """
+
+  nodes = [element.text] + [child.tail for child in element]
+  return [node for node in nodes if node is not None and len(node) > 0]
+
+
+
+# -------------------------------------------------------------------------
+#
+# get_string_value
+#
+# -------------------------------------------------------------------------
+def get_string_value(element):
+  """This function returns the string value of an element, that is the
+  concatenation of its descendant text nodes. Comments are skipped.
+  """
+
+  if not isinstance(element.tag, str):
+    return ""
+
+  value = element.text or ""
+  for child in element:
+    value += get_string_value(child) + (child.tail or "")
+
+  return value
+
+
+
+# -------------------------------------------------------------------------
+#
+# serialize
+#
+# -------------------------------------------------------------------------
+def serialize(element):
+  """This function outputs an element as xmllint does. Only elements without
+  attributes and children are supported.
+  """
+
+  if len(element.attrib) > 0 or len(element) > 0:
+    raise ValueError("Cannot serialize " + element.tag)
+
+  if element.text is None or len(element.text) == 0:
+    return "<" + element.tag + "/>"
+
+  return "<" + element.tag + ">" + escape(element.text, TEXT_ESCAPES) + "</" + element.tag + ">"
+
+
+
+# -------------------------------------------------------------------------
+#
+# escape
+#
+# -------------------------------------------------------------------------
+def escape(value, escapes):
+  """This function replaces the characters escaped by xmllint with their
+  entities
+  """
+
+  for char, entity in escapes:
+    value = value.replace(char, entity)
+
+  return value
@@ -0,0 +1,73 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the execution engines
+"""
+
+import unittest
+from sbit.cli_command import CliCommand
+from sbit.executor import AsyncioEngine
+from sbit.executor import ThreadEngine
+from sbit.model import Configuration
+from sbit.model import Key
+
+# Script printing on both outputs, then running until it is killed by the timeout
+TIMED_OUT_SCRIPT = "echo before ; echo error >&2 ; sleep 10 ; echo after"
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestEngines
+#
+# -----------------------------------------------------------------------------
+class TestEngines(unittest.TestCase):
+  """The engines return the same results for the same commands
+  """
+
+  def run_engine(self, engine_class, command, timeout=None):
+    """Run a command with the given engine, and return its return code and
+    outputs
+    """
+
+    engine = engine_class(CliCommand(Configuration()), 1)
+    try:
+      ret, out, err, duration = engine.submit(command, timeout).result()
+    finally:
+      engine.shutdown()
+
+    return ret, out, err
+
+
+
+  def test_timed_out_script_output(self):
+    """Output printed before the timeout is returned by both engines
+    """
+
+    expected = (Key.RETURN_CODE_TIMEOUT.value, "before\n", "error\n")
+    self.assertEqual(self.run_engine(ThreadEngine, TIMED_OUT_SCRIPT, 0.5), expected)
+    self.assertEqual(self.run_engine(AsyncioEngine, TIMED_OUT_SCRIPT, 0.5), expected)
+
+
+
+  def test_failed_script_output(self):
+    """Output of a failed script is decoded by both engines
+    """
+
+    command = "echo out ; echo err >&2 ; exit 3"
+    self.assertEqual(self.run_engine(ThreadEngine, command), (3, "out\n", "err\n"))
+    self.assertEqual(self.run_engine(AsyncioEngine, command), (3, "out\n", "err\n"))
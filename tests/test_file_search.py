@@ -0,0 +1,160 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the file search, compared to grep on a fixture file
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from sbit.file_search import FileSearch
+from sbit.file_search import translate_bre
+
+# File searched by the tests. It has non ASCII characters, which grep matches as characters
+FIXTURE = """\
+Linux version 4.9.0 (gcc 6.3)
+root:x:0:0:root:/root:/bin/bash
+key = value
+café crème
+a*b+c?d{2}
+^caret$ and dollar
+abcabc
+[section]
+port=8080
+\ttabbed line
+x|y
+"""
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestFileSearch
+#
+# -----------------------------------------------------------------------------
+@unittest.skipUnless(shutil.which("grep"), "grep is not available")
+class TestFileSearch(unittest.TestCase):
+  """The file search finds the same lines as grep, in a UTF-8 locale
+  """
+
+  def setUp(self):
+    """Write the fixture to a temporary directory
+    """
+
+    self.directory = tempfile.mkdtemp(prefix="sbit-test-")
+    self.path = os.path.join(self.directory, "fixture")
+    with open(self.path, "w", encoding="utf-8") as working_file:
+      working_file.write(FIXTURE)
+
+
+
+  def tearDown(self):
+    """Remove the temporary directory
+    """
+
+    shutil.rmtree(self.directory)
+
+
+
+  def check_parity(self, patterns):
+    """Search each pattern with grep and with a new file search, and compare
+    the results. Patterns must be supported by the file search.
+    """
+
+    env = dict(os.environ, LC_ALL="C.UTF-8")
+    for pattern in patterns:
+      ret = subprocess.call(["grep", "-q", "-e", pattern, self.path], env=env)
+      self.assertIn(ret, [0, 1], pattern)
+      self.assertEqual(FileSearch().contains(self.path, pattern), ret == 0, pattern)
+
+
+
+  def test_literals(self):
+    """Literal strings, and the characters which are only operators in
+    extended expressions or when escaped
+    """
+
+    self.check_parity(["version", "café", "missing", "b+c", "c?d", "d{2}", "x|y", "a\\*b",
+                       "\\[section\\]", "\\/root", "4\\.9", "*b"])
+
+
+
+  def test_anchors(self):
+    """Anchors at the ends of the pattern and of the groups, and literal ^
+    and $ elsewhere
+    """
+
+    self.check_parity(["^root", "^key", "bash$", "^$", "^^", "\\^caret", "$ and", "dollar$",
+                       "\\(^a\\)", "\\(a\\|^k\\)ey", "abc$\\|none", "\\(abc$\\)", "^version"])
+
+
+
+  def test_groups_and_intervals(self):
+    """Escaped groups, alternations and intervals
+    """
+
+    self.check_parity(["\\(abc\\)\\{2\\}", "\\(abc\\)\\{3\\}", "[0-9]\\{4\\}", "[0-9]\\{5,\\}",
+                       "[0-9]\\{2,4\\}", "a\\{,2\\}", "port=80\\(80\\|81\\)", "b\\+c", "c\\?d",
+                       "x\\|none", "\\(*a\\)", ".\\{40,\\}"])
+
+
+
+  def test_bracket_expressions(self):
+    """Sets, ranges, negated sets, and ] or - as members
+    """
+
+    self.check_parity(["[0-9]", "[.]", "[]a]", "[^]a]", "[^a-z]", "^[^r]", "[-=]", "[^-a]",
+                       "[^a-]", "[^ -~]", "k[^a-z -]", "[^a-z]\\{2\\}$"])
+
+
+
+  def test_utf8_characters(self):
+    """A dot or a negated set matches one character, and a repetition
+    applies to a whole character
+    """
+
+    self.check_parity(["caf.", "caf. cr.me", "caf[^x] ", "caf[^x]\\{1\\} cr", "crèè*me",
+                       "cr\\(è\\)\\{1\\}me", "^.\\{10\\}$", "..me$", "cafe"])
+
+
+
+  def test_unsupported_patterns(self):
+    """Character classes, back references, and invalid patterns are left
+    to grep
+    """
+
+    for pattern in ["[[:digit:]]", "\\(a\\)\\1", "\\w", "\\(a", "a\\{1", "^*", "a\\"]:
+      self.assertIsNone(translate_bre(pattern), pattern)
+      self.assertIsNone(FileSearch().contains(self.path, pattern), pattern)
+
+
+
+  def test_registered_patterns(self):
+    """Patterns registered before the search are searched at once, and a
+    pattern added later is searched on demand
+    """
+
+    search = FileSearch()
+    self.assertTrue(search.register(self.path, "^root"))
+    self.assertTrue(search.register(self.path, "missing"))
+    self.assertFalse(search.register(self.path, "[[:alpha:]]"))
+
+    self.assertTrue(search.contains(self.path, "^root"))
+    self.assertFalse(search.contains(self.path, "missing"))
+    self.assertTrue(search.contains(self.path, "crème"))
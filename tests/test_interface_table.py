@@ -0,0 +1,211 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the network interface table, run from a /sys/class/net fixture
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from sbit.interface_table import IFA_ADDRESS
+from sbit.interface_table import IFA_LOCAL
+from sbit.interface_table import IFADDRMSG
+from sbit.interface_table import RTATTR_HEADER
+from sbit.interface_table import InterfaceTable
+from sbit.native_checks import run_native_check
+from sbit.system_facts import SystemFacts
+
+# Directory of the bundled library
+LIBRARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-library")
+
+# Interface fixture, attributes as read from sysfs. eth1 is up without a link, eth2 is
+# administratively down, and the flags of br0 cannot be read
+INTERFACES = {
+  "lo": {"ifindex": "1", "flags": "0x9", "mtu": "65536", "operstate": "unknown"},
+  "eth0": {"ifindex": "2", "flags": "0x1003", "mtu": "1500", "operstate": "up"},
+  "eth1": {"ifindex": "3", "flags": "0x1003", "mtu": "9000", "operstate": "down"},
+  "eth2": {"ifindex": "4", "flags": "0x1002", "mtu": "1500", "operstate": "down"},
+  "br0": {"ifindex": "5", "mtu": "1500", "operstate": "up"},
+}
+
+# Addresses of the interfaces, as dumped from netlink
+ADDRESSES = {socket.AF_INET: {"lo": ["127.0.0.1"], "eth0": ["192.168.1.10", "10.0.0.1"]},
+             socket.AF_INET6: {"lo": ["::1"], "eth0": ["fe80::1"]}}
+
+# -------------------------------------------------------------------------
+#
+# pack_address
+#
+# -------------------------------------------------------------------------
+def pack_address(family, index, attributes):
+  """This function returns a RTM_NEWADDR message payload, made of the
+  address message and of the given attributes
+  """
+
+  message = IFADDRMSG.pack(family, 24, 0, 0, index)
+  for attr_type, value in attributes:
+    length = RTATTR_HEADER.size + len(value)
+    message += RTATTR_HEADER.pack(length, attr_type) + value + b"\0" * (-length % 4)
+
+  return message
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestInterfaceTable
+#
+# -----------------------------------------------------------------------------
+class TestInterfaceTable(unittest.TestCase):
+  """Tests of the InterfaceTable class, and of the native interface checks
+  """
+
+  def setUp(self):
+    """Write the fixture to a temporary root directory, then create the
+    system facts of this root. Addresses are set, since netlink is not
+    emulated.
+    """
+
+    self.root = tempfile.mkdtemp(prefix="sbit-test-")
+    for name, attributes in INTERFACES.items():
+      directory = os.path.join(self.root, "sys", "class", "net", name)
+      os.makedirs(directory)
+      for attribute, value in attributes.items():
+        with open(os.path.join(directory, attribute), "w") as working_file:
+          working_file.write(value + "\n")
+
+    self.facts = SystemFacts(self.root)
+    self.facts.get_interfaces().addresses = ADDRESSES
+
+
+
+  def tearDown(self):
+    """Remove the temporary root directory
+    """
+
+    shutil.rmtree(self.root)
+
+
+
+  def check(self, script, args):
+    """Run the native check of the script on the fixture, and return its code
+    """
+
+    return run_native_check(os.path.join(LIBRARY, script), args, self.facts)[0]
+
+
+
+  def test_attributes(self):
+    """Attributes are read from sysfs, missing ones are None
+    """
+
+    table = InterfaceTable(self.root)
+    self.assertEqual(sorted(table.interfaces), sorted(INTERFACES))
+    self.assertEqual(table.get_attribute("eth1", "mtu"), "9000")
+    self.assertEqual(table.get_attribute("lo", "operstate"), "unknown")
+    self.assertIsNone(table.get_attribute("br0", "flags"))
+    self.assertFalse(table.has_interface("wlan0"))
+
+
+
+  def test_carrier(self):
+    """An interface is NO-CARRIER only if it is up, and its operational
+    state is neither up nor unknown
+    """
+
+    table = InterfaceTable(self.root)
+    self.assertTrue(table.has_carrier("lo"))
+    self.assertTrue(table.has_carrier("eth0"))
+    self.assertFalse(table.has_carrier("eth1"))
+    self.assertTrue(table.has_carrier("eth2"))
+
+
+
+  def test_parse_address(self):
+    """Addresses are stored under the interface name, local address first,
+    and unknown interfaces and families are ignored
+    """
+
+    table = InterfaceTable(self.root)
+    names = {2: "eth0", 3: "eth1"}
+    addresses = {socket.AF_INET: {}, socket.AF_INET6: {}}
+
+    table.parse_address(pack_address(socket.AF_INET, 2, [
+      (IFA_ADDRESS, socket.inet_pton(socket.AF_INET, "192.168.1.10"))]), names, addresses)
+    table.parse_address(pack_address(socket.AF_INET, 3, [
+      (IFA_ADDRESS, socket.inet_pton(socket.AF_INET, "10.0.0.2")),
+      (IFA_LOCAL, socket.inet_pton(socket.AF_INET, "10.0.0.1"))]), names, addresses)
+    table.parse_address(pack_address(socket.AF_INET6, 2, [
+      (IFA_ADDRESS, socket.inet_pton(socket.AF_INET6, "fe80::1"))]), names, addresses)
+    table.parse_address(pack_address(socket.AF_INET, 9, [
+      (IFA_ADDRESS, socket.inet_pton(socket.AF_INET, "172.16.0.1"))]), names, addresses)
+    table.parse_address(pack_address(socket.AF_PACKET, 2, []), names, addresses)
+
+    self.assertEqual(addresses, {socket.AF_INET: {"eth0": ["192.168.1.10"], "eth1": ["10.0.0.1"]},
+                                 socket.AF_INET6: {"eth0": ["fe80::1"]}})
+
+
+
+  def test_state_checks(self):
+    """Return codes of the availability, carrier, MTU and state checks. A
+    missing interface returns 1, as the hints describe
+    """
+
+    self.assertEqual(self.check("net_interface_is_available", "eth0"), 0)
+    self.assertEqual(self.check("net_interface_is_available", "wlan0"), 1)
+    self.assertEqual(self.check("net_interface_has_carrier", "eth0"), 0)
+    self.assertEqual(self.check("net_interface_has_carrier", "eth1"), 1)
+    self.assertEqual(self.check("net_interface_has_carrier", "br0"), 1)
+    self.assertEqual(self.check("net_interface_has_carrier", "wlan0"), 1)
+    self.assertEqual(self.check("net_interface_has_mtu", "eth1 9000"), 0)
+    self.assertEqual(self.check("net_interface_has_mtu", "eth1 1500"), 1)
+    self.assertEqual(self.check("net_interface_has_mtu", "wlan0 1500"), 1)
+    self.assertEqual(self.check("net_interface_is_up", "eth0"), 0)
+    self.assertEqual(self.check("net_interface_is_up", "lo"), 1)
+    self.assertEqual(self.check("net_interface_is_up", "wlan0"), 1)
+    self.assertEqual(self.check("net_interface_is_down", "eth2"), 0)
+    self.assertEqual(self.check("net_interface_is_down", "eth0"), 1)
+    self.assertEqual(self.check("net_interface_is_down", "wlan0"), 1)
+
+
+
+  def test_address_checks(self):
+    """A missing IPv4 address returns 2 and a missing IPv6 address returns 1,
+    as the scripts do. A missing interface returns 1.
+    """
+
+    self.assertEqual(self.check("net_interface_has_address_ipv4", "eth0 10.0.0.1"), 0)
+    self.assertEqual(self.check("net_interface_has_address_ipv4", "eth0 10.0.0.2"), 2)
+    self.assertEqual(self.check("net_interface_has_address_ipv4", "eth1 10.0.0.1"), 2)
+    self.assertEqual(self.check("net_interface_has_address_ipv4", "wlan0 10.0.0.1"), 1)
+    self.assertEqual(self.check("net_interface_has_address_ipv6", "lo ::1"), 0)
+    self.assertEqual(self.check("net_interface_has_address_ipv6", "eth0 fe80::2"), 1)
+    self.assertEqual(self.check("net_interface_has_address_ipv6", "wlan0 ::1"), 1)
+
+
+
+  def test_fallback(self):
+    """Interface names which are not plain directory names are left to the
+    scripts
+    """
+
+    self.assertIsNone(run_native_check(os.path.join(LIBRARY, "net_interface_is_up"), "..",
+                                       self.facts))
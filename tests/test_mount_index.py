@@ -0,0 +1,201 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the mount table index, run from a mountinfo fixture
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from sbit.mount_index import MountIndex
+from sbit.native_checks import run_native_check
+from sbit.system_facts import SystemFacts
+
+# Directory of the bundled library
+LIBRARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-library")
+
+# Mount table fixture. /mnt/ro is a read only bind mount of the read write file system of /data
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw,errors=remount-ro
+23 22 8:2 / /data rw,nosuid,relatime shared:2 - ext4 /dev/sda2 rw,data=ordered
+24 22 8:2 / /mnt/ro ro,nosuid,relatime shared:2 - ext4 /dev/sda2 rw,data=ordered
+25 22 0:20 / /mnt/with\\040space rw - tmpfs tmpfs rw,size=1024k
+"""
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestMountIndex
+#
+# -----------------------------------------------------------------------------
+class TestMountIndex(unittest.TestCase):
+  """Tests of the MountIndex class
+  """
+
+  def setUp(self):
+    """Write the fixture to a temporary root directory, then index it
+    """
+
+    self.root = tempfile.mkdtemp(prefix="sbit-test-")
+    os.makedirs(os.path.join(self.root, "proc", "self"))
+    with open(os.path.join(self.root, "proc", "self", "mountinfo"), "w") as working_file:
+      working_file.write(MOUNTINFO)
+
+    self.index = MountIndex(self.root)
+
+
+
+  def tearDown(self):
+    """Remove the temporary root directory
+    """
+
+    shutil.rmtree(self.root)
+
+
+
+  def test_read_only_bind_mount(self):
+    """A read only bind mount of a read write file system is only read only
+    """
+
+    mount = self.index.get_mount("/mnt/ro")
+    self.assertTrue(mount.has_option("ro"))
+    self.assertFalse(mount.has_option("rw"))
+
+
+
+  def test_read_write_mount(self):
+    """Read write mount is not read only
+    """
+
+    mount = self.index.get_mount("/data")
+    self.assertTrue(mount.has_option("rw"))
+    self.assertFalse(mount.has_option("ro"))
+
+
+
+  def test_super_block_options(self):
+    """File system specific options are found, with or without their value
+    """
+
+    mount = self.index.get_mount("/mnt/ro")
+    self.assertTrue(mount.has_option("nosuid"))
+    self.assertTrue(mount.has_option("data=ordered"))
+    self.assertTrue(mount.has_option("data"))
+    self.assertFalse(mount.has_option("noexec"))
+
+
+
+  def test_source_and_escaped_mount_point(self):
+    """Mounts are indexed by source device, and escaped paths are decoded
+    """
+
+    self.assertEqual(len(self.index.get_source_mounts("/dev/sda2")), 2)
+    self.assertTrue(self.index.get_mount("/mnt/with space").has_option("size"))
+
+
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestMountOptionParity
+#
+# -----------------------------------------------------------------------------
+class TestMountOptionParity(unittest.TestCase):
+  """The mount option scripts and their native checks return the same codes
+  on the same mount table. Scripts read it from the facts directory.
+  """
+
+  def setUp(self):
+    """Create the mount points, then write the mount table of the fixture as
+    mountinfo for the native checks, and as mounts for the scripts
+    """
+
+    self.root = tempfile.mkdtemp(prefix="sbit-test-")
+    for name in ["data", "ro", "plain"]:
+      os.makedirs(os.path.join(self.root, "mnt", name))
+    os.makedirs(os.path.join(self.root, "proc", "self"))
+
+    data = os.path.join(self.root, "mnt", "data")
+    read_only = os.path.join(self.root, "mnt", "ro")
+    with open(os.path.join(self.root, "proc", "self", "mountinfo"), "w") as working_file:
+      working_file.write("23 1 8:2 / " + data + " rw,nosuid,relatime - ext4 /dev/sda2 "
+                         "rw,data=ordered\n")
+      working_file.write("24 1 8:2 / " + read_only + " ro,nosuid,relatime - ext4 /dev/sda2 "
+                         "rw,data=ordered\n")
+    with open(os.path.join(self.root, "proc", "mounts"), "w") as working_file:
+      working_file.write("/dev/sda2 " + data + " ext4 rw,nosuid,relatime,data=ordered 0 0\n")
+      working_file.write("/dev/sda2 " + read_only + " ext4 ro,nosuid,relatime,data=ordered 0 0\n")
+
+    self.facts = SystemFacts(self.root)
+
+
+
+  def tearDown(self):
+    """Remove the temporary root directory
+    """
+
+    shutil.rmtree(self.root)
+
+
+
+  def check_parity(self, script, mount_point, option, expected):
+    """Run the script and its native check, and compare both codes to the
+    expected one
+    """
+
+    script_path = os.path.join(LIBRARY, script)
+    args = os.path.join(self.root, "mnt", mount_point) + " " + option
+
+    native = run_native_check(script_path, args, self.facts)
+    env = dict(os.environ, SBIT_FACTS_DIR=os.path.join(self.root, "proc"))
+    ret = subprocess.call(["bash", script_path] + args.split(), env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    self.assertEqual((native[0], ret), (expected, expected), script + " " + args)
+
+
+
+  def test_has_mount_option_activated(self):
+    """Option set, option name, missing option, bind mount, not mounted and
+    missing mount point
+    """
+
+    script = "fs_has_mount_option_activated"
+    self.check_parity(script, "data", "relatime", 0)
+    self.check_parity(script, "data", "data", 0)
+    self.check_parity(script, "data", "data=ordered", 0)
+    self.check_parity(script, "data", "noexec", 3)
+    self.check_parity(script, "ro", "ro", 0)
+    self.check_parity(script, "ro", "rw", 3)
+    self.check_parity(script, "plain", "relatime", 1)
+    self.check_parity(script, "missing", "relatime", 2)
+
+
+
+  def test_dont_have_mount_option_activated(self):
+    """Same cases as the has_mount_option_activated check
+    """
+
+    script = "fs_dont_have_mount_option_activated"
+    self.check_parity(script, "data", "relatime", 3)
+    self.check_parity(script, "data", "data", 3)
+    self.check_parity(script, "data", "noexec", 0)
+    self.check_parity(script, "ro", "rw", 0)
+    self.check_parity(script, "plain", "relatime", 1)
+    self.check_parity(script, "missing", "relatime", 2)
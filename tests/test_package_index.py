@@ -0,0 +1,169 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the dpkg status index, run from a status file fixture
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from sbit.native_checks import run_native_check
+from sbit.package_index import DPKG_STATUS_PATH
+from sbit.package_index import PackageIndex
+from sbit.system_facts import SystemFacts
+
+# Directory of the bundled library
+LIBRARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-library")
+
+# Status file fixture. libc6 is installed for two architectures, vim is removed with its
+# configuration files kept, openssh-server is held, and busybox is half installed
+STATUS = """\
+Package: bash
+Essential: yes
+Status: install ok installed
+Priority: required
+Architecture: amd64
+Version: 5.2.15-2+b2
+Description: GNU Bourne Again SHell
+ Bash is an sh-compatible command language interpreter.
+ .
+ Package: not-a-package
+
+Package: libc6
+Status: install ok installed
+Architecture: amd64
+Multi-Arch: same
+Version: 2.36-9
+
+Package: libc6
+Status: install ok installed
+Architecture: i386
+Multi-Arch: same
+Version: 2.36-9
+
+Package: vim
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 2:9.0.1378-2
+
+Package: openssh-server
+Status: hold ok installed
+Architecture: amd64
+Version: 1:9.2p1-2
+
+Package: busybox
+Status: install reinstreq half-installed
+Architecture: amd64
+Version: 1:1.35.0-4
+
+Package: curl
+Status: install ok installed
+Architecture: amd64
+Version: 7.88.1-10
+"""
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestPackageIndex
+#
+# -----------------------------------------------------------------------------
+class TestPackageIndex(unittest.TestCase):
+  """Tests of the PackageIndex class, and of the native package checks
+  """
+
+  def setUp(self):
+    """Write the fixture to a temporary root directory, then index it
+    """
+
+    self.root = tempfile.mkdtemp(prefix="sbit-test-")
+    status_path = os.path.join(self.root, DPKG_STATUS_PATH)
+    os.makedirs(os.path.dirname(status_path))
+    with open(status_path, "w") as working_file:
+      working_file.write(STATUS)
+
+    self.index = PackageIndex(self.root)
+
+
+
+  def tearDown(self):
+    """Remove the temporary root directory
+    """
+
+    shutil.rmtree(self.root)
+
+
+
+  def check(self, script, args):
+    """Run the native check of the script on the fixture, and return its code
+    """
+
+    result = run_native_check(os.path.join(LIBRARY, script), args, SystemFacts(self.root))
+    return None if result is None else result[0]
+
+
+
+  def test_paragraphs(self):
+    """Each paragraph is an instance, continuation lines are not fields
+    """
+
+    self.assertEqual(sorted(self.index.packages),
+                     ["bash", "busybox", "curl", "libc6", "openssh-server", "vim"])
+    self.assertEqual(self.index.packages["libc6"], ["install ok installed"] * 2)
+
+
+
+  def test_count_installed(self):
+    """Only the instances listed as ii by dpkg -l are installed
+    """
+
+    self.assertEqual(self.index.count_installed("bash"), 1)
+    self.assertEqual(self.index.count_installed("libc6"), 2)
+    self.assertEqual(self.index.count_installed("vim"), 0)
+    self.assertEqual(self.index.count_installed("openssh-server"), 0)
+    self.assertEqual(self.index.count_installed("busybox"), 0)
+    self.assertEqual(self.index.count_installed("missing"), 0)
+
+
+
+  def test_package_checks(self):
+    """A package is installed if it has a single installed instance, as the
+    scripts count the ii lines. Architecture qualified names are left to the
+    scripts.
+    """
+
+    self.assertEqual(self.check("deb_package_is_installed", "curl"), 0)
+    self.assertEqual(self.check("deb_package_is_installed", "vim"), 1)
+    self.assertEqual(self.check("deb_package_is_installed", "libc6"), 1)
+    self.assertEqual(self.check("deb_package_is_installed", "missing"), 1)
+    self.assertEqual(self.check("deb_package_is_not_installed", "curl"), 1)
+    self.assertEqual(self.check("deb_package_is_not_installed", "vim"), 0)
+    self.assertEqual(self.check("deb_package_is_not_installed", "libc6"), 0)
+    self.assertIsNone(self.check("deb_package_is_installed", "libc6:i386"))
+
+
+
+  def test_missing_status_file(self):
+    """Without a status file, the checks are left to the scripts
+    """
+
+    os.remove(os.path.join(self.root, DPKG_STATUS_PATH))
+    with self.assertRaises(OSError):
+      PackageIndex(self.root)
+    self.assertIsNone(self.check("deb_package_is_installed", "curl"))
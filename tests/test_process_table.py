@@ -0,0 +1,162 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the process table, run from a /proc fixture
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from sbit.native_checks import run_native_check
+from sbit.process_table import ProcessTable
+from sbit.system_facts import SystemFacts
+
+# Directory of the bundled library
+LIBRARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-library")
+
+# Process fixture. Each process is its pid, the content of its stat file, and its arguments.
+# Pid 12 and 123 have the same prefix, the scripts mix up their ps lines
+PROCESSES = [
+  (1, "1 (init) S 0 1 1 0 -1", ["/sbin/init", "splash"]),
+  (2, "2 (kthreadd) S 0 0 0 0 -1", []),
+  (12, "12 (daemon) S 1 12 12 0 -1", ["/usr/sbin/daemon", "--config", "/etc/daemon.conf"]),
+  (123, "123 (worker) S 1 123 123 0 -1", ["/usr/bin/worker", "--verbose"]),
+  (200, "200 (my (odd) name) R 1 200 200 0 -1", ["/opt/odd", "-x"]),
+  (300, "300 (server) S 1 300 300 0 -1", ["server", "--port=80"]),
+  (301, "301 (server) Z 300 300 300 0 -1", []),
+  (400, "400 (storage) D 1 400 400 0 -1", ["/usr/bin/storage"]),
+]
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestProcessTable
+#
+# -----------------------------------------------------------------------------
+class TestProcessTable(unittest.TestCase):
+  """Tests of the ProcessTable class, and of the native process checks
+  """
+
+  def setUp(self):
+    """Write the fixture to a temporary root directory, then scan it
+    """
+
+    self.root = tempfile.mkdtemp(prefix="sbit-test-")
+    proc = os.path.join(self.root, "proc")
+    for pid, stat, args in PROCESSES:
+      os.makedirs(os.path.join(proc, str(pid)))
+      with open(os.path.join(proc, str(pid), "stat"), "w") as working_file:
+        working_file.write(stat + "\n")
+      with open(os.path.join(proc, str(pid), "cmdline"), "w") as working_file:
+        working_file.write("".join(arg + "\0" for arg in args))
+
+    # Entries which are not processes, or which terminated during the scan
+    os.makedirs(os.path.join(proc, "self"))
+    os.makedirs(os.path.join(proc, "500"))
+
+    self.table = ProcessTable(self.root)
+
+
+
+  def tearDown(self):
+    """Remove the temporary root directory
+    """
+
+    shutil.rmtree(self.root)
+
+
+
+  def check(self, script, args):
+    """Run the native check of the script on the fixture, and return its code
+    """
+
+    return run_native_check(os.path.join(LIBRARY, script), args, SystemFacts(self.root))[0]
+
+
+
+  def test_scan(self):
+    """Processes are read from their stat and cmdline files, other entries
+    are ignored
+    """
+
+    self.assertEqual(sorted(self.table.processes), [pid for pid, stat, args in PROCESSES])
+    self.assertEqual(self.table.get_state(301), "Z")
+    self.assertEqual(self.table.get_state(400), "D")
+
+
+
+  def test_names(self):
+    """Processes are found by command name, and by full path and base name
+    of their first argument, in decreasing pid order
+    """
+
+    self.assertEqual(self.table.get_pids("daemon"), [12])
+    self.assertEqual(self.table.get_pids("/usr/sbin/daemon"), [12])
+    self.assertEqual(self.table.get_pids("/other/path/daemon"), [12])
+    self.assertEqual(self.table.get_pids("my (odd) name"), [200])
+    self.assertEqual(self.table.get_pids("odd"), [200])
+    self.assertEqual(self.table.get_pids("server"), [301, 300])
+    self.assertEqual(self.table.get_pids("missing"), [])
+
+
+
+  def test_commands(self):
+    """Commands are output as ps does, kernel threads between brackets
+    """
+
+    self.assertEqual(self.table.get_command(12), "/usr/sbin/daemon --config /etc/daemon.conf")
+    self.assertEqual(self.table.get_command(2), "[kthreadd]")
+    self.assertEqual(self.table.get_command(301), "[server]")
+
+
+
+  def test_running_checks(self):
+    """Return codes of the native checks, including the zombie and
+    uninterruptible state codes the scripts cannot return
+    """
+
+    self.assertEqual(self.check("process_is_running", "daemon"), 0)
+    self.assertEqual(self.check("process_is_running", "missing"), 1)
+    self.assertEqual(self.check("process_is_running", "server"), 2)
+    self.assertEqual(self.check("process_is_running", "storage"), 3)
+    self.assertEqual(self.check("process_is_not_running", "missing"), 0)
+    self.assertEqual(self.check("process_is_not_running", "daemon"), 1)
+    self.assertEqual(self.check("process_is_running_once", "daemon"), 0)
+    self.assertEqual(self.check("process_is_running_once", "server"), 2)
+    self.assertEqual(self.check("process_is_running_multiple_instance", "server 2"), 3)
+    self.assertEqual(self.check("process_is_running_multiple_instance", "server 3"), 2)
+
+
+
+  def test_running_with_args(self):
+    """Arguments are matched as words in the command line of the process
+    itself. The script greps the pid in the whole ps output, thus it also
+    matches the line of pid 123 when it checks pid 12, and returns 0 for
+    'daemon verbose'.
+    """
+
+    self.assertEqual(self.check("process_is_running_with_args", "daemon config"), 0)
+    self.assertEqual(self.check("process_is_running_with_args", "daemon /etc/daemon.conf"), 0)
+    self.assertEqual(self.check("process_is_running_with_args", "daemon confi"), 2)
+    self.assertEqual(self.check("process_is_running_with_args", "daemon verbose"), 2)
+    self.assertEqual(self.check("process_is_running_with_args", "missing config"), 1)
+    self.assertEqual(self.check("process_is_not_running_with_args", "daemon config"), 0)
+    self.assertEqual(self.check("process_is_not_running_with_args", "daemon verbose"), 1)
+    self.assertEqual(self.check("process_is_not_running_with_args", "server port=80"), 1)
+    self.assertEqual(self.check("process_is_not_running_with_args", "missing config"), 0)
@@ -0,0 +1,198 @@
+#
+# The contents of this file are subject to the Apache 2.0 license you may not
+# use this file except in compliance with the License.
+#
+# Software distributed under the License is distributed on an "AS IS" basis,
+# WITHOUT WARRANTY OF ANY KIND, either express or implied. See the License
+# for the specific language governing rights and limitations under the
+# License.
+#
+#
+# Copyright 2017 SBIT project (http://www.firmwaretoolkit.org).
+# All rights reserved. Use is subject to license terms.
+#
+#
+# Contributors list :
+#
+#    William Bonnet     wllmbnnt@gmail.com, wbonnet@theitmakers.com
+#
+
+""" Tests of the XML documents cache, run on a fixture document
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import unittest
+from sbit.native_checks import run_native_check
+from sbit.system_facts import SystemFacts
+from sbit.xml_documents import XmlDocuments
+
+# Directory of the bundled library
+LIBRARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-library")
+
+# Document fixture. Mixed and nested elements have several text nodes
+DOCUMENT = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<config version="2">
+  <name>board &amp; co</name>
+  <empty/>
+  <network>
+    <interface name="eth0" mode="dhcp">
+      <address>192.168.1.10</address>
+    </interface>
+    <interface name="eth1" mode="static" label="a &quot;b&quot; &lt;c&gt;">
+      <address>10.0.0.1</address>
+    </interface>
+  </network>
+  <mixed>first<!-- note -->second</mixed>
+  <nested>outer <b>bold</b> tail</nested>
+</config>
+"""
+
+# Supported queries, and the output of xmllint --xpath without its final newline
+SUPPORTED_QUERIES = [
+  ("/config/name", "<name>board &amp; co</name>"),
+  ("/config/empty", "<empty/>"),
+  ("/config/name/text()", "board &amp; co"),
+  ("config/name/text()", "board &amp; co"),
+  ("//name/text()", "board &amp; co"),
+  ("/config/@version", " version=\"2\""),
+  ("//interface[@name='eth1']/@mode", " mode=\"static\""),
+  ("//interface[@name='eth1']/@label", " label=\"a &quot;b&quot; &lt;c&gt;\""),
+  ("//interface[2]/address/text()", "10.0.0.1"),
+  ("//interface[last()]/address/text()", "10.0.0.1"),
+  ("string(//interface/address)", "192.168.1.10"),
+  ("string(/config/nested)", "outer bold tail"),
+  ("string(/config/missing)", ""),
+]
+
+# Queries whose output is not reproduced: functions, several nodes, elements with children
+UNSUPPORTED_QUERIES = ["count(//interface)", "//address/text()", "//interface/@name",
+                       "/config/mixed/text()", "/config/network/interface", "/"]
+
+# -----------------------------------------------------------------------------
+#
+#    Class TestXmlDocuments
+#
+# -----------------------------------------------------------------------------
+class TestXmlDocuments(unittest.TestCase):
+  """Tests of the XmlDocuments class, and of the native xml_node_has_text_value
+  check
+  """
+
+  def setUp(self):
+    """Write the fixture to a temporary directory
+    """
+
+    self.directory = tempfile.mkdtemp(prefix="sbit-test-")
+    self.path = os.path.join(self.directory, "document.xml")
+    with open(self.path, "w") as working_file:
+      working_file.write(DOCUMENT)
+
+    self.documents = XmlDocuments()
+
+
+
+  def tearDown(self):
+    """Remove the temporary directory
+    """
+
+    shutil.rmtree(self.directory)
+
+
+
+  def test_supported_queries(self):
+    """Elements, text nodes and attributes are output as xmllint does, with
+    escaped entities
+    """
+
+    for query, output in SUPPORTED_QUERIES:
+      self.assertEqual(self.documents.evaluate(self.path, query), output, query)
+
+
+
+  def test_empty_node_set(self):
+    """An empty node set returns None, since xmllint fails
+    """
+
+    self.assertIsNone(self.documents.evaluate(self.path, "/config/missing"))
+    self.assertIsNone(self.documents.evaluate(self.path, "/config/empty/@name"))
+
+
+
+  def test_unsupported_queries(self):
+    """Queries whose output is not reproduced raise ValueError
+    """
+
+    for query in UNSUPPORTED_QUERIES:
+      with self.assertRaises(ValueError, msg=query):
+        self.documents.evaluate(self.path, query)
+
+
+
+  def test_unsupported_documents(self):
+    """CDATA sections and invalid documents raise ValueError
+    """
+
+    with open(self.path, "w") as working_file:
+      working_file.write("<config><name><![CDATA[a < b]]></name></config>\n")
+    with self.assertRaises(ValueError):
+      self.documents.evaluate(self.path, "/config/name/text()")
+
+    with open(self.path, "w") as working_file:
+      working_file.write("<config><name>unclosed</config>\n")
+    with self.assertRaises(ValueError):
+      self.documents.evaluate(self.path, "/config/name/text()")
+
+
+
+  def test_modified_document(self):
+    """A document is parsed again when the file changes
+    """
+
+    self.assertEqual(self.documents.evaluate(self.path, "/config/@version"), " version=\"2\"")
+    with open(self.path, "w") as working_file:
+      working_file.write(DOCUMENT.replace("version=\"2\"", "version=\"10\""))
+    self.assertEqual(self.documents.evaluate(self.path, "/config/@version"), " version=\"10\"")
+
+
+
+  def test_native_check(self):
+    """Native check return codes, and fallback to the script for the
+    unsupported queries
+    """
+
+    script_path = os.path.join(LIBRARY, "xml_node_has_text_value")
+    facts = SystemFacts()
+
+    def check(path, query, expected):
+      args = " ".join(shlex.quote(arg) for arg in [path, query, expected])
+      result = run_native_check(script_path, args, facts)
+      return None if result is None else result[0]
+
+    self.assertEqual(check(self.path, "/config/name/text()", "board &amp; co"), 0)
+    self.assertEqual(check(self.path, "//interface[2]/address/text()", "10.0.0.2"), 3)
+    self.assertEqual(check(self.path, "/config/missing/text()", "value"), 2)
+    self.assertEqual(check(os.path.join(self.directory, "missing.xml"), "/config", "value"), 1)
+    self.assertIsNone(check(self.path, "count(//interface)", "2"))
+
+
+
+  @unittest.skipUnless(shutil.which("xmllint"), "xmllint is not available")
+  def test_script_parity(self):
+    """The script returns the same codes as the native check
+    """
+
+    script_path = os.path.join(LIBRARY, "xml_node_has_text_value")
+    facts = SystemFacts()
+
+    for query, output in SUPPORTED_QUERIES + [("/config/missing", "")]:
+      for expected in [output, "other"]:
+        args = [self.path, query, expected]
+        native = run_native_check(script_path, " ".join(shlex.quote(arg) for arg in args), facts)
+        ret = subprocess.call(["bash", script_path] + args, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        self.assertEqual(native[0], ret, query + " " + expected)